@@ -6,11 +6,9 @@ from raven.contrib.celery import register_signal, register_logger_signal
 import celery
 import logging
 import raven
-import os
-import time
-import shutil
 
 from api_background import celeryconfig
+from api_background.export_store import evict_exports
 
 # class Celery(celery.Celery):
 #     def on_configure(self):
@@ -31,17 +29,10 @@ import api_background.export_data
 
 @celery.task
 def cleanup_downloads():
-    folder = '/var/www/meerkat_api/api_background/api_background/exported_data'
-    downloads = os.listdir(folder)
-    oldest = time.time() - 3600
-    for download in downloads:
-        path = '{}/{}'.format(folder, download)
-        if os.stat(path).st_mtime < oldest:
-            try:
-                shutil.rmtree(path)
-            except NotADirectoryError:
-                pass
-
+    """
+    Evicts old and least recently used exports from the export store
+    """
+    evict_exports()
 
 
 if __name__ == "__main__":
@@ -24,7 +24,13 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_ACCEPT_CONTENT = ['json', 'yaml']
 CELERY_ENABLE_UTC = True
-CELERYD_MAX_TASKS_PER_CHILD = 1  # To help with memory constraints
+# The worker processes are reused, see api_background.worker. A process is
+# replaced after a task if its peak resident memory exceeds this (KiB).
+CELERYD_MAX_MEMORY_PER_CHILD = int(
+    os.environ.get("MEERKAT_WORKER_MAX_MEMORY_KB", 1024 * 1024))
+max_tasks = os.environ.get("MEERKAT_WORKER_MAX_TASKS")
+if max_tasks:
+    CELERYD_MAX_TASKS_PER_CHILD = int(max_tasks)
 CELERYBEAT_SCHEDULE = {}
 CELERYBEAT_SCHEDULE['cleanup_downloads'] = {
     'task': 'meerkat_abacus.tasks.cleanup_downloads',
@@ -0,0 +1,174 @@
+import csv
+
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.parquet as pq
+
+COLUMNAR_FORMATS = ["parquet", "arrow"]
+
+
+class ColumnarFileWriter:
+    """
+    Writes rows to Parquet and/or Arrow IPC files in batches. Each batch
+    becomes one Parquet row group and one Arrow record batch.
+
+    Columns listed in dictionaries are dictionary encoded with a fixed
+    dictionary, e.g. all location names, so that every batch shares the same
+    dictionary. Columns listed in column_types get that type, all other
+    columns are written as strings.
+    """
+    def __init__(self, file_path_template, keys, file_formats,
+                 dictionaries=None, column_types=None, batch_size=10000):
+        self.file_path_template = file_path_template
+        self.keys = keys
+        self.file_formats = file_formats
+        self.dictionaries = {}
+        self.dictionary_index = {}
+        self.batch_size = batch_size
+        self.rows = []
+        self.parquet_writer = None
+        self.arrow_sink = None
+        self.arrow_writer = None
+
+        for key, values in (dictionaries or {}).items():
+            values = list(dict.fromkeys(values))
+            self.dictionaries[key] = pa.array(values, type=pa.string())
+            self.dictionary_index[key] = {v: i for i, v in enumerate(values)}
+        fields = []
+        for key in keys:
+            if key in self.dictionaries:
+                fields.append(pa.field(key, pa.dictionary(pa.int32(), pa.string())))
+            else:
+                fields.append(pa.field(key, (column_types or {}).get(key, pa.string())))
+        self.schema = pa.schema(fields)
+
+    def write_row(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.write_batch(self.__make_batch())
+            self.rows = []
+
+    def write_batch(self, batch):
+        self.write_table(pa.Table.from_batches([batch]))
+
+    def write_table(self, table):
+        if self.parquet_writer is None and self.arrow_writer is None:
+            self.__open_writers(table.schema)
+        if self.parquet_writer:
+            self.parquet_writer.write_table(table)
+        if self.arrow_writer:
+            self.arrow_writer.write_table(table)
+
+    def close(self):
+        self.flush()
+        if self.parquet_writer is None and self.arrow_writer is None:
+            # Write empty files with the header only
+            self.__open_writers(self.schema)
+        if self.parquet_writer:
+            self.parquet_writer.close()
+        if self.arrow_writer:
+            self.arrow_writer.close()
+            self.arrow_sink.close()
+
+    def abort(self):
+        """
+        Closes the open files without writing the remaining rows
+        """
+        self.rows = []
+        for writer in [self.parquet_writer, self.arrow_writer, self.arrow_sink]:
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception:
+                    # The export has already failed
+                    pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __open_writers(self, schema):
+        if "parquet" in self.file_formats:
+            self.parquet_writer = pq.ParquetWriter(
+                self.file_path_template.format("parquet"), schema,
+                compression="snappy"
+            )
+        if "arrow" in self.file_formats:
+            self.arrow_sink = pa.OSFile(self.file_path_template.format("arrow"), "wb")
+            self.arrow_writer = pa.ipc.new_file(self.arrow_sink, schema)
+
+    def __make_batch(self):
+        arrays = []
+        for i, field in enumerate(self.schema):
+            values = [row[i] for row in self.rows]
+            if field.name in self.dictionaries:
+                index = self.dictionary_index[field.name]
+                indices = pa.array([index.get(v) for v in values], type=pa.int32())
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    indices, self.dictionaries[field.name]))
+            elif pa.types.is_string(field.type):
+                arrays.append(pa.array(
+                    [None if v is None else str(v) for v in values],
+                    type=field.type))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+def dataframe_to_table(df):
+    """
+    Turns a (possibly wide format) pandas DataFrame into an Arrow table. The
+    index becomes ordinary columns and multi level column names are joined
+    with a space, as Parquet only supports flat string column names.
+    """
+    if any(name is not None for name in df.index.names):
+        df = df.reset_index()
+    else:
+        df = df.copy(deep=False)
+    df.columns = [
+        " ".join(str(c) for c in column if str(c) != "").strip()
+        if isinstance(column, tuple) else str(column)
+        for column in df.columns
+    ]
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_dataframe_columnar(df, file_path_template, file_formats):
+    """
+    Writes a pandas DataFrame to Parquet and/or Arrow IPC files.
+    """
+    writer = ColumnarFileWriter(file_path_template, [], file_formats)
+    writer.write_table(dataframe_to_table(df))
+    writer.close()
+
+
+def write_csv_columnar(csv_path, file_path_template, file_formats,
+                       block_size=16 * 1024 * 1024):
+    """
+    Converts a csv file to Parquet and/or Arrow IPC files. The csv file is
+    read in blocks of block_size bytes, so memory use does not depend on the
+    size of the file. All columns are read as strings.
+    """
+    with open(csv_path) as csv_file:
+        header = next(csv.reader(csv_file))
+    reader = pyarrow.csv.open_csv(
+        csv_path,
+        read_options=pyarrow.csv.ReadOptions(block_size=block_size),
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types={key: pa.string() for key in header},
+            strings_can_be_null=True
+        )
+    )
+    writer = ColumnarFileWriter(file_path_template, header, file_formats)
+    for batch in reader:
+        writer.write_batch(batch)
+    writer.close()
@@ -0,0 +1,231 @@
+"""
+Completeness calculations
+
+Used by the completeness resource and by the week level completeness
+exports, which call them directly instead of going through the API. The
+module does not import flask or meerkat_api, so the export tasks can use
+it without creating the API app.
+"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+from dateutil.parser import parse
+from pandas.tseries.offsets import CustomBusinessDay
+from sqlalchemy import or_
+
+import meerkat_abacus.util as abacus_util
+import meerkat_abacus.util.epi_week
+from meerkat_abacus.model import Data, Locations
+
+LOCATION_LEVELS = ("country", "zone", "region", "district", "clinic")
+
+
+def location_condition(session, location):
+    """
+    Returns the condition restricting the data to records in location, as
+    meerkat_api.util.data_query.location_condition
+    """
+    try:
+        location = int(location)
+    except (TypeError, ValueError):
+        location = None
+    level = session.query(Locations.level).filter(
+        Locations.id == location).scalar()
+    if level in LOCATION_LEVELS:
+        return getattr(Data, level) == location
+    return or_(getattr(Data, l) == location for l in LOCATION_LEVELS)
+
+
+def case_report_clinics(parent, locs):
+    """
+    Returns the case reporting clinics in parent
+    """
+    return [l for l in locs
+            if locs[l].case_report and abacus_util.is_child(parent, l, locs)]
+
+
+def load_completeness_data(session, variable, location, inc_case_types=None,
+                           exc_case_types=None, tag=None, start_date=None):
+    """
+    Returns the records of variable in location as a DataFrame with the
+    columns region, zone, district, clinic, date and variable. Each clinic
+    only has one record per day.
+
+    Args:
+        session: db session
+        variable: variable_id
+        location: location id
+        inc_case_types: only include records with one of these case types
+        exc_case_types: exclude records with all of these case types
+        tag: only include records with this tag
+        start_date: only include records from this date
+    """
+    conditions = [
+        Data.variables.has_key(variable),
+        location_condition(session, location),
+    ]
+    if exc_case_types:
+        conditions.append(~Data.case_type.contains(exc_case_types))
+    if inc_case_types:
+        conditions.append(Data.case_type.overlap(inc_case_types))
+    if tag:
+        conditions.append(Data.tags.has_key(tag))
+    if start_date:
+        conditions.append(Data.date >= start_date)
+    data = pd.read_sql(
+        session.query(Data.region, Data.zone, Data.district,
+                      Data.clinic, Data.date,
+                      Data.variables[variable].label(variable)).filter(
+            *conditions).statement, session.bind)
+    # We drop duplicates so each clinic can only have one record per day
+    return data.drop_duplicates(
+        subset=["region", "district", "clinic", "date", variable])
+
+
+def non_reporting_clinics(session, variable, location, locs,
+                          inc_case_types=None, exc_case_types=None):
+    """
+    Returns the case reporting clinics in location that have never
+    reported variable, restricted by the case types as in the non_reporting
+    resource.
+    """
+    clinics = case_report_clinics(location, locs)
+    query = session.query(Data.clinic).filter(
+        Data.variables.has_key(variable)).distinct()
+    clinics_with_variable = set(r[0] for r in query.all())
+    non_reporting = []
+    for clinic in clinics:
+        if clinic in clinics_with_variable:
+            continue
+        if inc_case_types:
+            if set(locs[clinic].case_type) & inc_case_types:
+                non_reporting.append(clinic)
+        elif exc_case_types:
+            if not set(locs[clinic].case_type) & exc_case_types:
+                non_reporting.append(clinic)
+        else:
+            non_reporting.append(clinic)
+    return non_reporting
+
+
+def parse_end_date(end_date):
+    if not end_date:
+        end_date = datetime.now()
+    else:
+        if isinstance(end_date, str):
+            end_date = parse(end_date)
+    return end_date
+
+
+def shifted_end_date_and_frequency(raw_end_date):
+    """
+    Returns the end of the last whole epi week before end_date and the
+    pandas frequency of the epi weeks.
+    """
+    # If end_date is the start of an epi week we do not want to include_case_type the current epi week
+    # We only calculate completeness for whole epi-weeks so we want to set end_date to the
+    # the end of the previous epi_week.
+    end_date = parse_end_date(raw_end_date)
+    epi_year_start_weekday = meerkat_abacus.util.epi_week.epi_year_start_date_by_year(year=end_date.year).weekday()
+    timeseries_freq = ["W-MON", "W-TUE", "W-WED", "W-THU", "W-FRI", "W-SAT", "W-SUN"][epi_year_start_weekday]
+    offset = (end_date.weekday() - epi_year_start_weekday) % 7
+    shifted_end_date = end_date - timedelta(days=offset + 1)
+    return shifted_end_date, timeseries_freq
+
+
+def epi_week_start(shifted_end_date, start_week):
+    beginning = meerkat_abacus.util.epi_week.epi_week_start_date(shifted_end_date.year, start_week)
+    shifted_end_date_epi_week = abacus_util.epi_week.epi_week_for_date(shifted_end_date)[1]
+    if shifted_end_date_epi_week == 53:
+        beginning = beginning.replace(year=beginning.year - 1)
+
+    return beginning
+
+
+def business_days(weekend_days):
+    if not weekend_days:
+        weekday_mask = "Mon Tue Wed Thu Fri"
+    else:
+        weekend_days = weekend_days.split(",")
+        weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+        weekday_mask = ""
+        for i, w in enumerate(weekdays):
+            if i not in weekend_days and str(i) not in weekend_days:
+                weekday_mask = weekday_mask + weekdays[i] + " "
+    bdays = CustomBusinessDay(weekmask=weekday_mask)
+    return bdays
+
+
+def sublevel_completeness(data, variable, locs, location, sublevel,
+                          number_per_week, start_week=1, end_date=None,
+                          weekend=None, non_reporting=None,
+                          inc_case_types=None, exc_case_types=None):
+    """
+    Calculates the number of records per week for each clinic in the
+    sublocations of location, counting at most number_per_week per week.
+
+    Args:
+        data: DataFrame from load_completeness_data
+        variable: variable_id
+        locs: all locations
+        location: location id
+        sublevel: level of the sublocations
+        number_per_week: expected number per week
+        start_week: first epi week
+        end_date: end of the period
+        weekend: weekend days in a comma separated string 0=Mon
+        non_reporting: clinics to leave out
+        inc_case_types: only include clinics with one of these case types
+        exc_case_types: exclude clinics with all of these case types
+    Returns:
+        completeness(Series): records per (sublocation, clinic, week) or
+                              None if there are no clinics
+    """
+    shifted_end_date, timeseries_freq = shifted_end_date_and_frequency(end_date)
+    beginning_of_epi_start_week = epi_week_start(shifted_end_date, start_week)
+
+    # Remove records dated on the days specified as weekends
+    expected_days = pd.date_range(beginning_of_epi_start_week,
+                                  shifted_end_date,
+                                  freq=business_days(weekend))
+    data = data[data['date'].isin(expected_days)]
+
+    # We first create an index with sublevel, clinic, dates
+    # Where dates are the dates after the clinic started reporting
+    sublocations = []
+    for l in locs.values():
+        if abacus_util.is_child(location, l.id, locs) and l.level == sublevel:
+            sublocations.append(l.id)
+    tuples = []
+    for name in sublocations:
+        for clinic in case_report_clinics(name, locs):
+            if locs[clinic].case_report:
+                if inc_case_types and not set(locs[clinic].case_type) & inc_case_types:
+                    continue
+                if exc_case_types and set(locs[clinic].case_type) >= exc_case_types:
+                    continue
+                start_date = locs[clinic].start_date
+                if start_date < beginning_of_epi_start_week:
+                    start_date = beginning_of_epi_start_week
+                if shifted_end_date - start_date < timedelta(days=7):
+                    start_date = (shifted_end_date - timedelta(days=6)).date()
+
+                for date in pd.date_range(start_date, shifted_end_date, freq=timeseries_freq):
+                    tuples.append((name, clinic, date))
+    if len(tuples) == 0:
+        return None
+
+    new_index = pd.MultiIndex.from_tuples(
+        tuples, names=[sublevel, "clinic", "date"])
+    completeness = data.groupby([
+        sublevel, "clinic", pd.Grouper(
+            key="date", freq=timeseries_freq, label="left")
+    ]).sum().reindex(new_index)[variable].fillna(0).sort_index()
+
+    #There is a bizarre bug that was supposedly fixed in 2018 that crashes if empty list is provided to drop from non-unique index. (https://github.com/pandas-dev/pandas/pull/21515)
+    if non_reporting:
+        completeness = completeness.drop(non_reporting, level=1)
+
+    # We only want to count a maximum of number per week per week
+    completeness[completeness > number_per_week] = number_per_week
+    return completeness
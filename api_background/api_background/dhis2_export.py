@@ -12,8 +12,9 @@ import requests
 
 from api_background._populate_locations import populate_row_locations, set_empty_locations
 from api_background.export_data import __get_keys_from_db
+from api_background.worker import get_worker_db, get_worker_engine
+from api_background.worker import worker_location_data
 from meerkat_abacus.model import form_tables
-from meerkat_abacus.util import get_db_engine, all_location_data
 
 try:
     from meerkat_abacus.config import config
@@ -22,8 +23,6 @@ except ImportError:
     config = {}
     dhis2_config = {}
 
-db, session = get_db_engine()
-
 __codes_to_ids = {}
 __form_keys_to_data_elements_dict = {}
 __dhis2_organisations = {}
@@ -305,6 +304,7 @@ def process_form_records(form_config, program_id):
     """
     status = form_config['status']
     form_name = form_config['name']
+    db, session = get_worker_db()
     results = session.query(form_tables()[form_name].data).all()
     event_payload_list = []
     for counter, result in enumerate(results):
@@ -452,14 +452,15 @@ def __get_form_keys(form_name=None):
     global __form_keys
     if not __form_keys.get(form_name):
         assert form_name
-        __form_keys[form_name] = __get_keys_from_db(db, form_name)
+        __form_keys[form_name] = __get_keys_from_db(get_worker_engine(), form_name)
     return __form_keys[form_name]
 
 
 if __name__ == "__main__":
     logger.info("Using config:\n {}".format(json.dumps(dhis2_config, indent=4)))
 
-    location_data = all_location_data(session)
+    db, session = get_worker_db()
+    location_data = worker_location_data(session)
     (locations, locs_by_deviceid, zones, regions, districts, devices) = location_data
 
     populate_dhis2_locations(locations, zones, regions, districts)
@@ -0,0 +1,160 @@
+"""
+Precomputed epi calendar
+
+The epi year and week of every day from FIRST_YEAR until the end of next
+year are calculated once with meerkat_abacus.util.epi_week and kept in
+NumPy arrays, so the epi week of a date, or of an array of dates, is a table
+lookup. Dates outside the calendar fall back to meerkat_abacus.
+
+The calendar can also be written to the epi_calendar table with
+    flask epi-calendar
+to be joined in SQL queries.
+
+The module does not import flask, so the export tasks can use it without
+creating the API app.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import Column, Date, Integer, MetaData, Table
+
+import meerkat_abacus.util.epi_week as epi_week_util
+
+FIRST_YEAR = 2010
+
+calendar_cache = {"calendar": None, "key": None}
+calendar_lock = threading.Lock()
+
+metadata = MetaData()
+epi_calendar_table = Table(
+    "epi_calendar", metadata,
+    Column("date", Date, primary_key=True),
+    Column("epi_year", Integer, nullable=False),
+    Column("epi_week", Integer, nullable=False),
+    Column("week_start", Date, nullable=False),
+)
+
+
+class EpiCalendar:
+    """
+    Epi year, epi week and start of the epi week for every day between the
+    start of the epi year first_year and the end of the epi year last_year.
+
+    Args:
+        first_year: first epi year
+        last_year: last epi year
+    """
+    def __init__(self, first_year, last_year):
+        self.first_year = first_year
+        self.last_year = last_year
+        start = epi_week_util.epi_year_start_date_by_year(first_year)
+        end = epi_week_util.epi_year_start_date_by_year(last_year + 1)
+        days = (end - start).days
+        self.first_day = np.datetime64(start.date(), "D")
+        self.epi_years = np.empty(days, dtype=np.int32)
+        self.epi_weeks = np.empty(days, dtype=np.int32)
+        for i in range(days):
+            self.epi_years[i], self.epi_weeks[i] = epi_week_util.epi_week_for_date(
+                start + timedelta(days=i))
+
+        # The week starts on the first day of each run of equal weeks
+        positions = np.arange(days)
+        new_week = np.ones(days, dtype=bool)
+        new_week[1:] = ((self.epi_years[1:] != self.epi_years[:-1]) |
+                        (self.epi_weeks[1:] != self.epi_weeks[:-1]))
+        self.week_starts = self.first_day + np.maximum.accumulate(
+            np.where(new_week, positions, 0))
+
+    def __len__(self):
+        return len(self.epi_years)
+
+    def lookup(self, dates):
+        """
+        Returns the epi years, epi weeks and week start dates of dates
+
+        Args:
+            dates: array like of dates or datetimes
+        Returns:
+            epi_years, epi_weeks, week_starts(tuple): NumPy arrays
+        """
+        days = np.asarray(dates, dtype="datetime64[D]")
+        index = (days - self.first_day).astype(np.int64)
+        inside = (index >= 0) & (index < len(self))
+        clipped = np.where(inside, index, 0)
+        epi_years = self.epi_years[clipped]
+        epi_weeks = self.epi_weeks[clipped]
+        week_starts = self.week_starts[clipped]
+        for i in np.flatnonzero(~inside):
+            date = days.flat[i].astype(datetime)
+            date = datetime(date.year, date.month, date.day)
+            epi_years.flat[i], epi_weeks.flat[i] = epi_week_util.epi_week_for_date(date)
+            week_starts.flat[i] = np.datetime64(
+                epi_week_util.epi_week_start_date(
+                    epi_years.flat[i], epi_weeks.flat[i]).date(), "D")
+        return epi_years, epi_weeks, week_starts
+
+    def rows(self):
+        """
+        Yields (date, epi_year, epi_week, week_start) for every day
+        """
+        for i in range(len(self)):
+            yield ((self.first_day + i).astype(datetime),
+                   int(self.epi_years[i]), int(self.epi_weeks[i]),
+                   self.week_starts[i].astype(datetime))
+
+
+def get_epi_calendar(first_year=FIRST_YEAR):
+    """
+    Returns the epi calendar until the end of next year. The calendar is
+    built on first use and again when the year changes.
+    """
+    key = (first_year, datetime.today().year + 1)
+    with calendar_lock:
+        if calendar_cache["key"] != key:
+            calendar_cache["calendar"] = EpiCalendar(*key)
+            calendar_cache["key"] = key
+        return calendar_cache["calendar"]
+
+
+def clear_epi_calendar():
+    """
+    Removes the cached calendar, e.g. after the epi week config has changed
+    """
+    with calendar_lock:
+        calendar_cache["key"] = None
+        calendar_cache["calendar"] = None
+
+
+def epi_weeks_for_dates(dates):
+    """
+    Returns the epi years, epi weeks and week start dates of an array of
+    dates as NumPy arrays
+    """
+    return get_epi_calendar().lookup(dates)
+
+
+def epi_week_for_date(date):
+    """
+    Returns (epi_year, epi_week) of date as
+    meerkat_abacus.util.epi_week.epi_week_for_date
+    """
+    epi_years, epi_weeks, week_starts = get_epi_calendar().lookup([date])
+    return int(epi_years[0]), int(epi_weeks[0])
+
+
+def write_epi_calendar_table(engine, calendar=None):
+    """
+    Creates the epi_calendar table and replaces its rows with the calendar
+    """
+    calendar = calendar or get_epi_calendar()
+    metadata.create_all(engine, tables=[epi_calendar_table])
+    with engine.begin() as connection:
+        connection.execute(epi_calendar_table.delete())
+        connection.execute(epi_calendar_table.insert(), [
+            {"date": date, "epi_year": epi_year, "epi_week": epi_week,
+             "week_start": week_start}
+            for date, epi_year, epi_week, week_start in calendar.rows()
+        ])
+    return len(calendar)
+
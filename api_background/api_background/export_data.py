@@ -2,11 +2,10 @@
 Functions to export data
 """
 import gettext
-import shelve
 import csv
+import functools
 import json
 import logging
-import xlsxwriter
 import os
 import yaml
 from sqlalchemy.orm import aliased
@@ -14,45 +13,53 @@ from sqlalchemy import text, or_, func, Float
 from dateutil.parser import parse
 from datetime import datetime
 from celery import task
-import requests
+from celery.signals import task_failure
+import urllib.parse
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+import numpy
 import pandas
+import psycopg2.extensions
+import pyarrow as pa
 from api_background._populate_locations import set_empty_locations, populate_row_locations
 from api_background.xls_csv_writer import XlsCsvFileWriter
+from api_background.columnar_writer import ColumnarFileWriter
+from api_background.columnar_writer import write_csv_columnar, write_dataframe_columnar
+from api_background.export_store import store_export
+from api_background.worker import get_worker_db, load_param_config
+from api_background.worker import worker_locations, worker_location_data
+from api_background import epi_calendar
+from api_background.completeness import load_completeness_data, \
+    non_reporting_clinics, sublevel_completeness, epi_week_start, \
+    shifted_end_date_and_frequency
 from meerkat_abacus import config
 from meerkat_abacus.model import DownloadDataFiles, AggregationVariables
 from meerkat_abacus.model import form_tables, Data, Links
-from meerkat_abacus.util import all_location_data, get_db_engine, get_links
-from meerkat_abacus.util import get_locations, is_child
+from meerkat_abacus.util import get_links, is_child
 from meerkat_abacus.util.epi_week import epi_week_for_date
 from api_background.celery_app import app
-import meerkat_libs
 
 base_folder = os.path.dirname(os.path.realpath(__file__))
 
 
 
 @app.task
-def export_data(uuid, allowed_location, use_loc_ids=False, param_config_yaml=yaml.dump(config)):
+def export_data(uuid, allowed_location, use_loc_ids=False, param_config_yaml=yaml.dump(config),
+                file_formats=None):
     """
-    Exports the data table from db
+    Exports the data table from db. The csv file is streamed from the
+    database with COPY, see __copy_data_table.
 
     Inserts finished file in to databse
 
     Args:
        uuid: uuid for download
        use_loc_ids: If we use names are location ids
+       file_formats: list of additional columnar formats (parquet, arrow)
     """
 
-    db, session = get_db_engine()
-    status = DownloadDataFiles(
-        uuid=uuid,
-        generation_time=datetime.now(),
-        type="data",
-        success=0,
-        status=0
-    )
-    session.add(status)
-    session.commit()
+    db, session = get_worker_db()
+    status = get_download_status(session, uuid, "data")
 
     results = session.query(
         func.distinct(
@@ -60,37 +67,14 @@ def export_data(uuid, allowed_location, use_loc_ids=False, param_config_yaml=yam
     variables = []
     for row in results:
         variables.append(row[0])
-    locs = get_locations(session)
-    fieldnames = ["id", "zone", "country", "region",
-                  "district", "clinic", "zone_id", "country_id", "region_id",
-                  "district_id", "clinic_id", "clinic_type",
-                  "geolocation", "date", "uuid"] + list(variables)
-    dict_rows = []
 
     filename = base_folder + "/exported_data/" + uuid + "/data"
     os.mkdir(base_folder + "/exported_data/" + uuid)
-    output = open(filename + ".csv", "w")
-    writer = csv.DictWriter(output, fieldnames, extrasaction="ignore")
-    writer.writeheader()
-    results = session.query(Data).yield_per(500)
-    i = 0
-    for row in results:
-        dict_row = dict(
-            (col, getattr(row, col)) for col in row.__table__.columns.keys()
-        )
-
-        for l in ["country", "zone", "region", "district", "clinic"]:
-            if dict_row[l]:
-                dict_row[l + "_id"] = dict_row[l]
-                dict_row[l] = locs[dict_row[l]].name
-
-        dict_row.update(dict_row.pop("variables"))
-        dict_rows.append(dict_row)
-        if i % 1000 == 0:
-            writer.writerows(dict_rows)
-            dict_rows = []
-        i += 1
-    writer.writerows(dict_rows)
+    with open(filename + ".csv", "w") as output:
+        __copy_data_table(db, output, variables)
+    if file_formats:
+        write_csv_columnar(filename + ".csv", filename + ".{}", file_formats)
+    store_export(uuid)
     status.status = 1
     status.success = 1
     session.commit()
@@ -101,7 +85,7 @@ def export_data(uuid, allowed_location, use_loc_ids=False, param_config_yaml=yam
 def export_category(uuid, form_name, category, download_name,
                     variables, data_type, allowed_location,
                     start_date=None, end_date=None, language="en",
-                    param_config_yaml=yaml.dump(config)):
+                    param_config_yaml=yaml.dump(config), file_formats=None):
     """
     We take a variable dictionary of form field name: display_name.
     There are some special commands that can be given in the form field name:
@@ -124,10 +108,11 @@ def export_category(uuid, form_name, category, download_name,
     Args:\n
        category: category to match\n
        variables: variable dictionary\n
+       file_formats: list of additional columnar formats (parquet, arrow)\n
 
     """
     # Runner loads the config object through a function parameter.
-    param_config = yaml.load(param_config_yaml, Loader=yaml.Loader)
+    param_config = load_param_config(param_config_yaml)
     country_config = param_config.country_config
     config_directory = param_config.config_directory
 
@@ -135,23 +120,15 @@ def export_category(uuid, form_name, category, download_name,
     translation_dir = country_config.get("translation_dir", None)
     t = get_translator(param_config, language)
 
-    db, session = get_db_engine()
-    db2, session2 = get_db_engine()
-    status = DownloadDataFiles(
-        uuid=uuid,
-        generation_time=datetime.now(),
-        type=download_name,
-        success=0,
-        status=0
-    )
-    session.add(status)
-    session.commit()
+    db, session = get_worker_db()
+    db2, session2 = get_worker_db()
+    status = get_download_status(session, uuid, download_name)
     res = session.query(AggregationVariables).filter(
         AggregationVariables.category.has_key(category)
     )
 
 
-    locs = get_locations(session)
+    locs = worker_locations(session)
     data_keys = []
     cat_variables = {}
     for r in res:
@@ -192,9 +169,9 @@ def export_category(uuid, form_name, category, download_name,
     if end_date:
         conditions.append(Data.date <= parse(end_date))
 
-    # Set up icd_code_to_name if needed and determine if
-    # alert_links are included
-    query_links = False
+    # Set up icd_code_to_name if needed and determine the number of
+    # alert_links included for every$ fields
+    many_links = {}
 
     to_columns_translations = {}
     for v in variables:
@@ -214,7 +191,7 @@ def export_category(uuid, form_name, category, download_name,
                     name = link_name + "_" + str(i) + " " + variable[1]
                     return_keys.append(name)
                     translation_dict[name] = "many_links&" + link_name + "&" + str(i) + "&" + variable[0]
-            query_links = link_name
+            many_links[link_name] = length or 0
         else:
             return_keys.append(v[1])
             translation_dict[v[1]] = v[0]
@@ -304,18 +281,25 @@ def export_category(uuid, form_name, category, download_name,
     link_id_index = {}
     joins = []
 
-    if query_links:
-        link_data = shelve.open(base_folder + "/exported_data/" + uuid)
-        link_data_query = session.query(Links).filter(Links.type == link_name).yield_per(300)
-        for row in link_data_query:
-            link_data[row.uuid_to] = row.data_to
-
     for i, l in enumerate(link_ids):
         form = aliased(form_tables(param_config)[links_by_name[l]["to_form"]])
         joins.append((form, Data.links[(l, -1)].astext == form.uuid))
         link_id_index[l] = i + 2
         columns.append(form.data)
 
+    # The linked records of every$ fields are joined in the query, one
+    # join per position in the links array to a CTE of the links
+    many_link_index = {}
+    for link_name, length in many_links.items():
+        linked = session.query(Links.uuid_to, Links.data_to).filter(
+            Links.type == link_name).distinct(Links.uuid_to).cte()
+        for number in range(length):
+            link = linked.alias()
+            joins.append((link, Data.links[(link_name, number)].astext ==
+                           link.c.uuid_to))
+            many_link_index[(link_name, number)] = len(columns)
+            columns.append(link.c.data_to)
+
     number_query = session2.query(func.count(Data.id)).join(
         form_tables(param_config)[form_name], Data.uuid == form_tables(param_config)[form_name].uuid)
 
@@ -327,318 +311,320 @@ def export_category(uuid, form_name, category, download_name,
     total_number = number_query.filter(*conditions).first()[0]
     results = results.filter(*conditions).yield_per(200)
 
-    locs = get_locations(session)
-    list_rows = []
+    locs = worker_locations(session)
+
+    with ExitStack() as writers:
+        xls_csv_writer = writers.enter_context(
+            XlsCsvFileWriter(base_folder, download_name, uuid))
+        xls_csv_writer.write_row(return_keys)
+
+        columnar_writer = None
+        if file_formats:
+            location_names = [l.name for l in locs.values()]
+            columnar_writer = writers.enter_context(ColumnarFileWriter(
+                xls_csv_writer.file_path_template, return_keys, file_formats,
+                dictionaries={
+                    k: location_names for k in return_keys
+                    if translation_dict[k] in ["clinic", "region", "zone", "district"]
+                }
+            ))
+
+        i = 0
+        # The category variables do not change during the export
+        category_variables = {}
+
+        def _list_category_variables(category, data_row):
+            """
+            Lists the variables from the specified category that are assigned to
+            the specified row. This can be used to create data columns such as
+            'Age Group' using 'category$ncd_age'.
+            """
+            # Get the category's variables' data, indexed by ID.
+            if category not in category_variables:
+                db_results = session.query(AggregationVariables).filter(
+                    AggregationVariables.category.has_key(category)
+                )
+                category_variables[category] = {
+                    variable.id: variable for variable in db_results
+                }
+            cat_variables = category_variables[category]
+            variable_list = ""
+            # Build a string listing the row's variables from specified category.
+            for var_id, var in cat_variables.items():
+                if var_id in r[0].variables:
+                    variable_list += var.name + ", "
+            # Remove the last comma and space.
+            return variable_list[:-2]
+
+        # Prepare each row
+        for r in results:
+            list_row = [''] * len(return_keys)
+            if not is_child(allowed_location, r[0].clinic, locs):
+                continue
 
-    filename = base_folder + "/exported_data/" + uuid + "/" + download_name
-    os.mkdir(base_folder + "/exported_data/" + uuid)
-    csv_content = open(filename + ".csv", "w")
-    csv_writer = csv.writer(csv_content)
-    csv_writer.writerows([return_keys])
-
-    # XlsxWriter with "constant_memory" set to true, flushes mem after each row
-    xls_content = open(filename + ".xlsx", "wb")
-    xls_book = xlsxwriter.Workbook(xls_content, {'constant_memory': True})
-    xls_sheet = xls_book.add_worksheet()
-
-    # xls_sheet = pyexcel.Sheet([keys])
-
-    # Little utility function write a row to file.
-    def write_xls_row(data, row, sheet):
-        for cell in range(len(data)):
-            xls_sheet.write(row, cell, data[cell])
-
-    write_xls_row(return_keys, 0, xls_sheet)
-
-    i = 0
-
-    def _list_category_variables(category, data_row):
-        """
-        Lists the variables from the specified category that are assigned to
-        the specified row. This can be used to create data columns such as
-        'Age Group' using 'category$ncd_age'.
-        """
-        # Get the category's variables' data, indexed by ID.
-        cat_variables = {}
-        variable_list = ""
-        db_results = session.query(AggregationVariables).filter(
-            AggregationVariables.category.has_key(category)
-        )
-        for variable in db_results:
-            cat_variables[variable.id] = variable
-        # Build a string listing the row's variables from specified category.
-        for var_id, var in cat_variables.items():
-            if var_id in r[0].variables:
-                variable_list += var.name + ", "
-        # Remove the last comma and space.
-        return variable_list[:-2]
-
-    # Prepare each row
-    for r in results:
-        list_row = [''] * len(return_keys)
-        if not is_child(allowed_location, r[0].clinic, locs):
-            continue
+            dates = {}
+            for k in return_keys:
+                form_var = translation_dict[k]
+                index = return_keys.index(k)
 
-        dates = {}
-        for k in return_keys:
-            form_var = translation_dict[k]
-            index = return_keys.index(k)
-
-            raw_data = r[1].data
-            if "many_links&" in form_var:
-                link_name, number, form_var = form_var.split("&")[1:]
-                number = int(number)
-                if link_name in r[0].links:
-                    links = r[0].links[link_name]
-                    if len(links) >= number + 1:
-                        link_uuid = links[number]
-                        raw_data = link_data[link_uuid]
-                    else:
+                raw_data = r[1].data
+                if "many_links&" in form_var:
+                    link_name, number, form_var = form_var.split("&")[1:]
+                    raw_data = r[many_link_index[(link_name, int(number))]]
+                    if raw_data is None:
                         list_row[index] = None
                         continue
 
-                else:
-                    list_row[index] = None
-                    continue
+                if "icd_name$" in form_var:
+                    fields = form_var.split("$")
+                    if len(fields) > 2:
+                        field = fields[1]
+                    else:
+                        field = "icd_code"
+                    if raw_data[field] in icd_code_to_name[form_var]:
+                        list_row[index] = icd_code_to_name[form_var][raw_data[
+                            field]]
+                    else:
+                        list_row[index] = None
+                elif form_var == "clinic":
+                    list_row[index] = locs[r[0].clinic].name
+                elif form_var == "region":
+                    list_row[index] = locs[r[0].region].name
+                elif form_var == "zone":
+                    list_row[index] = locs[r[0].zone].name
+                elif form_var == "district":
+                    if r[0].district:
+                        list_row[index] = locs[r[0].district].name
+                    else:
+                        list_row[index] = None
+                elif "$year" in form_var:
+                    field = form_var.split("$")[0]
+                    if field in raw_data and raw_data[field]:
+                        if field not in dates:
+                            dates[field] = parse(raw_data[field])
+                        list_row[index] = dates[field].year
+                    else:
+                        list_row[index] = None
+                elif "$month" in form_var:
+                    field = form_var.split("$")[0]
+                    if field in raw_data and raw_data[field]:
+                        if field not in dates:
+                            dates[field] = parse(raw_data[field])
+                        list_row[index] = dates[field].month
+                    else:
+                        list_row[index] = None
+                elif "$day" in form_var:
+                    field = form_var.split("$")[0]
+                    if field in raw_data and raw_data[field]:
+                        if field not in dates:
+                            dates[field] = parse(raw_data[field])
+                        list_row[index] = dates[field].day
+                    else:
+                        list_row[index] = None
+                elif "$quarter" in form_var:
+                    field = form_var.split("$")[0]
+                    if raw_data.get(field):
+                        if field not in dates:
+                            dates[field] = parse(raw_data[field])
+                        quarter = 1 + (dates[field].month - 1)//3
+                        list_row[index] = quarter
+                    else:
+                        list_row[index] = None
+                elif "$epi_week" in form_var:
+                    field = form_var.split("$")[0]
+                    if field in raw_data and raw_data[field]:
+                        if field not in dates:
+                            dates[field] = parse(raw_data[field])
+                        list_row[index] = epi_calendar.epi_week_for_date(dates[field])[1]
+                    else:
+                        list_row[index] = None
 
-            if "icd_name$" in form_var:
-                fields = form_var.split("$")
-                if len(fields) > 2:
-                    field = fields[1]
-                else:
-                    field = "icd_code"
-                if raw_data[field] in icd_code_to_name[form_var]:
-                    list_row[index] = icd_code_to_name[form_var][raw_data[
-                        field]]
-                else:
-                    list_row[index] = None
-            elif form_var == "clinic":
-                list_row[index] = locs[r[0].clinic].name
-            elif form_var == "region":
-                list_row[index] = locs[r[0].region].name
-            elif form_var == "zone":
-                list_row[index] = locs[r[0].zone].name
-            elif form_var == "district":
-                if r[0].district:
-                    list_row[index] = locs[r[0].district].name
-                else:
-                    list_row[index] = None
-            elif "$year" in form_var:
-                field = form_var.split("$")[0]
-                if field in raw_data and raw_data[field]:
-                    if field not in dates:
-                        dates[field] = parse(raw_data[field])
-                    list_row[index] = dates[field].year
-                else:
-                    list_row[index] = None
-            elif "$month" in form_var:
-                field = form_var.split("$")[0]
-                if field in raw_data and raw_data[field]:
-                    if field not in dates:
-                        dates[field] = parse(raw_data[field])
-                    list_row[index] = dates[field].month
-                else:
-                    list_row[index] = None
-            elif "$day" in form_var:
-                field = form_var.split("$")[0]
-                if field in raw_data and raw_data[field]:
-                    if field not in dates:
-                        dates[field] = parse(raw_data[field])
-                    list_row[index] = dates[field].day
-                else:
-                    list_row[index] = None
-            elif "$quarter" in form_var:
-                field = form_var.split("$")[0]
-                if raw_data.get(field):
-                    if field not in dates:
-                        dates[field] = parse(raw_data[field])
-                    quarter = 1 + (dates[field].month - 1)//3
-                    list_row[index] = quarter
-                else:
-                    list_row[index] = None
-            elif "$epi_week" in form_var:
-                field = form_var.split("$")[0]
-                if field in raw_data and raw_data[field]:
-                    if field not in dates:
-                        dates[field] = parse(raw_data[field])
-                    list_row[index] = epi_week_for_date(dates[field])[1]
-                else:
-                    list_row[index] = None
-
-            # A general framework for referencing links in the
-            # download data.
-            # link$<link id>$<linked form field>
-            elif "gen_link$" in form_var:
-                link = form_var.split("$")[1]
-                link_index = link_id_index[link]
-                if r[link_index]:
-                    list_row[index] = r[link_index].get(
-                        form_var.split("$")[2],
-                        None
-                    )
-                else:
-                    list_row[index] = None
-
-            elif "code" == form_var.split("$")[0]:
-                # code$cod_1,cod_2,Text_1,Text_2$default_value
-                split = form_var.split("$")
-                codes = split[1].split(",")
-                text = split[2].split(",")
-                if len(split) > 3:
-                    default_value = split[3]
-                else:
-                    default_value = None
-                final_text = []
-                for j in range(len(codes)):
-                    if codes[j] in r[0].variables:
-                        final_text.append(text[j])
-                if len(final_text) > 0:
-                    list_row[index] = " ".join(final_text)
-                else:
-                    list_row[index] = default_value
+                # A general framework for referencing links in the
+                # download data.
+                # link$<link id>$<linked form field>
+                elif "gen_link$" in form_var:
+                    link = form_var.split("$")[1]
+                    link_index = link_id_index[link]
+                    if r[link_index]:
+                        list_row[index] = r[link_index].get(
+                            form_var.split("$")[2],
+                            None
+                        )
+                    else:
+                        list_row[index] = None
 
-            elif "category" == form_var.split("$")[0]:
-                list_row[index] = _list_category_variables(
-                    form_var.split("$")[1],
-                    r
-                )
+                elif "code" == form_var.split("$")[0]:
+                    # code$cod_1,cod_2,Text_1,Text_2$default_value
+                    split = form_var.split("$")
+                    codes = split[1].split(",")
+                    text = split[2].split(",")
+                    if len(split) > 3:
+                        default_value = split[3]
+                    else:
+                        default_value = None
+                    final_text = []
+                    for j in range(len(codes)):
+                        if codes[j] in r[0].variables:
+                            final_text.append(text[j])
+                    if len(final_text) > 0:
+                        list_row[index] = " ".join(final_text)
+                    else:
+                        list_row[index] = default_value
 
-            elif "code_value" == form_var.split("$")[0]:
-                code = form_var.split("$")[1]
-                if code in r[0].variables:
-                    list_row[index] = float(r[0].variables[code])
-                else:
-                    list_row[index] = None
-            elif "value" == form_var.split(":")[0]:
-                list_row[index] = form_var.split(":")[1]
-            elif "$to_columns$" in form_var:
-                int_has_code = 0
-                field = form_var.split("$")[0]
-                codes = form_var.split("$")[-1].split(",")
-                str_elements = raw_data.get(field)
-                if type(str_elements) == str:
-                    elements = str_elements.split(" ")
-                    has_code = any(code in elements for code in codes)
-                    int_has_code = int(has_code)
-                list_row[index] = int_has_code
-            else:
-                if form_var.split("$")[0] in raw_data:
-                    list_row[index] = raw_data[form_var.split("$")[0]]
-                else:
-                    list_row[index] = None
-
-            # Standardise date formating
-            if "$date" in form_var:
-                field = form_var.split("$")[0]
-                if list_row[index]:
-                    if field not in dates:
-                        dates[field] = parse(list_row[index])
-                    list_row[index] = dates[field].strftime(
-                        "%d/%m/%Y"
+                elif "category" == form_var.split("$")[0]:
+                    list_row[index] = _list_category_variables(
+                        form_var.split("$")[1],
+                        r
                     )
-                else:
-                    list_row[index] = None
 
-            # If the final value is a float, round to 2 dp.
-            # This proceedure ensures integers are shown as integers.
-            # Also accepts string values.
-            try:
-                a = float(list_row[index])
-                b = int(float(list_row[index]))
-                if a == b:
-                    list_row[index] = b
-                else:
-                    list_row[index] = round(a, 2)
-            except (ValueError, TypeError):
-                pass
-
-            # If a translation dictionary is defined in which the key exists...
-            if min_translation and k in min_translation and list_row[index]:
-                tr_dict = min_translation[k]
-                if list_row[index] in tr_dict:
-                    list_row[index] = tr_dict[list_row[index]]
+                elif "code_value" == form_var.split("$")[0]:
+                    code = form_var.split("$")[1]
+                    if code in r[0].variables:
+                        list_row[index] = float(r[0].variables[code])
+                    else:
+                        list_row[index] = None
+                elif "value" == form_var.split(":")[0]:
+                    list_row[index] = form_var.split(":")[1]
+                elif "$to_columns$" in form_var:
+                    int_has_code = 0
+                    field = form_var.split("$")[0]
+                    codes = form_var.split("$")[-1].split(",")
+                    str_elements = raw_data.get(field)
+                    if type(str_elements) == str:
+                        elements = str_elements.split(" ")
+                        has_code = any(code in elements for code in codes)
+                        int_has_code = int(has_code)
+                    list_row[index] = int_has_code
                 else:
-                    parts = [x.strip() for x in str(list_row[index]).split(' ')]
-                    for x in range(len(parts)):
-                        # Get the translation using the appropriate key.
-                        # If that doesn't exist get the wild card key: *
-                        # If that doesn't exist just return the value
-                        parts[x] = str(
-                            tr_dict.get(parts[x], tr_dict.get('*', parts[x]))
+                    if form_var.split("$")[0] in raw_data:
+                        list_row[index] = raw_data[form_var.split("$")[0]]
+                    else:
+                        list_row[index] = None
+
+                # Standardise date formating
+                if "$date" in form_var:
+                    field = form_var.split("$")[0]
+                    if list_row[index]:
+                        if field not in dates:
+                            dates[field] = parse(list_row[index])
+                        list_row[index] = dates[field].strftime(
+                            "%d/%m/%Y"
                         )
-                    list_row[index] = ' '.join(list(filter(bool, parts)))
-
-            if translation_dir and language != "en" and list_row[index]:
-                list_row[index] = t.gettext(list_row[index])
-
-        list_rows.append(list_row)
-        # Can write row immediately to xls file as memory is flushed after.
-        write_xls_row(list_row, i + 1, xls_sheet)
-        # Append the row to list of rows to be written to csv.
-        if i % 1000 == 0:
-            logging.warning("{} rows completed...".format(i))
-            csv_writer.writerows(list_rows)
-            list_rows = []
-            status.status = i / total_number
-            session.commit()
-        i += 1
-    csv_writer.writerows(list_rows)
+                    else:
+                        list_row[index] = None
 
-    csv_content.close()
-    xls_book.close()
+                # If the final value is a float, round to 2 dp.
+                # This proceedure ensures integers are shown as integers.
+                # Also accepts string values.
+                try:
+                    a = float(list_row[index])
+                    b = int(float(list_row[index]))
+                    if a == b:
+                        list_row[index] = b
+                    else:
+                        list_row[index] = round(a, 2)
+                except (ValueError, TypeError):
+                    pass
+
+                # If a translation dictionary is defined in which the key exists...
+                if min_translation and k in min_translation and list_row[index]:
+                    tr_dict = min_translation[k]
+                    if list_row[index] in tr_dict:
+                        list_row[index] = tr_dict[list_row[index]]
+                    else:
+                        parts = [x.strip() for x in str(list_row[index]).split(' ')]
+                        for x in range(len(parts)):
+                            # Get the translation using the appropriate key.
+                            # If that doesn't exist get the wild card key: *
+                            # If that doesn't exist just return the value
+                            parts[x] = str(
+                                tr_dict.get(parts[x], tr_dict.get('*', parts[x]))
+                            )
+                        list_row[index] = ' '.join(list(filter(bool, parts)))
+
+                if translation_dir and language != "en" and list_row[index]:
+                    list_row[index] = t.gettext(list_row[index])
+
+            xls_csv_writer.write_row(list_row)
+            if columnar_writer:
+                columnar_writer.write_row(list_row)
+            if i % 1000 == 0:
+                logging.warning("{} rows completed...".format(i))
+                status.status = i / total_number
+                session.commit()
+            i += 1
 
-    xls_content.close()
+    store_export(uuid)
     status.status = 1
     status.success = 1
     session.commit()
-
-    if query_links:
-        link_data.close()
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        filename = dir_path + "/exported_data/" + uuid
-        logging.warning("Filename: " + filename)
-        if os.path.exists(filename + ".dir"):
-            os.remove(filename + ".dir")
-        if os.path.exists(filename + ".dat"):
-            os.remove(filename + ".dat")
     return True
 
 
-def construct_completeness_call(variable_config, sublevel, start_date, end_date):
+COMPLETENESS_ARGS = ["variable", "location", "number_per_week", "start_week",
+                     "weekend", "non_reporting_variable", "end_date"]
+
+
+def parse_completeness_call(variable_config):
     """
-    Construct the correct completess calls based on the dates
+    Returns the arguments of a completeness api call, e.g.
+    completeness:/completeness/reg_1/1/4/<start_week>/5,6/reg_1/<end_date>
 
     Args:\n
        variable_config: The base api call
-       sublevel: The level to aggregate over
+    Returns:\n
+       args(dict): the arguments of the completeness resource and the
+                   inc_case_types, exc_case_types and tag of the query string
+    """
+    url = urllib.parse.urlsplit(variable_config.split(":", 1)[1])
+    parts = url.path.strip("/").split("/")[1:]
+    args = dict(zip(COMPLETENESS_ARGS, parts))
+    query = urllib.parse.parse_qs(url.query)
+    for key in ["inc_case_types", "exc_case_types"]:
+        args[key] = set(json.loads(query.get(key, ["[]"])[0]))
+    args["tag"] = query.get("tag", [None])[0]
+    if args.get("weekend") in [None, "None"]:
+        args["weekend"] = None
+    if not args.get("non_reporting_variable"):
+        args["non_reporting_variable"] = args["variable"]
+    return args
+
+
+def completeness_years(start_date, end_date):
+    """
+    Splits the period in epi years as the completeness is calculated per year
+
+    Args:\n
        start_date: Start date
        end_date: End date
+    Returns:\n
+       years(list): list of (year, start_week, end_date)
     """
-    api_calls = []
+    years = []
     for year in range(start_date.year, end_date.year + 1):
         year_start_week = 1
-        year_end_date_str = "{}-12-31".format(year)
+        year_end_date = datetime(year, 12, 31)
         if year == start_date.year:
             year_start_week = epi_week_for_date(start_date)[1]
             if year_start_week > 52:
                 year_start_week = 1
         if year == end_date.year:
-            year_end_date_str = end_date.isoformat()
-        api_call = variable_config.split(":")[1]
-        api_call = api_call.replace("<start_week>", str(year_start_week))
-        api_call = api_call.replace("<end_date>", str(year_end_date_str))
-        api_call += "?sublevel={}".format(sublevel)
-        api_calls.append((api_call, year, year_start_week))
-    return api_calls
+            year_end_date = end_date
+        years.append((year, year_start_week, year_end_date))
+    return years
 
 
 def _export_week_level_completeness(uuid, download_name, level,
                                     completeness_config, translator, param_config,
                                     start_date=None, end_date=None,
-                                    wide_data_format=False):
+                                    wide_data_format=False, file_formats=None):
     """
     Exports completeness data by location and week ( and year),
 
+    The completeness is calculated in this process with
+    api_background.completeness from one load of the data, the years are
+    calculated in parallel.
+
     Args:\n
       uuid: uuid for the download process
       download_name: Name of download file
@@ -649,54 +635,94 @@ def _export_week_level_completeness(uuid, download_name, level,
       start_date: The date to start the data set
       end_date: End date for the aggregation
       wide_data_format: If true the data is returned in the wide format, else in long format
+      file_formats: list of additional columnar formats (parquet, arrow)
     """
-    db, session = get_db_engine()
-    locs = get_locations(session)
+    db, session = get_worker_db()
+    locs = worker_locations(session)
     operation_status = OperationStatus(download_name, uuid)
 
     if start_date:
         start_date = parse(start_date).replace(tzinfo=None)
     if end_date:
         end_date = parse(end_date).replace(tzinfo=None)
-    completeness_calls = construct_completeness_call(completeness_config[0],
-                                                     level,
-                                                     start_date,
-                                                     end_date)
-    jwt_auth_token = meerkat_libs.authenticate(
-        username=param_config.server_auth_username,
-        password=param_config.server_auth_password,
-        auth_root=param_config.auth_root)
-    if not jwt_auth_token:
-        raise AttributeError("Not sucessfully logged in for api access")
-    headers = {'content-type': 'application/json',
-               'authorization': 'Bearer {}'.format(jwt_auth_token)}
-    data = []
+    args = parse_completeness_call(completeness_config[0])
+    location = int(args["location"])
+    number_per_week = int(args["number_per_week"])
+    years = completeness_years(start_date, end_date)
 
     year_label = translator.gettext("Year")
     location_label = translator.gettext(level.title())
     week_label = translator.gettext("Week")
     district_label = translator.gettext("District")
     completeness_config_label = translator.gettext(completeness_config[1])
-
-    for call, year, start_week in completeness_calls:
-        api_result = requests.get(param_config.api_root + call, headers=headers)
-        timeline = api_result.json()["timeline"]
-        max_per_week = int(call.split("/")[4])  # Extract the maximum number from api call
-        for location in timeline:
-            loc_id = int(location)
-            for week in range(len(timeline[location]["weeks"])):
-                week_start_day = datetime.strptime(timeline[location]["weeks"][week], '%Y-%m-%dT%H:%M:%S')
-                data.append({year_label: year,
-                             location_label: locs[loc_id].name,
-                             week_label: epi_week_for_date(week_start_day)[1],
-                             completeness_config_label: timeline[location]["values"][week] / max_per_week * 100
-                             })
-                if level == "clinic" and loc_id != 1:
-                    data[-1][district_label] = locs[locs[loc_id].parent_location].name
+    columns = [year_label, location_label, week_label, completeness_config_label]
+    if level == "clinic":
+        columns.append(district_label)
+
+    def year_completeness(data, non_reporting, year_args):
+        year, start_week, year_end_date = year_args
+        completeness = sublevel_completeness(
+            data, args["variable"], locs, location, level, number_per_week,
+            start_week=start_week, end_date=year_end_date,
+            weekend=args["weekend"], non_reporting=non_reporting,
+            inc_case_types=args["inc_case_types"],
+            exc_case_types=args["exc_case_types"]
+        )
+        if completeness is None:
+            return None
+        location_per_week = completeness.groupby(level=2).mean()
+        sublocations_per_week = completeness.groupby(level=[0, 2]).mean()
+        return pandas.DataFrame({
+            "location": [location] * len(location_per_week) +
+            list(sublocations_per_week.index.get_level_values(0)),
+            "date": list(location_per_week.index) +
+            list(sublocations_per_week.index.get_level_values(1)),
+            completeness_config_label: numpy.concatenate([
+                location_per_week.values, sublocations_per_week.values
+            ]) / number_per_week * 100,
+            year_label: year
+        })
+
+    frames = []
+    if years:
+        # Only load the records in the weeks of the exported years
+        first_week_start = min(
+            epi_week_start(shifted_end_date_and_frequency(year_end_date)[0], start_week)
+            for year, start_week, year_end_date in years
+        )
+        data = load_completeness_data(
+            session, args["variable"], location,
+            inc_case_types=args["inc_case_types"],
+            exc_case_types=args["exc_case_types"], tag=args["tag"],
+            start_date=first_week_start
+        )
+        non_reporting = non_reporting_clinics(
+            session, args["non_reporting_variable"], location, locs,
+            args["inc_case_types"], args["exc_case_types"]
+        )
+        if len(data) > 0:
+            with ThreadPoolExecutor(max_workers=min(len(years), 4)) as executor:
+                frames = [f for f in executor.map(
+                    functools.partial(year_completeness, data, non_reporting),
+                    years) if f is not None]
+        del data
+    if frames:
+        df = pandas.concat(frames, ignore_index=True)
+        df[week_label] = epi_calendar.epi_weeks_for_dates(df["date"].values)[1]
+        location_ids = df["location"].drop_duplicates()
+        df[location_label] = df["location"].map(
+            {l: locs[l].name for l in location_ids})
+        if level == "clinic":
+            df[district_label] = df["location"].map({
+                l: locs[locs[l].parent_location].name
+                for l in location_ids if l != location
+            })
+        df = df[columns]
+    else:
+        df = pandas.DataFrame(columns=columns)
 
     filename = base_folder + "/exported_data/" + uuid + "/" + download_name
     os.mkdir(base_folder + "/exported_data/" + uuid)
-    df = pandas.DataFrame(data)
     if wide_data_format:
         if level == "clinic":
             index_labels = [year_label, district_label, location_label, week_label]
@@ -705,6 +731,8 @@ def _export_week_level_completeness(uuid, download_name, level,
         df = df.set_index(index_labels).unstack()
     df.to_csv(filename + ".csv")
     df.to_excel(filename + ".xlsx")
+    if file_formats:
+        write_dataframe_columnar(df, filename + ".{}", file_formats)
     operation_status.submit_operation_success()
 
 
@@ -728,7 +756,7 @@ def get_translator(param_config, language):
 def export_week_level(uuid, download_name, level,
                       variable_config, start_date=None, end_date=None,
                       wide_data_format=False, language="en",
-                      param_config_yaml=yaml.dump(config)):
+                      param_config_yaml=yaml.dump(config), file_formats=None):
     """
     Export aggregated data by location and week ( and year),
 
@@ -742,27 +770,31 @@ def export_week_level(uuid, download_name, level,
       end_date: End date for the aggregation
       wide_data_format: If true the data is returned in the wide format, else in long format
       param_config: The configuration values
+      file_formats: list of additional columnar formats (parquet, arrow)
     """
-    param_config = yaml.load(param_config_yaml, Loader=yaml.Loader)
+    param_config = load_param_config(param_config_yaml)
     translator = get_translator(param_config, language)
     if "completeness" in variable_config[0]:
         _export_week_level_completeness(uuid, download_name, level,
                                         variable_config, translator,
                                         param_config, start_date=start_date,
-                                        end_date=end_date, wide_data_format=wide_data_format)
+                                        end_date=end_date, wide_data_format=wide_data_format,
+                                        file_formats=file_formats)
     else:
         _export_week_level_variable(uuid, download_name, level,
                                     variable_config, translator,
                                     start_date=start_date, end_date=end_date,
                                     wide_data_format=wide_data_format,
-                                    param_config_yaml=param_config_yaml)
+                                    param_config_yaml=param_config_yaml,
+                                    file_formats=file_formats)
 
 
 def _export_week_level_variable(uuid, download_name, level,
                                 variable_config, translator,
                                 start_date=None, end_date=None,
                                 wide_data_format=False,
-                                param_config_yaml=yaml.dump(config)):
+                                param_config_yaml=yaml.dump(config),
+                                file_formats=None):
     """
     Export aggregated data by location and week ( and year),
 
@@ -798,7 +830,8 @@ def _export_week_level_variable(uuid, download_name, level,
                              start_date=start_date,
                              end_date=end_date,
                              wide_data_format=wide_data_format,
-                             param_config_yaml=param_config_yaml)
+                             param_config_yaml=param_config_yaml,
+                             file_formats=file_formats)
 
         
 @app.task
@@ -807,10 +840,15 @@ def export_data_table(uuid, download_name,
                       location_conditions=None,
                       start_date=None, end_date=None,
                       wide_data_format=False,
-                      param_config_yaml=yaml.dump(config)):
+                      param_config_yaml=yaml.dump(config),
+                      file_formats=None):
     """
     Export an aggregated data table restricted by restrict by,
 
+    The rows are streamed from the database and written as they are read.
+    In the wide format the last group by key becomes the columns, named
+    "<variable> <value>".
+
     Args:\n
       uuid: uuid for the download process
       variables: the variables we want to aggregate
@@ -820,11 +858,11 @@ def export_data_table(uuid, download_name,
       end_date: End date for the aggregation
       wide_data_format: If true the data is returned in the wide format, else in long format
       param_config: The configuration values
+      file_formats: list of additional columnar formats (parquet, arrow)
     """
     return_keys = []
-    db, session = get_db_engine()
-    locs = get_locations(session)
-    list_rows = []
+    db, session = get_worker_db()
+    locs = worker_locations(session)
     operation_status = OperationStatus(download_name, uuid)
     level = "region"
     columns = []
@@ -856,6 +894,15 @@ def export_data_table(uuid, download_name,
     if end_date:
         end_date = parse(end_date).replace(tzinfo=None)
         conditions.append(Data.date <= end_date)
+    if location_conditions and location_subs:
+        # Leave out the records in locations excluded by the condition
+        attribute, value = location_conditions[0]
+        excluded_locations = [l for l, loc in locs.items()
+                              if value in (getattr(loc, attribute) or [])]
+        if excluded_locations:
+            for l in location_subs:
+                conditions.append(or_(groups[l].is_(None),
+                                      groups[l].notin_(excluded_locations)))
     for v in variables:
         if only_latest_from_clinic_in_week:
             columns.append(Data.variables[v[0]].astext.cast(Float))
@@ -869,37 +916,87 @@ def export_data_table(uuid, download_name,
     else:
         result = session.query(*columns).filter(*conditions).group_by(*groups)
 
-    filename = base_folder + "/exported_data/" + uuid + "/" + download_name
-    os.mkdir(base_folder + "/exported_data/" + uuid)
-    i = 0
-    for row in result:
-        row_list = list(row)
-        location_condition = True
-        for l in location_subs:
-            if row_list[l]:
-                if location_conditions:
-                    tmp = getattr(locs[row_list[l]], location_conditions[0][0])
-                    if location_conditions[0][1] in tmp:
-                        location_condition = False
-                row_list[l] = locs[row_list[l]].name
-        if location_condition:
-            row_list = [x if x is not None else 0 for x in row_list]
-            list_rows.append(row_list)
-            i += 1
-
-    df = pandas.DataFrame(list_rows, columns=return_keys)
+    # The rows are streamed from the database ordered by the group by keys,
+    # so the wide rows can be written as soon as all their values are read
+    index_length = len(return_keys) - len(variables)
+    result = result.subquery()
+    keys = list(result.c)[:index_length]
+    pivot_names = []
     if wide_data_format:
-        df = df.set_index(return_keys[:-len(variables)]).unstack().fillna(0)
+        # The last key becomes the columns of the wide table. Every record
+        # matching the conditions is in a group, so the values of the key
+        # can be read without aggregating.
+        if only_latest_from_clinic_in_week:
+            pivot_query = session.query(keys[-1]).distinct().order_by(keys[-1])
+        else:
+            pivot_query = session.query(groups[-1]).filter(
+                *conditions).distinct().order_by(groups[-1])
+        pivot_values = []
+        for row in pivot_query:
+            value = row[0] if row[0] is not None else 0
+            if index_length - 1 in location_subs and value:
+                value = locs[value].name
+            if value not in pivot_values:
+                pivot_values.append(value)
+        pivot_index = {value: i for i, value in enumerate(pivot_values)}
+        pivot_names = ["{} {}".format(v[1], value)
+                       for v in variables for value in pivot_values]
+        header = return_keys[:index_length - 1] + pivot_names
+    else:
+        header = return_keys
+    result = session.query(result).order_by(*keys).yield_per(1000)
+
+    with ExitStack() as writers:
+        xls_csv_writer = writers.enter_context(
+            XlsCsvFileWriter(base_folder, download_name, uuid))
+        xls_csv_writer.write_row(header)
+        columnar_writer = None
+        if file_formats:
+            location_names = [l.name for l in locs.values()]
+            columnar_writer = writers.enter_context(ColumnarFileWriter(
+                xls_csv_writer.file_path_template, header, file_formats,
+                dictionaries={return_keys[l]: location_names for l in location_subs
+                              if return_keys[l] in header},
+                column_types={k: pa.float64() for k in
+                              [v[1] for v in variables] + pivot_names}
+            ))
+
+        def write_row(row_list):
+            xls_csv_writer.write_row(row_list)
+            if columnar_writer:
+                columnar_writer.write_row(row_list)
+
+        wide_key = None
+        wide_values = None
+        for row in result:
+            row_list = list(row)
+            for l in location_subs:
+                if row_list[l]:
+                    row_list[l] = locs[row_list[l]].name
+            row_list = [x if x is not None else 0 for x in row_list]
+            if not wide_data_format:
+                write_row(row_list)
+                continue
+            key = row_list[:index_length - 1]
+            if key != wide_key:
+                if wide_key is not None:
+                    write_row(wide_key + wide_values)
+                wide_key = key
+                wide_values = [0] * len(pivot_names)
+            position = pivot_index[row_list[index_length - 1]]
+            for j in range(len(variables)):
+                wide_values[j * len(pivot_values) + position] = row_list[index_length + j]
+        if wide_key is not None:
+            write_row(wide_key + wide_values)
 
-    df.to_csv(filename + ".csv")
-    df.to_excel(filename + ".xlsx")
     operation_status.submit_operation_success()
 
     return True
 
 
 @app.task
-def export_form(uuid, form, allowed_location, fields=None, param_config_yaml=yaml.dump(config)):
+def export_form(uuid, form, allowed_location, fields=None, param_config_yaml=yaml.dump(config),
+                file_formats=None):
     """
     Export a form. If fields is in the request variable we only include
     those fields.
@@ -911,6 +1008,7 @@ def export_form(uuid, form, allowed_location, fields=None, param_config_yaml=yam
        form: the form to export\n
        allowed_location: will extract result only for this location
        fields: Fields from form to export\n
+       file_formats: list of additional columnar formats (parquet, arrow)\n
 
     Returns:\n
         bool: The return value. True for success, False otherwise.\n
@@ -918,15 +1016,15 @@ def export_form(uuid, form, allowed_location, fields=None, param_config_yaml=yam
     """
 
     # Runner loads the config object through a function parameter.
-    param_config = yaml.load(param_config_yaml, Loader=yaml.Loader)
+    param_config = load_param_config(param_config_yaml)
 
-    db, session = get_db_engine()
+    db, session = get_worker_db()
     operation_status = OperationStatus(form, uuid)
     if form not in form_tables(param_config):
         operation_status.submit_operation_failure()
         return False
 
-    location_data = all_location_data(session)
+    location_data = worker_location_data(session)
     locs_by_deviceid = location_data[1]
     if locs_by_deviceid is None:
         operation_status.submit_operation_failure()
@@ -937,18 +1035,73 @@ def export_form(uuid, form, allowed_location, fields=None, param_config_yaml=yam
     else:
         keys = __get_keys_from_db(db, form, param_config)
 
-    xls_csv_writer = XlsCsvFileWriter(base_folder, form, uuid)
-    xls_csv_writer.write_xls_row(keys)
-    xls_csv_writer.write_csv_row(keys)
-
-    query_form_data = session.query(form_tables(param_config)[form].data)
-    __save_form_data(xls_csv_writer, query_form_data, operation_status, keys, allowed_location, location_data)
+    with ExitStack() as writers:
+        xls_csv_writer = writers.enter_context(
+            XlsCsvFileWriter(base_folder, form, uuid))
+        xls_csv_writer.write_row(keys)
+
+        columnar_writer = None
+        if file_formats:
+            location_names = [l.name for l in location_data[0].values()] + [""]
+            columnar_writer = writers.enter_context(ColumnarFileWriter(
+                xls_csv_writer.file_path_template, keys, file_formats,
+                dictionaries={k: location_names for k in keys
+                              if k in ["clinic", "region", "district"]}
+            ))
+
+        query_form_data = session.query(form_tables(param_config)[form].data)
+        __save_form_data(xls_csv_writer, query_form_data, operation_status, keys, allowed_location, location_data,
+                         columnar_writer=columnar_writer)
     operation_status.submit_operation_success()
-    xls_csv_writer.flush_csv_buffer()
-    xls_csv_writer.close_cvs_xls_buffers()
     return True
 
 
+LOCATION_LEVELS = ["zone", "country", "region", "district", "clinic"]
+
+
+def __copy_data_table(db, output, variables):
+    """
+    Writes the whole data table as csv to output using PostgreSQL COPY.
+
+    The location names are joined in the database and the variables are
+    projected from the variables JSONB column, so the rows are streamed
+    straight from the database to the file without being turned into
+    python objects.
+
+    Args:
+       db: db engine
+       output: file object to write the csv to
+       variables: list of variable ids to include as columns
+    """
+    connection = db.raw_connection()
+    try:
+        cursor = connection.cursor()
+        columns = ["data.id"]
+        joins = []
+        for level in LOCATION_LEVELS:
+            columns.append("{level}_location.name AS {level}".format(level=level))
+            joins.append(
+                "LEFT JOIN locations AS {level}_location "
+                "ON {level}_location.id = data.{level}".format(level=level)
+            )
+        for level in LOCATION_LEVELS:
+            columns.append("data.{level} AS {level}_id".format(level=level))
+        columns += ["data.clinic_type", "data.geolocation",
+                    "data.date", "data.uuid"]
+        for variable in variables:
+            columns.append("data.variables ->> {} AS {}".format(
+                cursor.mogrify("%s", (variable,)).decode("utf-8"),
+                psycopg2.extensions.quote_ident(variable, cursor)
+            ))
+        sql = "COPY (SELECT {} FROM data {} ORDER BY data.id) TO STDOUT WITH CSV HEADER".format(
+            ", ".join(columns), " ".join(joins)
+        )
+        cursor.copy_expert(sql, output)
+        cursor.close()
+    finally:
+        connection.close()
+
+
 def __get_keys_from_db(db, form, param_config=config):
     keys = ["clinic", "region", "district"]
     sql = text(f"SELECT DISTINCT(jsonb_object_keys(data)) from {form_tables(param_config)[form].__tablename__}")
@@ -958,19 +1111,37 @@ def __get_keys_from_db(db, form, param_config=config):
     return keys
 
 
+def get_download_status(session, uuid, download_type):
+    """
+    Returns the DownloadDataFiles record for the download, creating it if it
+    does not exist yet. The API creates the record when the export is queued,
+    so identical requests can find the export while it is generated.
+
+    Args:
+       session: db session
+       uuid: uuid of the download
+       download_type: type of the download (used as filename)
+    Returns:
+       status(DownloadDataFiles): the status record
+    """
+    status = session.query(DownloadDataFiles).filter(
+        DownloadDataFiles.uuid == uuid).first()
+    if status is None:
+        status = DownloadDataFiles(uuid=uuid)
+        session.add(status)
+    status.generation_time = datetime.now()
+    status.type = download_type
+    status.success = 0
+    status.status = 0.0
+    session.commit()
+    return status
+
+
 class OperationStatus:
     def __init__(self, form, uuid):
-        self.db, self.session = get_db_engine()
-        self.__initialize(form, uuid)
-
-    def __initialize(self, form, uuid):
-        self.download_data_file = DownloadDataFiles(uuid=uuid,
-                                                    generation_time=datetime.now(),
-                                                    type=form,
-                                                    success=0,
-                                                    status=0.0)
-        self.session.add(self.download_data_file)
-        self.session.commit()
+        self.db, self.session = get_worker_db()
+        self.uuid = uuid
+        self.download_data_file = get_download_status(self.session, uuid, form)
 
     def update_operation_status(self, status):
         self.download_data_file.status = status
@@ -978,6 +1149,7 @@ class OperationStatus:
         self.session.commit()
 
     def submit_operation_success(self):
+        store_export(self.uuid)
         self.download_data_file.status = 1.0
         self.download_data_file.success = 1
         self.session.commit()
@@ -988,7 +1160,35 @@ class OperationStatus:
         self.session.commit()
 
 
-def __save_form_data(xls_csv_writer, query_form_data, operation_status, keys, allowed_location, location_data):
+EXPORT_TASKS = {export_data.name, export_category.name, export_week_level.name,
+                export_data_table.name, export_form.name}
+
+
+@task_failure.connect
+def mark_export_failed(sender=None, task_id=None, args=None, **kwargs):
+    """
+    Marks the download of a failed export task as finished without success.
+    Celery also sends task_failure when the worker process running the task
+    is lost, e.g. killed for its memory use. The API queues the export
+    again for the next identical request instead of waiting for the export
+    timeout.
+    """
+    if getattr(sender, "name", None) not in EXPORT_TASKS or not args:
+        return
+    db, session = get_worker_db()
+    try:
+        status = session.query(DownloadDataFiles).filter(
+            DownloadDataFiles.uuid == args[0]).first()
+        if status is not None and status.status != 1.0:
+            status.status = 1.0
+            status.success = 0
+            session.commit()
+    finally:
+        session.close()
+
+
+def __save_form_data(xls_csv_writer, query_form_data, operation_status, keys, allowed_location, location_data,
+                     columnar_writer=None):
     (locations, locs_by_deviceid, zones, regions, districts, devices) = location_data
     results = query_form_data.yield_per(1000)
     results_count = query_form_data.count()
@@ -1021,8 +1221,9 @@ def __save_form_data(xls_csv_writer, query_form_data, operation_status, keys, al
                 continue
             set_empty_locations(keys, row)
 
-        xls_csv_writer.write_xls_row(row)
-        xls_csv_writer.write_csv_row(row)
+        xls_csv_writer.write_row(row)
+        if columnar_writer:
+            columnar_writer.write_row(row)
 
         five_percent_progress = i % (results_count / 20) == 0
         if five_percent_progress:
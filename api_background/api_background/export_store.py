@@ -0,0 +1,115 @@
+"""
+Store for the generated export files
+
+Exports are keyed by a hash of the task, its parameters, the allowed
+location and the versions of the tables it reads, so identical requests
+share the same files. The files live in exported_data/<key>/ and are
+served by the web server. When compression is switched on the files are replaced by gzipped
+copies, to be served with nginx's gzip_static/gunzip modules.
+
+The store is limited by age and by total size, the least recently used
+exports are evicted first.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid as uuid_module
+
+export_folder = os.path.dirname(os.path.realpath(__file__)) + "/exported_data"
+
+MAX_BYTES = int(os.environ.get("MEERKAT_EXPORT_STORE_MAX_BYTES", 10 * 1024 ** 3))
+MAX_AGE = int(os.environ.get("MEERKAT_EXPORT_STORE_MAX_AGE", 24 * 3600))
+COMPRESS = os.environ.get("MEERKAT_EXPORT_STORE_COMPRESS", "0") not in ["0", ""]
+
+
+def export_key(task_name, args, kwargs, allowed_location, watermark):
+    """
+    Returns the key of an export. The key is formatted as a uuid, so it can
+    be used everywhere the random download uuids were used before.
+
+    Args:
+       task_name: name of the export task
+       args: positional arguments of the task
+       kwargs: keyword arguments of the task
+       allowed_location: the allowed location of the user
+       watermark: value that changes when the exported tables change
+    Returns:
+       key(str): uuid formatted key
+    """
+    description = json.dumps([task_name, args, kwargs,
+                              allowed_location, watermark],
+                             sort_keys=True, default=str)
+    digest = hashlib.sha256(description.encode("utf-8")).hexdigest()
+    return str(uuid_module.UUID(hex=digest[:32]))
+
+
+def export_directory(uid):
+    return export_folder + "/" + uid
+
+
+def has_export(uid):
+    """
+    Returns True if the files of the export are in the store and marks the
+    export as recently used.
+    """
+    directory = export_directory(uid)
+    if os.path.isdir(directory):
+        os.utime(directory)
+        return True
+    return False
+
+
+def remove_export(uid):
+    shutil.rmtree(export_directory(uid), ignore_errors=True)
+
+
+def store_export(uid):
+    """
+    Called when all the files of an export have been written. Compresses the
+    files if compression is switched on.
+    """
+    if not COMPRESS:
+        return
+    directory = export_directory(uid)
+    for filename in os.listdir(directory):
+        path = directory + "/" + filename
+        if filename.endswith(".gz") or not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f_in, gzip.open(path + ".gz", "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        os.remove(path)
+
+
+def evict_exports(max_bytes=MAX_BYTES, max_age=MAX_AGE):
+    """
+    Removes exports older than max_age seconds and then the least recently
+    used exports until the store is smaller than max_bytes.
+    """
+    exports = []
+    for name in os.listdir(export_folder):
+        path = export_folder + "/" + name
+        if os.path.isdir(path):
+            size = sum(os.path.getsize(os.path.join(root, f))
+                       for root, dirs, files in os.walk(path) for f in files)
+        elif os.path.isfile(path) and not name.startswith("."):
+            size = os.path.getsize(path)
+        else:
+            continue
+        exports.append((os.stat(path).st_mtime, size, path))
+
+    exports.sort()
+    total = sum(e[1] for e in exports)
+    oldest = time.time() - max_age
+    for mtime, size, path in exports:
+        if mtime >= oldest and total <= max_bytes:
+            break
+        logging.info("Evicting export %s", path)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+        total -= size
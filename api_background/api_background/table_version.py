@@ -0,0 +1,24 @@
+"""
+Versions of database tables for the in-process caches
+
+The version of a table is the number of rows and the newest transaction id
+(xmin) of its rows, so any insert, update or delete gives a new version.
+The module is shared by the API and the export workers.
+"""
+from sqlalchemy import func, literal_column
+
+
+def table_version(session, table):
+    """
+    Returns the version of table
+
+    Args:
+        session: db session
+        table: model or table
+    Returns:
+        version(tuple): (count, max xmin)
+    """
+    return tuple(session.query(
+        func.count(),
+        func.max(literal_column("xmin::text::bigint"))
+    ).select_from(table).first())
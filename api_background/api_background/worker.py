@@ -0,0 +1,130 @@
+"""
+Per-process state of the export workers
+
+The worker processes are reused for many tasks, so the database engine,
+the locations and the parsed configs are created once per process and
+shared by the tasks instead of being rebuilt for every export.
+
+After each task the sessions it opened are closed and the garbage is
+collected. The processes are only recycled when their memory use exceeds
+CELERYD_MAX_MEMORY_PER_CHILD, see celeryconfig.
+"""
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import resource
+import weakref
+from functools import lru_cache
+
+import yaml
+from celery.signals import task_postrun
+from sqlalchemy.orm import sessionmaker
+
+from meerkat_abacus.model import Locations
+from meerkat_abacus.util import get_db_engine, get_locations, all_location_data
+from api_background.table_version import table_version
+
+_db = {"pid": None, "engine": None, "sessionmaker": None}
+_sessions = weakref.WeakSet()
+_locations = {"version": None, "locations": None, "location_data": None}
+
+
+def get_worker_engine():
+    """
+    Returns the database engine of this process
+    """
+    if _db["pid"] != os.getpid():
+        # Engines inherited through a fork must not share their connections
+        engine, session = get_db_engine()
+        session.close()
+        _db.update(pid=os.getpid(), engine=engine,
+                   sessionmaker=sessionmaker(bind=engine))
+    return _db["engine"]
+
+
+def get_worker_db():
+    """
+    Returns the database engine of this process and a new session. The
+    session is closed after the current task.
+
+    Returns:
+       db, session: the engine and a new session
+    """
+    engine = get_worker_engine()
+    session = _db["sessionmaker"]()
+    _sessions.add(session)
+    return engine, session
+
+
+def _cached_locations(session):
+    version = table_version(session, Locations)
+    if version != _locations["version"]:
+        _locations.update(version=version, locations=None, location_data=None)
+    return _locations
+
+
+def worker_locations(session):
+    """
+    Returns get_locations(session), cached until the locations table changes
+    """
+    cached = _cached_locations(session)
+    if cached["locations"] is None:
+        cached["locations"] = get_locations(session)
+    return cached["locations"]
+
+
+def worker_location_data(session):
+    """
+    Returns all_location_data(session), cached until the locations table
+    changes
+    """
+    cached = _cached_locations(session)
+    if cached["location_data"] is None:
+        cached["location_data"] = all_location_data(session)
+    return cached["location_data"]
+
+
+@lru_cache(maxsize=8)
+def load_param_config(param_config_yaml):
+    """
+    Returns the config object dumped in param_config_yaml. The tasks get
+    the same dump every time, so it is only parsed once per process.
+    """
+    return yaml.load(param_config_yaml, Loader=yaml.Loader)
+
+
+def rss_kb():
+    """
+    Returns the resident memory of this process in KiB
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() // 1024
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _malloc_trim():
+    libc_name = ctypes.util.find_library("c")
+    if libc_name:
+        try:
+            ctypes.CDLL(libc_name).malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+@task_postrun.connect
+def release_task_resources(**kwargs):
+    """
+    Closes the sessions opened by the task and returns the memory of its
+    large structures to the operating system.
+    """
+    for session in list(_sessions):
+        session.close()
+    _sessions.clear()
+    gc.collect()
+    _malloc_trim()
+    logging.info("Worker memory after task: %s (kb)", rss_kb())
@@ -1,64 +1,175 @@
 import csv
 import os
+import queue
+import threading
 
 import xlsxwriter
 
+# Rows handed to the writer threads at a time
+BATCH_SIZE = int(os.environ.get("MEERKAT_EXPORT_WRITER_BATCH_SIZE", 1000))
+# Batches waiting for each writer thread before write_row blocks
+QUEUE_SIZE = int(os.environ.get("MEERKAT_EXPORT_WRITER_QUEUE_SIZE", 8))
+# Size in bytes of the csv file buffer
+CSV_BUFFER_SIZE = int(os.environ.get("MEERKAT_EXPORT_CSV_BUFFER_SIZE", 1024 ** 2))
+
+
+class _WriterThread(threading.Thread):
+    """
+    Thread writing the row batches put in its bounded queue with
+    write_batch and calling close when it is stopped. An error in the
+    thread is raised in the producer by the next put or by stop.
+    """
+    def __init__(self, write_batch, close, queue_size):
+        super().__init__(daemon=True)
+        self.write_batch = write_batch
+        self.close = close
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+
+    def run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            if self.error is None:
+                try:
+                    self.write_batch(batch)
+                except Exception as e:
+                    # Keep draining the queue so the producer is not blocked
+                    self.error = e
+        try:
+            self.close()
+        except Exception as e:
+            self.error = self.error or e
+
+    def put(self, batch):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(batch)
+
+    def stop(self):
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
 
 class XlsCsvFileWriter:
-    def __init__(self, base_directory, form_name, directory_name):
+    """
+    Writes rows to a csv and an xlsx file in
+    <base_directory>/exported_data/<directory_name>/<form_name>.{csv,xlsx}
+
+    The rows are collected in batches and each file is written by its own
+    thread fed through a bounded queue, so writing the files overlaps with
+    fetching and formatting the rows. The rows must not be changed after
+    they have been written.
+
+    Use the writer as a context manager, so the threads are stopped and
+    the files closed also when the export fails.
+
+    Args:
+        base_directory: directory of the exported_data folder
+        form_name: name of the files
+        directory_name: folder in exported_data for the files
+        batch_size: rows per batch handed to the writer threads
+        queue_size: batches waiting per writer thread
+        buffer_size: size of the csv file buffer in bytes
+    """
+    def __init__(self, base_directory, form_name, directory_name,
+                 batch_size=BATCH_SIZE, queue_size=QUEUE_SIZE,
+                 buffer_size=CSV_BUFFER_SIZE):
         self.form_name = form_name
         self.directory_name = directory_name
-
-        self.csv_row_index = 0
+        self.batch_size = batch_size
+        self.rows = []
         self.xls_row_index = 0
-        self.csv_writer_row_buffer = []
-        self.csv_content = None
-        self.csv_writer = None
-        self.xls_sheet = None
-        self.xls_book = None
-        self.xls_content = None
-
-        self.__initialize(base_directory)
+        self.closed = False
 
-    def __initialize(self, base_directory):
         self.file_directory = base_directory + "/exported_data/" + self.directory_name + "/"
         self.file_path_template = self.file_directory + self.form_name + ".{}"
         os.mkdir(self.file_directory)
 
-        self.__create_csv_file()
-        self.__create_xls_file()
-
-    def __create_csv_file(self):
-        file_path = self.file_path_template.format("csv")
-        self.csv_content = open(file_path, "w")
+        self.csv_content = open(self.file_path_template.format("csv"), "w",
+                                buffering=buffer_size)
         self.csv_writer = csv.writer(self.csv_content)
-
-    def __create_xls_file(self):
-        file_path = self.file_path_template.format("xlsx")
-        self.xls_content = open(file_path, "wb")
+        self.xls_content = open(self.file_path_template.format("xlsx"), "wb")
         # XlsxWriter with "constant_memory" set to true, flushes mem after each row
         self.xls_book = xlsxwriter.Workbook(self.xls_content, {'constant_memory': True})
         self.xls_sheet = self.xls_book.add_worksheet()
 
-    def close_cvs_xls_buffers(self):
-        self.flush_csv_buffer()
+        self.threads = [
+            _WriterThread(self.csv_writer.writerows, self.__close_csv, queue_size),
+            _WriterThread(self.__write_xls_rows, self.__close_xls, queue_size)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def write_row(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
+    def flush(self):
+        """
+        Hands the collected rows to the writer threads
+        """
+        if self.rows:
+            for thread in self.threads:
+                thread.put(self.rows)
+            self.rows = []
+
+    def close(self):
+        """
+        Writes the remaining rows and closes the files
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.flush()
+        finally:
+            errors = []
+            for thread in self.threads:
+                try:
+                    thread.stop()
+                except Exception as e:
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+
+    def abort(self):
+        """
+        Stops the writer threads and closes the files without writing the
+        rows that have not been handed to the threads yet
+        """
+        self.rows = []
+        try:
+            self.close()
+        except Exception:
+            # The export has already failed
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __write_xls_rows(self, rows):
+        for row in rows:
+            self.xls_sheet.write_row(self.xls_row_index, 0, row)
+            self.xls_row_index += 1
+
+    def __close_csv(self):
         self.csv_content.close()
 
+    def __close_xls(self):
         self.xls_book.close()
         self.xls_content.close()
-
-    def write_xls_row(self, data):
-        # Little utility function write a row to file.
-        for cell in range(len(data)):
-            self.xls_sheet.write(self.xls_row_index, cell, data[cell])
-        self.xls_row_index += 1
-
-    def write_csv_row(self, row):
-        self.csv_writer_row_buffer.append(row)
-        if self.csv_row_index % 5 == 0:
-            self.flush_csv_buffer()
-        self.csv_row_index += 1
-
-    def flush_csv_buffer(self):
-        self.csv_writer.writerows(self.csv_writer_row_buffer)
-        self.csv_writer_row_buffer = []
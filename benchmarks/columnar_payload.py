@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the columnar response format
+
+Builds a synthetic AggregateCategory style result with one series per
+variable and location, and compares the size, serialisation time and parse
+time of the nested {week: value} format with format=columnar, unpacked and
+packed.
+
+Run with:
+    python benchmarks/columnar_payload.py [--series 500] [--weeks 52]
+"""
+import argparse
+import base64
+import json
+import random
+import time
+
+import numpy as np
+
+from meerkat_api.columnar import to_columnar
+
+
+def make_result(series, weeks):
+    return {
+        "var_{}".format(i): {
+            "year": 0,
+            "total": 0,
+            "weeks": {w: random.randrange(100) for w in range(1, weeks + 1)
+                      if random.random() < 0.8}
+        } for i in range(series)
+    }
+
+
+def parse_packed(text):
+    data = json.loads(text)
+    return {key: np.frombuffer(base64.b64decode(value["weeks"]["data"]),
+                               dtype=value["weeks"]["dtype"])
+            for key, value in data["data"].items()}
+
+
+def timed(function, runs=5):
+    start = time.perf_counter()
+    for _ in range(runs):
+        output = function()
+    return (time.perf_counter() - start) / runs, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--series", type=int, default=500)
+    parser.add_argument("--weeks", type=int, default=52)
+    args = parser.parse_args()
+
+    result = make_result(args.series, args.weeks)
+    for name, build, parse in [
+            ("nested", lambda: result, json.loads),
+            ("columnar", lambda: to_columnar(result), json.loads),
+            ("packed", lambda: to_columnar(result, packed=True), parse_packed)]:
+        dump_seconds, text = timed(lambda: json.dumps(build()))
+        parse_seconds, _ = timed(lambda: parse(text))
+        print("{:9} {:9} bytes  serialise {:7.2f} ms  parse {:7.2f} ms".format(
+            name, len(text), dump_seconds * 1000, parse_seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
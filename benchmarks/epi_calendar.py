@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Benchmark of epi week lookups
+
+Compares meerkat_abacus.util.epi_week.epi_week_for_date called per date
+with the lookups of api_background.epi_calendar, per date and for the
+whole array of dates at once.
+
+Run with:
+    python benchmarks/epi_calendar.py [--dates 100000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import meerkat_abacus.util.epi_week as epi_week_util
+from api_background import epi_calendar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--dates", type=int, default=100000)
+    args = parser.parse_args()
+
+    start = datetime(2015, 1, 1)
+    dates = [start + timedelta(days=random.randrange(365 * 5))
+             for _ in range(args.dates)]
+
+    build_start = time.perf_counter()
+    epi_calendar.get_epi_calendar()
+    print("calendar built in {:.2f} s".format(time.perf_counter() - build_start))
+
+    for name, lookup in [
+            ("abacus", lambda: [epi_week_util.epi_week_for_date(d) for d in dates]),
+            ("calendar", lambda: [epi_calendar.epi_week_for_date(d) for d in dates]),
+            ("vectorized", lambda: epi_calendar.epi_weeks_for_dates(dates))]:
+        lookup_start = time.perf_counter()
+        lookup()
+        seconds = time.perf_counter() - lookup_start
+        print("{:10} {:7.3f} s  {:11.0f} dates/s".format(
+            name, seconds, args.dates / seconds))
+
+
+if __name__ == "__main__":
+    main()
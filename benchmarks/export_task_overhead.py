@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the per-task overhead of the export workers
+
+Compares the setup an export task pays before it can start working:
+ - recycled: a fresh process per task, as with CELERYD_MAX_TASKS_PER_CHILD=1,
+   which imports the tasks, creates an engine, loads the locations and
+   parses the config
+ - reused: a worker process that has already run a task, using the cached
+   engine, locations and config of api_background.worker
+
+Needs the database the workers use. Run with:
+    python benchmarks/export_task_overhead.py [--runs 5]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+RECYCLED = """
+import time
+start = time.perf_counter()
+import yaml
+from meerkat_abacus import config
+from meerkat_abacus.util import get_db_engine, get_locations
+import api_background.export_data
+param_config = yaml.load(yaml.dump(config), Loader=yaml.Loader)
+db, session = get_db_engine()
+get_locations(session)
+session.close()
+print(time.perf_counter() - start)
+"""
+
+
+def recycled_overhead():
+    """
+    Returns the seconds a fresh worker process spends before a task starts
+    """
+    output = subprocess.check_output([sys.executable, "-c", RECYCLED])
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def reused_overhead(param_config_yaml):
+    """
+    Returns the seconds a reused worker process spends before a task starts
+    """
+    from api_background import worker
+    start = time.perf_counter()
+    worker.load_param_config(param_config_yaml)
+    db, session = worker.get_worker_db()
+    worker.worker_locations(session)
+    worker.release_task_resources()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    import yaml
+    from meerkat_abacus import config
+    param_config_yaml = yaml.dump(config)
+    # The first task of a worker pays for the imports and the cache misses
+    reused_overhead(param_config_yaml)
+
+    results = [
+        ("recycled", [recycled_overhead() for _ in range(args.runs)]),
+        ("reused", [reused_overhead(param_config_yaml)
+                    for _ in range(args.runs)])
+    ]
+    for name, times in results:
+        print("{:9} median {:8.1f} ms  min {:8.1f} ms  max {:8.1f} ms".format(
+            name, statistics.median(times) * 1000, min(times) * 1000,
+            max(times) * 1000))
+
+    from api_background.worker import rss_kb
+    print("\nRSS of this process: {} kb".format(rss_kb()))
+
+
+if __name__ == "__main__":
+    main()
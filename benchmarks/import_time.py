@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the API's cold start
+
+Measures the time it takes a fresh interpreter to import meerkat_api, i.e.
+to create the app, with the resource modules loaded lazily and with
+PRELOAD_RESOURCES set. Also lists the slowest imports of the lazy start
+from python -X importtime.
+
+Run with:
+    python benchmarks/import_time.py [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+TIMER = ("import time; start = time.perf_counter(); import meerkat_api; "
+         "print(time.perf_counter() - start)")
+
+
+def import_time(preload):
+    """
+    Returns the seconds taken to import meerkat_api in a new interpreter
+    """
+    env = dict(os.environ, PRELOAD_RESOURCES="1" if preload else "0")
+    output = subprocess.check_output([sys.executable, "-c", TIMER], env=env)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def slowest_imports(top):
+    """
+    Returns the top slowest imports as (cumulative microseconds, module)
+    """
+    env = dict(os.environ, PRELOAD_RESOURCES="0")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import meerkat_api"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True
+    )
+    imports = []
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        # The modules imported directly by meerkat_api and its submodules,
+        # their own imports are included in the cumulative time
+        if module.startswith("   ") and not module.startswith("     "):
+            imports.append((int(cumulative), module.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    for name, preload in [("lazy", False), ("preload", True)]:
+        times = [import_time(preload) for _ in range(args.runs)]
+        print("{:8} median {:.3f}s min {:.3f}s max {:.3f}s".format(
+            name, statistics.median(times), min(times), max(times)))
+    print("\nSlowest imports (lazy):")
+    for cumulative, module in slowest_imports(args.top):
+        print("{:10.1f} ms  {}".format(cumulative / 1000, module))
+
+
+if __name__ == "__main__":
+    main()
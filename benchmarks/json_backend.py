@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the JSON backends
+
+Serialises a synthetic payload shaped like the largest reports, with
+per-clinic weekly timelines, records with datetimes and NumPy values from
+the pandas based calculations. It compares the previous encoder, which
+tried isinstance(datetime), WKB decoding and iter() for every non-native
+object, with the json and orjson backends of meerkat_api.json_backend.
+
+Run with:
+    python benchmarks/json_backend.py [--clinics 300] [--records 5000]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from geoalchemy2.elements import WKBElement
+from geoalchemy2.shape import to_shape
+
+from meerkat_api import json_backend
+
+
+class PreviousJSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        try:
+            if isinstance(obj, datetime):
+                return obj.isoformat()
+            if isinstance(obj, WKBElement):
+                shp_obj = to_shape(obj)
+                if shp_obj.geom_type == "Point":
+                    return shp_obj.coords
+                return None
+            iterable = iter(obj)
+        except TypeError:
+            pass
+        else:
+            return list(iterable)
+        if isinstance(obj, np.generic):
+            return obj.item()
+        return json.JSONEncoder.default(self, obj)
+
+
+def make_report(clinics, records):
+    start = datetime(2017, 1, 1)
+    return {
+        "data": {
+            "clinics": {
+                str(c): {"name": "Clinic {}".format(c),
+                         "weeks": {w: np.float64(random.random() * 100)
+                                   for w in range(1, 53)},
+                         "total": np.int64(random.randrange(1000))}
+                for c in range(clinics)
+            },
+            "records": [
+                {"id": i, "date": start + timedelta(hours=i),
+                 "values": np.array([random.random() for _ in range(5)]),
+                 "variables": {"tot_1": 1, "gen_1": 1}}
+                for i in range(records)
+            ]
+        },
+        "generated": datetime.now()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--clinics", type=int, default=300)
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    report = make_report(args.clinics, args.records)
+    backends = [("previous", lambda: json.dumps(report, cls=PreviousJSONEncoder).encode())]
+    for name in json_backend.BACKENDS:
+        if name == "orjson" and json_backend.orjson is None:
+            continue
+        backends.append((name, lambda name=name: json_backend.BACKENDS[name](report)))
+
+    for name, dumps in backends:
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            output = dumps()
+        seconds = (time.perf_counter() - start) / args.runs
+        print("{:9} {:8.1f} ms  {:9} bytes".format(name, seconds * 1000, len(output)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the location filter of the data queries
+
+Compares the query_sum statement with the previous location filter, which
+compared the location with every level column (country OR zone OR region
+OR district OR clinic), and with the filter on the level column of the
+location only. For a few locations of each level it prints the top plan
+node, the execution time and the shared buffers hit or read reported by
+EXPLAIN (ANALYZE, BUFFERS), followed by the median wall time of the query.
+
+Needs a database with production-size data. Run with:
+    python benchmarks/location_filter.py [--variable tot_1] [--runs 5]
+"""
+import argparse
+import json
+import statistics
+import time
+
+from sqlalchemy import text
+
+from meerkat_abacus.util import get_db_engine
+
+LEVELS = ("country", "zone", "region", "district", "clinic")
+
+QUERY = ("SELECT sum(CAST(data.variables ->> :variable AS FLOAT)) FROM data"
+         " WHERE data.variables ? :variable AND data.date >= :start_date"
+         " AND data.date < :end_date AND {}")
+
+
+def location_filters(level):
+    return {
+        "all levels": "(" + " OR ".join(
+            "data.{} = :location".format(l) for l in LEVELS) + ")",
+        "level column": "data.{} = :location".format(level)
+    }
+
+
+def sample_locations(conn, per_level):
+    rows = conn.execute(text(
+        "SELECT level, id FROM locations WHERE level IN :levels ORDER BY id"
+    ), levels=LEVELS).fetchall()
+    locations = {}
+    for level, location in rows:
+        if len(locations.setdefault(level, [])) < per_level:
+            locations[level].append(location)
+    return locations
+
+
+def first_node(plan):
+    """
+    Returns the first node below the aggregates, e.g. a bitmap heap scan
+    """
+    while plan["Node Type"] in ("Aggregate", "Gather", "Finalize Aggregate",
+                                "Partial Aggregate") and plan.get("Plans"):
+        plan = plan["Plans"][0]
+    return plan["Node Type"]
+
+
+def explain(conn, query, params):
+    plan = conn.execute(
+        text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query), **params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    plan = plan[0]
+    buffers = (plan["Plan"].get("Shared Hit Blocks", 0) +
+               plan["Plan"].get("Shared Read Blocks", 0))
+    return first_node(plan["Plan"]), plan["Execution Time"], buffers
+
+
+def median_time(conn, query, params, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        conn.execute(text(query), **params).fetchall()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--variable", default="tot_1")
+    parser.add_argument("--start-date", default="2000-01-01")
+    parser.add_argument("--end-date", default="2100-01-01")
+    parser.add_argument("--per-level", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    engine, session = get_db_engine()
+    session.close()
+    with engine.connect() as conn:
+        locations = sample_locations(conn, args.per_level)
+        print("{:9} {:>6} {:13} {:22} {:>10} {:>9} {:>10}".format(
+            "level", "id", "filter", "plan", "exec ms", "buffers", "median ms"))
+        for level in LEVELS:
+            for location in locations.get(level, []):
+                params = {"variable": args.variable, "location": location,
+                          "start_date": args.start_date,
+                          "end_date": args.end_date}
+                for name, condition in location_filters(level).items():
+                    query = QUERY.format(condition)
+                    node, exec_ms, buffers = explain(conn, query, params)
+                    seconds = median_time(conn, query, params, args.runs)
+                    print("{:9} {:>6} {:13} {:22} {:10.1f} {:9} {:10.1f}".format(
+                        level, location, name, node, exec_ms, buffers,
+                        seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the csv and xlsx export writers
+
+Writes synthetic rows with the previous serial writer (one xlsx cell at a
+time, csv flushed every 5 rows) and with XlsCsvFileWriter, whose batches
+are written by one thread per file. A delay per batch of rows simulates
+fetching them from the database, which the threaded writer overlaps with.
+
+Run with:
+    python benchmarks/writer_throughput.py [--rows 100000] [--columns 20]
+        [--fetch-ms 5]
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import xlsxwriter
+
+from api_background.xls_csv_writer import XlsCsvFileWriter
+
+FETCH_BATCH = 200
+
+
+def make_rows(rows, columns):
+    return [[i if j % 3 == 0 else "value {} {}".format(i, j)
+             for j in range(columns)] for i in range(rows)]
+
+
+def fetch(rows, fetch_ms):
+    for i, row in enumerate(rows):
+        if i % FETCH_BATCH == 0 and fetch_ms:
+            time.sleep(fetch_ms / 1000)
+        yield row
+
+
+def serial_writer(directory, rows, fetch_ms):
+    os.mkdir(directory)
+    csv_content = open(directory + "/test.csv", "w")
+    csv_writer = csv.writer(csv_content)
+    xls_content = open(directory + "/test.xlsx", "wb")
+    xls_book = xlsxwriter.Workbook(xls_content, {'constant_memory': True})
+    xls_sheet = xls_book.add_worksheet()
+    buffer = []
+    for i, row in enumerate(fetch(rows, fetch_ms)):
+        for cell in range(len(row)):
+            xls_sheet.write(i, cell, row[cell])
+        buffer.append(row)
+        if i % 5 == 0:
+            csv_writer.writerows(buffer)
+            buffer = []
+    csv_writer.writerows(buffer)
+    csv_content.close()
+    xls_book.close()
+    xls_content.close()
+
+
+def threaded_writer(directory, rows, fetch_ms):
+    base, name = os.path.split(directory)
+    writer = XlsCsvFileWriter(base[:-len("/exported_data")], "test", name)
+    for row in fetch(rows, fetch_ms):
+        writer.write_row(row)
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--fetch-ms", type=float, default=5,
+                        help="simulated fetch time per {} rows".format(FETCH_BATCH))
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.columns)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.mkdir(tmp + "/exported_data")
+        for name, writer in [("serial", serial_writer),
+                             ("threaded", threaded_writer)]:
+            start = time.perf_counter()
+            writer(tmp + "/exported_data/" + name, rows, args.fetch_ms)
+            seconds = time.perf_counter() - start
+            print("{:9} {:7.2f} s  {:9.0f} rows/s".format(
+                name, seconds, args.rows / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Admission control for expensive endpoints
+
+Resources set a cost_class attribute, e.g. cost_class = "heavy", and add
+admission_control to their method_decorators. Each cost class configured
+in ADMISSION_CONTROL has a number of concurrent slots and a bounded queue
+of requests waiting for a slot. Requests arriving when the queue is full,
+or waiting longer than the timeout, get a 503 with a Retry-After header.
+Resources without a cost class are never limited, so cheap endpoints keep
+a free lane while the expensive ones are saturated.
+
+The limits are per worker process.
+"""
+import threading
+from functools import wraps
+
+from flask import current_app, jsonify
+
+
+class CostClass:
+    """
+    Concurrency slots with a bounded wait queue
+
+    Args:
+        slots: number of requests allowed to run at the same time
+        queue: number of requests allowed to wait for a slot
+        timeout: seconds a request waits for a slot
+        retry_after: seconds clients are told to wait after a 503
+    """
+    def __init__(self, slots, queue=0, timeout=0, retry_after=30):
+        self.slots = threading.BoundedSemaphore(slots)
+        self.queue = queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.slots.acquire(blocking=False):
+            return True
+        with self.lock:
+            if self.waiting >= self.queue:
+                return False
+            self.waiting += 1
+        try:
+            return self.slots.acquire(timeout=self.timeout)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def release(self):
+        self.slots.release()
+
+
+def register_admission_control(app):
+    app.extensions["admission_control"] = {
+        name: CostClass(**settings)
+        for name, settings in app.config.get("ADMISSION_CONTROL", {}).items()
+    }
+
+
+def admission_control(f):
+    """
+    Method decorator that only runs the resource method when a slot of the
+    resource's cost class is free and answers 503 otherwise.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        cost_class = current_app.extensions["admission_control"].get(
+            getattr(f.__self__, "cost_class", None))
+        if cost_class is None:
+            return f(*args, **kwargs)
+        if not cost_class.acquire():
+            response = jsonify(
+                message="The server is busy, please try again later.")
+            response.status_code = 503
+            response.headers["Retry-After"] = str(cost_class.retry_after)
+            return response
+        try:
+            return f(*args, **kwargs)
+        finally:
+            cost_class.release()
+    return decorated
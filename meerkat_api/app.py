@@ -4,16 +4,17 @@ meerkat_api.py
 Root Flask app for the Meerkat API.
 """
 from flask import Flask
-from flask.json import JSONEncoder
-from datetime import datetime
-from geoalchemy2.elements import WKBElement
-from geoalchemy2.shape import to_shape
 from raven.contrib.flask import Sentry
 from werkzeug.middleware.proxy_fix import ProxyFix
 from meerkat_libs.logger_client import FlaskActivityLogger
 import os
 
 from meerkat_api.extensions import db, api
+from meerkat_api.admission import register_admission_control
+from meerkat_api.compression import register_compression
+from meerkat_api.json_backend import configure_json_backend
+# Importing the routes declares them on the api before it is initialised
+from meerkat_api.routes import preload_resources
 
 
 # Set the default values of the g object
@@ -22,31 +23,6 @@ class FlaskG(Flask.app_ctx_globals_class):
 
 
 # app.wsgi_app = ProfilerMiddleware(app.wsgi_app, restrictions=(30,))
-class CustomJSONEncoder(JSONEncoder):
-    """
-    Custom JSON encoder to encode all datetime objects as ISO fromat
-    """
-
-    def default(self, obj):
-        try:
-            if isinstance(obj, datetime):
-                return obj.isoformat()
-            if isinstance(obj, WKBElement):
-                shp_obj = to_shape(obj)
-                if shp_obj.geom_type == "Point":
-                    return shp_obj.coords
-                if shp_obj.geom_type == "Polygon":
-                    return shp_obj.exterior.coords
-                else:
-                    return None
-            iterable = iter(obj)
-        except TypeError:
-            pass
-        else:
-            return list(iterable)
-        return JSONEncoder.default(self, obj)
-
-
 def create_app():
     app = Flask(__name__)
     app.config.from_object(os.getenv('CONFIG_OBJECT', 'meerkat_api.config.Development'))
@@ -57,10 +33,21 @@ def create_app():
         )
     register_extensions(app)
     app.app_ctx_globals_class = FlaskG
-    app.json_encoder = CustomJSONEncoder
+    configure_json_backend(app)
+    register_commands(app)
+    register_admission_control(app)
+    register_compression(app)
+    if app.config.get("PRELOAD_RESOURCES"):
+        preload_resources()
     return app
 
 
+def register_commands(app):
+    from meerkat_api.commands import epi_calendar_command, index_advisor_command
+    app.cli.add_command(index_advisor_command)
+    app.cli.add_command(epi_calendar_command)
+
+
 def register_extensions(app):
     db.init_app(app)
     api.init_app(app)
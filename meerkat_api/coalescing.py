@@ -0,0 +1,207 @@
+"""
+Single-flight coalescing of identical concurrent requests
+
+When many users open the same report at the same time only the first
+request computes it, the identical requests arriving while it is in
+progress wait for it and share the result. Requests are identical when they
+have the same path, arguments and allowed location.
+
+Within a worker the requests are coalesced with threading events. If
+COALESCE_LOCK_DIR is set, requests are also coalesced across the workers
+on the machine with file locks, the result is then shared through a pickle
+file in that directory. Result files are removed a minute after they were
+written and idle lock files after ten minutes.
+
+Only plain data is shared. A response object returned by a resource is
+shared as its body, status and headers, and every request gets its own
+response built from them, which the after_request hooks can then modify.
+Streamed responses are not shared, the waiting requests compute their own.
+"""
+import fcntl
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+
+from flask import current_app, g, request
+from werkzeug.wrappers import BaseResponse
+
+# Seconds after which result files and idle lock files are removed
+RESULT_MAX_AGE = 60
+LOCK_MAX_AGE = 600
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs one function call per key at a time in this process, concurrent
+    callers with the same key get the result of the running call.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+
+
+class FileLockFlight:
+    """
+    Runs one function call per key at a time across processes, using file
+    locks in directory. Callers that had to wait for the lock use the result
+    written by the call they waited for.
+    """
+    swept = {}
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def do(self, key, fn):
+        path = os.path.join(self.directory,
+                            hashlib.sha256(key.encode("utf-8")).hexdigest())
+        arrived = time.time()
+        with open(path + ".lock", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    if os.path.getmtime(path + ".result") >= arrived:
+                        with open(path + ".result", "rb") as f:
+                            return pickle.load(f)
+                except (OSError, pickle.UnpicklingError, EOFError):
+                    pass
+            # Lock files in use are not removed by sweep
+            os.utime(path + ".lock")
+            self.sweep()
+            result = fn()
+            try:
+                with open(path + ".tmp", "wb") as f:
+                    pickle.dump(result, f)
+                os.replace(path + ".tmp", path + ".result")
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # E.g. response objects, the waiting callers compute their own
+                os.remove(path + ".tmp")
+            return result
+
+    def sweep(self):
+        """
+        Removes old result files and idle lock files, at most once a minute
+        per process
+        """
+        now = time.time()
+        if now - self.swept.get(self.directory, 0) < RESULT_MAX_AGE:
+            return
+        self.swept[self.directory] = now
+        for name in os.listdir(self.directory):
+            max_age = LOCK_MAX_AGE if name.endswith(".lock") else RESULT_MAX_AGE
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < now - max_age:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+flight = SingleFlight()
+
+SharedResponse = namedtuple("SharedResponse", ["body", "status", "headers"])
+
+
+class Unshared:
+    """
+    A result that only the request that computed it can use
+    """
+    def __init__(self, result):
+        self.result = result
+
+
+def share(result):
+    """
+    Returns result in a form that can be shared with the waiting requests
+    """
+    if isinstance(result, BaseResponse):
+        if result.is_streamed or result.direct_passthrough:
+            return Unshared(result)
+        return SharedResponse(result.get_data(), result.status_code,
+                              list(result.headers.items()))
+    return result
+
+
+def unshare(result, compute):
+    """
+    Returns the result of a shared result for one request
+    """
+    if isinstance(result, SharedResponse):
+        return current_app.response_class(
+            result.body, status=result.status, headers=result.headers)
+    if isinstance(result, Unshared):
+        return compute()
+    return result
+
+
+def request_key():
+    """
+    The key identifying identical requests
+    """
+    args = sorted((k, v) for k in request.args
+                  for v in request.args.getlist(k))
+    return repr((request.path, args, g.allowed_location))
+
+
+def coalesce_requests(f):
+    """
+    Method decorator coalescing identical concurrent requests to the resource
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not current_app.config.get("COALESCE_REQUESTS"):
+            return f(*args, **kwargs)
+        computed = []
+
+        def compute():
+            result = f(*args, **kwargs)
+            computed.append(result)
+            return share(result)
+
+        key = request_key()
+        lock_dir = current_app.config.get("COALESCE_LOCK_DIR")
+        if lock_dir:
+            file_flight = FileLockFlight(lock_dir)
+            result = flight.do(key, lambda: file_flight.do(key, compute))
+        else:
+            result = flight.do(key, compute)
+        if computed:
+            # The request that computed the result keeps its own response
+            return computed[0]
+        return unshare(result, lambda: f(*args, **kwargs))
+    return decorated
@@ -0,0 +1,83 @@
+"""
+Columnar response format for the time series resources
+
+With ?format=columnar the {week: value} dicts of a response are replaced by
+dense arrays over one shared, sorted week axis:
+
+    {"format": "columnar",
+     "weeks": [1, 2, 3],
+     "data": {"gen_1": {"year": 3, "weeks": [0, 3, 0]}, ...}}
+
+With &packed=1 each array is sent as base64 encoded little endian values
+with their NumPy dtype string, e.g. {"dtype": "<i8", "data": "AwAA..."}.
+"""
+import base64
+import numbers
+from functools import wraps
+
+import numpy as np
+from flask import request
+
+
+def _collect_weeks(result, weeks):
+    if isinstance(result, dict):
+        for key, value in result.items():
+            if key == "weeks" and isinstance(value, dict):
+                weeks.update(int(w) for w in value.keys())
+            else:
+                _collect_weeks(value, weeks)
+
+
+def _pack(values):
+    if all(isinstance(v, numbers.Integral) for v in values):
+        array = np.asarray(values, dtype="<i8")
+    else:
+        array = np.asarray(values, dtype="<f8")
+    return {"dtype": array.dtype.str,
+            "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def _dense_weeks(result, axis, packed):
+    if not isinstance(result, dict):
+        return result
+    dense = {}
+    for key, value in result.items():
+        if key == "weeks" and isinstance(value, dict):
+            by_week = {int(w): v for w, v in value.items()}
+            values = [by_week.get(w, 0) for w in axis]
+            dense[key] = _pack(values) if packed else values
+        else:
+            dense[key] = _dense_weeks(value, axis, packed)
+    return dense
+
+
+def to_columnar(result, packed=False):
+    """
+    Returns result with its week dicts as dense arrays over a shared week
+    axis
+
+    Args:
+        result: resource result with {"weeks": {week: value}} dicts
+        packed: base64 encode the arrays
+    """
+    weeks = set()
+    _collect_weeks(result, weeks)
+    axis = sorted(weeks)
+    return {"format": "columnar",
+            "weeks": axis,
+            "data": _dense_weeks(result, axis, packed)}
+
+
+def columnar_format(f):
+    """
+    Method decorator returning the result in the columnar format if the
+    request asks for format=columnar. Direct calls to the resource methods,
+    e.g. from the reports, are not affected.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        result = f(*args, **kwargs)
+        if request.args.get("format") != "columnar" or not isinstance(result, dict):
+            return result
+        return to_columnar(result, packed=request.args.get("packed") in ["1", "true"])
+    return wrapper
@@ -0,0 +1,63 @@
+"""
+Flask CLI commands of the Meerkat API
+
+The commands import their implementation when they run, so registering
+them does not slow down the start of the app.
+"""
+import click
+from flask.cli import with_appcontext
+
+
+@click.command("epi-calendar")
+@with_appcontext
+def epi_calendar_command():
+    """Write the epi calendar to the epi_calendar table."""
+    from api_background.epi_calendar import write_epi_calendar_table
+    from meerkat_api.extensions import db
+    rows = write_epi_calendar_table(db.engine)
+    click.echo("Wrote {} days to epi_calendar".format(rows))
+
+
+@click.command("index-advisor")
+@click.option("--create", is_flag=True,
+              help="Create the proposed indexes concurrently")
+@click.option("--explain/--no-explain", default=True,
+              help="Run EXPLAIN (ANALYZE, BUFFERS) on representative queries")
+@click.option("--variable", multiple=True,
+              help="Additional variable to consider")
+@with_appcontext
+def index_advisor_command(create, explain, variable):
+    """Propose (and create) indexes for the hot data access paths."""
+    from sqlalchemy.sql import text
+    from meerkat_api.extensions import db
+    from meerkat_api.util.index_advisor import REPRESENTATIVE_QUERIES, \
+        existing_indexes, explain_queries, hot_variables, propose_indexes, \
+        variable_selectivity
+    variables = hot_variables(db.session, variable)
+    selectivity = variable_selectivity(db.session, variables)
+    for v in variables:
+        click.echo("{}: {:.1%} of records".format(v, selectivity[v]))
+    proposals = propose_indexes(variables, selectivity,
+                                existing_indexes(db.session))
+    if not proposals:
+        click.echo("No missing indexes")
+    for name, sql in proposals:
+        click.echo(sql + ";")
+    db.session.commit()
+
+    if explain:
+        before = explain_queries(db.engine)
+    if create and proposals:
+        # CREATE INDEX CONCURRENTLY can not run inside a transaction
+        with db.engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT") as conn:
+            for name, sql in proposals:
+                click.echo("Creating " + name)
+                conn.execute(text(sql))
+            conn.execute(text("ANALYZE data"))
+    if explain:
+        after = explain_queries(db.engine) if create and proposals else before
+        for name in REPRESENTATIVE_QUERIES:
+            click.echo("{}: {:.1f} ms -> {:.1f} ms, indexes: {}".format(
+                name, before[name]["time"], after[name]["time"],
+                ", ".join(after[name]["indexes"]) or "none"))
@@ -0,0 +1,130 @@
+"""
+Response compression
+
+Responses of at least COMPRESSION_MIN_SIZE bytes with a compressible
+mimetype are compressed with brotli or gzip, whichever the client prefers
+in Accept-Encoding. brotli is only offered if it is installed.
+
+Responses to paths starting with one of COMPRESSION_CACHE_PATHS (the
+location tree, geo shapes, variables and reports) are kept compressed in a
+cache keyed by the encoding and a hash of the body, so the same body is
+not compressed again for every request. The cache holds at most
+COMPRESSION_CACHE_SIZE bytes of compressed bodies and is per worker
+process.
+
+Only the responses to COMPRESSION_STATIC_PATHS, which rarely change, are
+compressed at the highest level. Report bodies depend on the requested
+dates and locations, so most of them are compressed at the normal level.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ["application/json", "application/geo+json",
+                          "application/javascript", "application/xml",
+                          "text/csv", "text/html", "text/plain"]
+
+
+def _compress(body, encoding, static):
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if static else 4)
+    return gzip.compress(body, compresslevel=9 if static else 6)
+
+
+class CompressedCache:
+    """
+    LRU cache of compressed bodies holding at most max_size bytes
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.bodies = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.bodies.get(key)
+            if body is not None:
+                self.bodies.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_size:
+            return
+        with self.lock:
+            if key in self.bodies:
+                return
+            self.bodies[key] = body
+            self.size += len(body)
+            while self.size > self.max_size:
+                old_key, old_body = self.bodies.popitem(last=False)
+                self.size -= len(old_body)
+
+
+def choose_encoding():
+    """
+    Returns the encoding the client prefers, br or gzip, or None
+    """
+    encodings = request.accept_encodings
+    qualities = [(encodings.quality("gzip"), "gzip")]
+    if brotli is not None:
+        # brotli is preferred for equal qualities
+        qualities.append((encodings.quality("br"), "br"))
+    quality, encoding = max(qualities)
+    if quality <= 0:
+        return None
+    return encoding
+
+
+def compress_response(response, config, cache):
+    """
+    Compresses response if the client accepts it and it is worth it
+    """
+    if (response.status_code != 200 or response.direct_passthrough or
+            response.is_streamed or "Content-Encoding" in response.headers or
+            response.mimetype not in COMPRESSIBLE_MIMETYPES or
+            "no-transform" in response.headers.get("Cache-Control", "")):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < config["COMPRESSION_MIN_SIZE"]:
+        return response
+
+    cached = any(request.path.startswith(p)
+                 for p in config["COMPRESSION_CACHE_PATHS"])
+    static = any(request.path.startswith(p)
+                 for p in config["COMPRESSION_STATIC_PATHS"])
+    if cached:
+        key = (encoding, hashlib.sha1(body).digest())
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = _compress(body, encoding, static)
+            cache.put(key, compressed)
+    else:
+        compressed = _compress(body, encoding, static)
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def register_compression(app):
+    if not app.config.get("COMPRESSION"):
+        return
+    cache = CompressedCache(app.config["COMPRESSION_CACHE_SIZE"])
+    app.extensions["compression_cache"] = cache
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, app.config, cache)
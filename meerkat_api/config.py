@@ -28,6 +28,45 @@ class Config(object):
     LOGGING_SOURCE = getenv("LOGGING_SOURCE", "dev")
     LOGGING_SOURCE_TYPE = "api"
     LOGGING_IMPLEMENTATION = getenv("LOGGING_IMPLEMENTATION", "demo")
+    # Exports older than this (seconds) that never finished are regenerated
+    EXPORT_TIMEOUT = 2 * 3600
+    # Internal nginx location the export files are served from, if set
+    EXPORT_ACCEL_REDIRECT = getenv("EXPORT_ACCEL_REDIRECT", "")
+    # Max age (seconds) of the cached public frontpage indicators
+    FRONTPAGE_CACHE_MAX_AGE = int(getenv("FRONTPAGE_CACHE_MAX_AGE", 300))
+    # Concurrency slots per worker for resources with a cost_class
+    ADMISSION_CONTROL = {
+        "heavy": {
+            "slots": int(getenv("HEAVY_REQUEST_SLOTS", 2)),
+            "queue": int(getenv("HEAVY_REQUEST_QUEUE", 4)),
+            "timeout": 10,
+            "retry_after": 30
+        }
+    }
+    # Max number of queries posted to /aggregate_bulk in one request
+    BULK_QUERY_LIMIT = int(getenv("BULK_QUERY_LIMIT", 1000))
+    # Share the result of identical concurrent requests to heavy resources
+    COALESCE_REQUESTS = True
+    # Directory for file locks to also coalesce across workers, if set
+    COALESCE_LOCK_DIR = getenv("COALESCE_LOCK_DIR", "")
+    # Import all resource modules at startup instead of on first request
+    PRELOAD_RESOURCES = getenv("PRELOAD_RESOURCES", "") == "1"
+    # JSON serialisation backend, orjson or json
+    JSON_BACKEND = getenv("JSON_BACKEND", "orjson")
+    # Compress responses with brotli or gzip, unless nginx does it
+    COMPRESSION = getenv("COMPRESSION", "1") == "1"
+    # Responses smaller than this (bytes) are sent uncompressed
+    COMPRESSION_MIN_SIZE = int(getenv("COMPRESSION_MIN_SIZE", 1024))
+    # Responses to these paths are cached compressed
+    COMPRESSION_CACHE_PATHS = ["/locationtree", "/locations", "/geo_shapes",
+                               "/variables", "/variable/", "/clinics",
+                               "/reports/"]
+    # Responses to these paths rarely change, they are compressed at the
+    # highest level
+    COMPRESSION_STATIC_PATHS = ["/locationtree", "/locations", "/geo_shapes",
+                                "/variables", "/variable/", "/clinics"]
+    # Max size (bytes) of the cached compressed responses per worker
+    COMPRESSION_CACHE_SIZE = int(getenv("COMPRESSION_CACHE_SIZE", 64 * 1024 ** 2))
 
 class Production(Config):
     DEBUG = False
@@ -4,6 +4,7 @@ from flask_restful import Api
 import io
 from flask import current_app
 from meerkat_api import config
+from meerkat_api import json_backend
 import resource
 import csv
 from raven.contrib.celery import register_signal, register_logger_signal
@@ -26,6 +27,22 @@ class Celery(celery.Celery):
 celery_app = Celery()
 celery_app.config_from_object('meerkat_api.config.Config')
 
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    """
+    Function to write data as JSON with the configured JSON backend.
+
+    Args:
+       data: data to serialise
+       code: Response code
+       headers: http headers
+    """
+    resp = make_response(json_backend.dumps(data) + b"\n", code)
+    resp.headers.extend(headers or {})
+    resp.mimetype = "application/json"
+    return resp
+
+
 @api.representation('text/csv')
 def output_csv(data_dict, code, headers=None):
     """
@@ -97,3 +114,91 @@ def output_xls(data, code, headers=None):
         return resp
     else:
         abort(404)
+
+
+@api.representation('application/vnd.apache.parquet')
+def output_parquet(data, code, headers=None):
+    """
+    Function to write data to a parquet file.
+
+    Args:
+       data: bytes of a parquet file.
+       code: Response code
+       headers: http headers
+    """
+    if data and "data" in data:
+        resp = make_response(data["data"], code)
+        resp.headers.extend(headers or {
+            "Content-Disposition": "attachment; filename={}.parquet".format(
+                data["filename"]
+            )
+        })
+        return resp
+    else:
+        abort(404)
+
+
+@api.representation('application/vnd.apache.arrow.file')
+def output_arrow(data, code, headers=None):
+    """
+    Function to write data to an Arrow IPC file.
+
+    Args:
+       data: bytes of an Arrow IPC file.
+       code: Response code
+       headers: http headers
+    """
+    if data and "data" in data:
+        resp = make_response(data["data"], code)
+        resp.headers.extend(headers or {
+            "Content-Disposition": "attachment; filename={}.arrow".format(
+                data["filename"]
+            )
+        })
+        return resp
+    else:
+        abort(404)
+
+
+@api.representation('application/msgpack')
+def output_msgpack(data, code, headers=None):
+    """
+    Function to write data as MessagePack.
+
+    Args:
+       data: data to serialise
+       code: Response code
+       headers: http headers
+    """
+    import msgpack
+    resp = make_response(msgpack.packb(
+        data, default=json_backend.json_default, use_bin_type=True), code)
+    resp.headers.extend(headers or {})
+    resp.mimetype = "application/msgpack"
+    return resp
+
+
+@api.representation('application/vnd.apache.arrow.stream')
+def output_arrow_stream(data, code, headers=None):
+    """
+    Function to write tabular data as an Arrow IPC stream. Data that is not
+    tabular, e.g. error messages, is written as JSON.
+
+    Args:
+       data: table, record batch or records, see arrow_tables.to_table
+       code: Response code
+       headers: http headers
+    """
+    import pyarrow as pa
+    from meerkat_api.util.arrow_tables import to_table
+    table = to_table(data)
+    if table is None:
+        return output_json(data, code, headers)
+    sink = pa.BufferOutputStream()
+    writer = pa.ipc.new_stream(sink, table.schema)
+    writer.write_table(table)
+    writer.close()
+    resp = make_response(sink.getvalue().to_pybytes(), code)
+    resp.headers.extend(headers or {})
+    resp.mimetype = "application/vnd.apache.arrow.stream"
+    return resp
@@ -0,0 +1,143 @@
+"""
+JSON serialisation backend for jsonify and the flask-restful resources
+
+The JSON_BACKEND setting chooses the backend:
+ - orjson: serialises datetimes, NumPy arrays and NumPy scalars natively,
+   used if it is installed
+ - json: the standard library encoder
+
+Both backends encode the other types with json_default. Geometries are
+converted to coordinates once per distinct WKB value. NaN and infinite
+floats are encoded as null by both backends.
+
+NumPy and geoalchemy2 are not imported here: their objects can only exist
+once another module has imported them, so they are looked up in
+sys.modules.
+"""
+import json
+import math
+import sys
+from datetime import date, datetime
+from functools import lru_cache
+
+from flask.json import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+json_backend = {"name": "json"}
+
+
+@lru_cache(maxsize=4096)
+def _geometry_coords(wkb):
+    from geoalchemy2.elements import WKBElement
+    from geoalchemy2.shape import to_shape
+    shp_obj = to_shape(WKBElement(wkb))
+    if shp_obj.geom_type == "Point":
+        return tuple(shp_obj.coords)
+    if shp_obj.geom_type == "Polygon":
+        return tuple(shp_obj.exterior.coords)
+    return None
+
+
+def json_default(obj):
+    """
+    Encodes the objects the JSON backends do not know
+    """
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(obj, (np.generic, np.ndarray)):
+        return obj.tolist()
+    elements = sys.modules.get("geoalchemy2.elements")
+    if elements is not None and isinstance(obj, elements.WKBElement):
+        return _geometry_coords(bytes(obj.data))
+    try:
+        iterable = iter(obj)
+    except TypeError:
+        # uuids, dataclasses and markup as flask
+        return JSONEncoder().default(obj)
+    return list(iterable)
+
+
+def _finite(obj):
+    """
+    Returns obj with NaN and infinite floats replaced by None
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    return obj
+
+
+def _finite_default(obj):
+    return _finite(json_default(obj))
+
+
+def _dumps_json(obj, sort_keys=False):
+    try:
+        return json.dumps(obj, default=json_default, sort_keys=sort_keys,
+                          allow_nan=False).encode("utf-8")
+    except ValueError as e:
+        if "Out of range float" not in str(e):
+            raise
+    # Written as null like orjson does, e.g. for pandas NaN values
+    return json.dumps(_finite(obj), default=_finite_default,
+                      sort_keys=sort_keys, allow_nan=False).encode("utf-8")
+
+
+def _dumps_orjson(obj, sort_keys=False):
+    option = orjson.OPT_NON_STR_KEYS
+    if "numpy" in sys.modules:
+        option |= orjson.OPT_SERIALIZE_NUMPY
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    try:
+        return orjson.dumps(obj, default=json_default, option=option)
+    except TypeError:
+        # e.g. integers larger than 64 bit or mixed key types with sort_keys
+        return _dumps_json(obj, sort_keys=sort_keys)
+
+
+BACKENDS = {"json": _dumps_json, "orjson": _dumps_orjson}
+
+
+def dumps(obj, sort_keys=False):
+    """
+    Returns obj as JSON encoded bytes with the configured backend
+    """
+    return BACKENDS[json_backend["name"]](obj, sort_keys=sort_keys)
+
+
+def configure_json_backend(app):
+    """
+    Sets the backend from the JSON_BACKEND setting, falls back to json if
+    orjson is not installed
+    """
+    name = app.config.get("JSON_BACKEND", "orjson")
+    if name not in BACKENDS:
+        raise ValueError("Unknown JSON_BACKEND {}".format(name))
+    if name == "orjson" and orjson is None:
+        app.logger.warning("orjson is not installed, using json")
+        name = "json"
+    json_backend["name"] = name
+    app.json_encoder = BackendJSONEncoder
+
+
+class BackendJSONEncoder(JSONEncoder):
+    """
+    Flask JSON encoder using the configured backend for jsonify
+    """
+
+    def default(self, obj):
+        return json_default(obj)
+
+    def encode(self, obj):
+        if self.indent is not None:
+            return super().encode(_finite(obj))
+        return dumps(obj, sort_keys=self.sort_keys).decode("utf-8")
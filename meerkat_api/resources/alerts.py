@@ -3,13 +3,13 @@ Data resource for getting Alert data
 """
 from flask_restful import Resource
 from flask import jsonify, request, g
-from sqlalchemy import or_
 from dateutil.parser import parse
 
 from meerkat_api.util import row_to_dict, rows_to_dicts
-from meerkat_api.extensions import db, api
+from meerkat_api.extensions import db
 from meerkat_abacus import model
 from meerkat_api.authentication import authenticate, is_allowed_location
+from meerkat_api.util.data_query import location_condition
 
 
 class Alert(Resource):
@@ -104,35 +104,15 @@ def get_alerts(args, allowed_location=1):
     if "location" in args.keys():
         if not is_allowed_location(args["location"], allowed_location):
             return {}
-        cond = or_(loc == args["location"] for loc in (
-            model.Data.country,
-            model.Data.zone,
-            model.Data.region,
-            model.Data.district,
-            model.Data.clinic))
-        disregarded_cond = or_(loc == args["location"] for loc in (
-            model.DisregardedData.country,
-            model.DisregardedData.zone,
-            model.DisregardedData.region,
-            model.DisregardedData.district,
-            model.DisregardedData.clinic)
-        )
+        cond = location_condition(db.session, args["location"])
+        disregarded_cond = location_condition(db.session, args["location"],
+                                              table=model.DisregardedData)
         conditions.append(cond)
         disregarded_conditions.append(disregarded_cond)
     else:
-        cond = or_(loc == allowed_location for loc in (
-            model.Data.country,
-            model.Data.zone,
-            model.Data.region,
-            model.Data.district,
-            model.Data.clinic))
-        disregarded_cond = or_(loc == allowed_location for loc in (
-            model.DisregardedData.country,
-            model.DisregardedData.zone,
-            model.DisregardedData.region,
-            model.DisregardedData.district,
-            model.DisregardedData.clinic)
-        )
+        cond = location_condition(db.session, allowed_location)
+        disregarded_cond = location_condition(db.session, allowed_location,
+                                              table=model.DisregardedData)
         conditions.append(cond)
         disregarded_conditions.append(disregarded_cond)
     if "start_date" in args.keys():
@@ -227,8 +207,3 @@ class AggregateAlerts(Resource):
 
         ret["total"] = total
         return jsonify(ret)
-api.add_resource(AggregateAlerts, "/aggregate_alerts",
-                 "/aggregate_alerts/<central_review>",
-                 "/aggregate_alerts/<central_review>/<hard_date_limit>")
-api.add_resource(Alert, "/alert/<alert_id>")
-api.add_resource(Alerts, "/alerts")
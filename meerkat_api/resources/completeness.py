@@ -6,17 +6,20 @@ import json
 import pandas as pd
 import meerkat_abacus.util as abacus_util
 from datetime import datetime, timedelta
-from dateutil.parser import parse
 from flask import jsonify, request, g
 from flask_restful import Resource, abort
-from pandas.tseries.offsets import CustomBusinessDay
-from sqlalchemy import func, or_
+from sqlalchemy import func
 
 import meerkat_abacus.util.epi_week
 from meerkat_abacus.model import Data, Locations
 from meerkat_api.authentication import authenticate, is_allowed_location
-from meerkat_api.extensions import db, api
+from meerkat_api.admission import admission_control
+from meerkat_api.coalescing import coalesce_requests
+from meerkat_api.extensions import db
 from meerkat_api.util import get_children, series_to_json_dict
+from api_background.completeness import load_completeness_data, \
+    non_reporting_clinics, shifted_end_date_and_frequency, epi_week_start, \
+    business_days, sublevel_completeness
 
 
 class CompletenessIndicator(Resource):
@@ -79,6 +82,8 @@ class Completeness(Resource):
         dates_not_reported: dated_not_reported, yearly_score: yearly_score}\n
     """
     decorators = [authenticate]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, variable, location, number_per_week,
             weekend=None, start_week=1, end_date=None,
@@ -102,88 +107,34 @@ class Completeness(Resource):
 
         parsed_sublevel = self._get_sublevel(location_type, sublevel)
 
-        conditions = [
-            Data.variables.has_key(variable), or_(
-                loc == location
-                for loc in (Data.country, Data.zone,
-                            Data.region, Data.district, Data.clinic)
-            ),
-        ]
-        if exc_case_types and exc_case_types != []:
-            conditions.append(~Data.case_type.contains(exc_case_types))
-        if inc_case_types and inc_case_types != []:
-            conditions.append(Data.case_type.overlap(inc_case_types))
-        if "tag" in request.args.keys():
-            conditions.append(Data.tags.has_key(request.args["tag"]))
         # get the data
-        data = pd.read_sql(
-            db.session.query(Data.region, Data.zone, Data.district,
-                             Data.clinic, Data.date,
-                             Data.variables[variable].label(variable)).filter(
-                *conditions).statement, db.session.bind)
+        data = load_completeness_data(
+            db.session, variable, location,
+            inc_case_types=inc_case_types, exc_case_types=exc_case_types,
+            tag=request.args.get("tag")
+        )
 
         if len(data) == 0:
             return jsonify(self.__empty_response)
-        # We drop duplicates so each clinic can only have one record per day
-        data = data.drop_duplicates(
-            subset=["region", "district", "clinic", "date", variable])
-        shifted_end_date, timeseries_freq = self._get_shifted_end_date_and_timeseries_frequency(end_date)
-
-        beginning_of_epi_start_week = self._get_epi_week_start(shifted_end_date, start_week)
+        shifted_end_date, timeseries_freq = shifted_end_date_and_frequency(end_date)
 
-        # Remove records dated on the days specified as weekends
-        not_reported_dates_begining = beginning_of_epi_start_week #for purpose of dropping weekend data we do not care if clinic start date is in the future. This calculation is updated when dates not reported is calculated
-        bdays = self._get_business_days(weekend_days=weekend)
-        expected_days = pd.date_range(not_reported_dates_begining, shifted_end_date, freq=bdays)
-        data = data[data['date'].isin(expected_days)]
+        beginning_of_epi_start_week = epi_week_start(shifted_end_date, start_week)
+        bdays = business_days(weekend)
 
         if parsed_sublevel:
-            # We first create an index with sublevel, clinic, dates
-            # Where dates are the dates after the clinic started reporting
-            sublocations = []
-            for l in locs.values():
-                if abacus_util.is_child(location, l.id, locs) and l.level == parsed_sublevel:
-                    sublocations.append(l.id)
-            tuples = []
-            for name in sublocations:
-                for clinic in get_children(name, locs):
-                    if locs[clinic].case_report:
-                        if inc_case_types and not set(locs[clinic].case_type) & inc_case_types:
-                            continue
-                        if exc_case_types and set(locs[clinic].case_type) >= exc_case_types:
-                            continue
-                        start_date = locs[clinic].start_date
-                        if start_date < beginning_of_epi_start_week:
-                            start_date = beginning_of_epi_start_week
-                        if shifted_end_date - start_date < timedelta(days=7):
-                            start_date = (shifted_end_date - timedelta(days=6)).date()
-
-                        for date in pd.date_range(start_date, shifted_end_date, freq=timeseries_freq):
-                            tuples.append((name, clinic, date))
-            if len(tuples) == 0:
+            completeness = sublevel_completeness(
+                data, variable, locs, location, parsed_sublevel,
+                number_per_week, start_week=start_week, end_date=end_date,
+                weekend=weekend,
+                non_reporting=non_reporting_clinics(
+                    db.session, non_reporting_variable, location, locs,
+                    inc_case_types, exc_case_types
+                ),
+                inc_case_types=inc_case_types, exc_case_types=exc_case_types
+            )
+            if completeness is None:
                 return jsonify(self.__empty_response)
 
-            new_index = pd.MultiIndex.from_tuples(
-                tuples, names=[parsed_sublevel, "clinic", "date"])
-            completeness = data.groupby([
-                parsed_sublevel, "clinic", pd.Grouper(
-                    key="date", freq=timeseries_freq, label="left")
-            ]).sum().reindex(new_index)[variable].fillna(0).sort_index()
-
-            # Drop clinics with no submissions
-
-            clinic_sums = completeness.groupby(level=1).sum()
-            zero_clinics = clinic_sums[clinic_sums == 0].index
-            nr = NonReporting()
-            non_reporting_clinics = nr.get(non_reporting_variable, location)["clinics"]
-            #There is a bizarre bug that was supposedly fixed in 2018 that crashes if empty list is provided to drop from non-unique index. (https://github.com/pandas-dev/pandas/pull/21515)
-            if non_reporting_clinics:
-                completeness = completeness.drop(non_reporting_clinics, level=1)
-                completeness.reindex()
-
-            # We only want to count a maximum of number per week per week
-            completeness[completeness > number_per_week] = number_per_week
-
             location_completeness_per_week = completeness.groupby(
                 level=2).mean()
             sublocations_completeness_per_week = completeness.groupby(
@@ -231,6 +182,10 @@ class Completeness(Resource):
                 level=1).mean() / number_per_week * 100
             dates_not_reported = []  # Not needed for this level
         else:
+            # Remove records dated on the days specified as weekends
+            expected_days = pd.date_range(beginning_of_epi_start_week, shifted_end_date, freq=bdays)
+            data = data[data['date'].isin(expected_days)]
+
             # Take into account clinic start_date
             if locs[location].start_date > beginning_of_epi_start_week:
                 beginning_of_epi_start_week = locs[location].start_date
@@ -302,46 +257,6 @@ class Completeness(Resource):
             sublevels["zone"] = "region"
         return sublevels
 
-    def _get_epi_week_start(self, shifted_end_date, start_week):
-        beginning = meerkat_abacus.util.epi_week.epi_week_start_date(shifted_end_date.year, start_week)
-        shifted_end_date_epi_week = abacus_util.epi_week.epi_week_for_date(shifted_end_date)[1]
-        if shifted_end_date_epi_week == 53:
-            beginning = beginning.replace(year=beginning.year - 1)
-
-        return beginning
-
-    def _get_shifted_end_date_and_timeseries_frequency(self, raw_end_date):
-        # If end_date is the start of an epi week we do not want to include_case_type the current epi week
-        # We only calculate completeness for whole epi-weeks so we want to set end_date to the
-        # the end of the previous epi_week.
-        end_date = self._parse_end_date(raw_end_date)
-        epi_year_start_weekday = meerkat_abacus.util.epi_week.epi_year_start_date_by_year(year=end_date.year).weekday()
-        timeseries_freq = ["W-MON", "W-TUE", "W-WED", "W-THU", "W-FRI", "W-SAT", "W-SUN"][epi_year_start_weekday]
-        offset = (end_date.weekday() - epi_year_start_weekday) % 7
-        shifted_end_date = end_date - timedelta(days=offset + 1)
-        return shifted_end_date, timeseries_freq
-
-    def _parse_end_date(self, end_date):
-        if not end_date:
-            end_date = datetime.now()
-        else:
-            if isinstance(end_date, str):
-                end_date = parse(end_date)
-        return end_date
-
-    def _get_business_days(self, weekend_days):
-        if not weekend_days:
-            weekday_mask = "Mon Tue Wed Thu Fri"
-        else:
-            weekend_days = weekend_days.split(",")
-            weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-            weekday_mask = ""
-            for i, w in enumerate(weekdays):
-                if i not in weekend_days and str(i) not in weekend_days:
-                    weekday_mask = weekday_mask + weekdays[i] + " "
-        bdays = CustomBusinessDay(weekmask=weekday_mask)
-        return bdays
-
     __empty_response = {
         "score": {},
         "timeline": {},
@@ -367,6 +282,8 @@ class NonReporting(Resource):
         list_of_clinics
     """
     decorators = [authenticate]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, variable, location, exclude_case_type=None, num_weeks=0,
             include_case_type=None, include_clinic_type=None, require_case_report=True):
@@ -458,18 +375,3 @@ class NonReporting(Resource):
                 else:
                     non_reporting_clinics.append(clinic)
         return {"clinics": non_reporting_clinics}
-
-
-api.add_resource(NonReporting,
-                 "/non_reporting/<variable>/<location>",
-                 "/non_reporting/<variable>/<location>/<num_weeks>/<exclude_case_type>",
-                 "/non_reporting/<variable>/<location>/<num_weeks>/<exclude_case_type>/<include_case_type>",
-                 "/non_reporting/<variable>/<location>/<num_weeks>/<exclude_case_type>/<include_case_type>/<include_clinic_type>/<require_case_report>"
-                 )
-
-api.add_resource(Completeness,
-                 "/completeness/<variable>/<location>/<number_per_week>",
-                 "/completeness/<variable>/<location>/<number_per_week>/<start_week>",
-                 "/completeness/<variable>/<location>/<number_per_week>/<start_week>/<weekend>",
-                 "/completeness/<variable>/<location>/<number_per_week>/<start_week>/<weekend>/<non_reporting_variable>",
-                 "/completeness/<variable>/<location>/<number_per_week>/<start_week>/<weekend>/<non_reporting_variable>/<end_date>")
@@ -2,18 +2,24 @@
 Resource for aggregating and querying data
 
 """
-from flask_restful import Resource, reqparse
-from sqlalchemy import or_
+from flask_restful import Resource, reqparse, abort
 from datetime import datetime, timedelta
-from flask import jsonify, g, request
+from dateutil.parser import isoparse
+from flask import jsonify, g, request, current_app
 
 from meerkat_api.util import rows_to_dicts
-from meerkat_api.extensions import db, api
+from meerkat_api.util.arrow_tables import rows_to_record_batch, response_mediatype
+from meerkat_api.util.arrow_tables import ARROW_STREAM
+from meerkat_api.extensions import db
 from meerkat_abacus.model import Data
 from meerkat_api.resources.variables import Variables
 from meerkat_api.authentication import authenticate, is_allowed_location
-from meerkat_api.util.data_query import query_sum
-from meerkat_api.util.data_query import latest_query
+from meerkat_api.admission import admission_control
+from meerkat_api.columnar import columnar_format
+from meerkat_api.util.data_query import query_sum, query_sum_many
+from meerkat_api.util.data_query import latest_query, latest_query_many
+from meerkat_api.util.data_query import location_condition, NO_ZONE_LEVELS
+from meerkat_api.util.data_query import LOCATION_LEVELS
 from meerkat_abacus.util import get_locations
 import meerkat_abacus.util.epi_week as epi_week_util
 
@@ -29,12 +35,9 @@ class LatestData(Resource):
         if not is_allowed_location(location_id, g.allowed_location):
             return {"records": []}
 
-        results = db.session.query(Data).filter(or_(
-                loc == location_id for loc in (Data.country,
-                                               Data.region,
-                                               Data.district,
-                                               Data.clinic)),
-                                                Data.submission_date >= datetime.now() - timedelta(days=1)).order_by(Data.submission_date.desc()).all()
+        results = db.session.query(Data).filter(
+            location_condition(db.session, location_id, levels=NO_ZONE_LEVELS),
+            Data.submission_date >= datetime.now() - timedelta(days=1)).order_by(Data.submission_date.desc()).all()
 
         return jsonify({"records": rows_to_dicts(results)})
 
@@ -104,6 +107,7 @@ class AggregateYear(Resource):
        result_dict: {"weeks":{1:0....}, "year":0}\n
     """
     decorators = [authenticate]
+    method_decorators = [columnar_format]
 
     def get(self, variable_id, location_id, year=datetime.today().year,
             lim_variables="", exclude_variables=None):
@@ -136,6 +140,83 @@ class AggregateYear(Resource):
             return {"weeks": result["weeks"], "year": result["total"], req_level: sub_level_result}
 
 
+def _parse_bulk_query(query):
+    """
+    Returns the query_sum arguments of a query posted to AggregateBulk
+    """
+    if not isinstance(query, dict):
+        abort(400, message="Queries must be objects")
+    var_ids = query.get("variables")
+    if not isinstance(var_ids, list):
+        var_ids = [var_ids]
+    if not var_ids or not all(isinstance(v, str) and v for v in var_ids):
+        abort(400, message="Every query needs variables")
+    try:
+        location = int(query.get("location", 1))
+    except (TypeError, ValueError):
+        abort(400, message="Invalid location: {}".format(query.get("location")))
+    level = query.get("level")
+    if level is not None and level not in LOCATION_LEVELS:
+        abort(400, message="Invalid level: {}".format(level))
+    try:
+        if "year" in query:
+            year = int(query["year"])
+            start_date = datetime(year, 1, 1)
+            end_date = datetime(year + 1, 1, 1)
+        else:
+            start_date = isoparse(query.get("start_date", "1900-01-01"))
+            end_date = isoparse(query.get("end_date", "2100-01-01"))
+    except (TypeError, ValueError):
+        abort(400, message="Invalid dates in query")
+    return {
+        "var_ids": var_ids,
+        "location": location,
+        "start_date": start_date.replace(tzinfo=None),
+        "end_date": end_date.replace(tzinfo=None),
+        "weeks": bool(query.get("weeks")),
+        "level": level,
+        "exclude_variables": query.get("excluded_variables") or []
+    }
+
+
+class AggregateBulk(Resource):
+    """
+    Aggregates many variables and locations in one request. The queries are
+    posted as JSON, either as a list or as {"queries": [...]}. Queries on
+    locations of the same level with the same breakdown are computed by one
+    SQL statement.
+
+    At most BULK_QUERY_LIMIT queries can be posted in one request.
+
+    Each query has\n
+        variables: variable_id or list of variable_ids, the first is summed\n
+        location: location_id (defaults to 1)\n
+        start_date, end_date: ISO dates (defaults to all time)\n
+        year: instead of start_date and end_date\n
+        weeks: true for a breakdown by epi week\n
+        level: location level to break down by\n
+        excluded_variables: list of variable_ids\n
+
+    Returns:\n
+        result: {"results": [{"total": total, "weeks": {...}, level: {...}}]}\n
+    """
+    decorators = [authenticate]
+    method_decorators = [admission_control]
+    cost_class = "heavy"
+
+    def post(self):
+        queries = request.get_json(silent=True)
+        if isinstance(queries, dict):
+            queries = queries.get("queries")
+        if not isinstance(queries, list):
+            abort(400, message="Expected a list of queries")
+        limit = current_app.config["BULK_QUERY_LIMIT"]
+        if len(queries) > limit:
+            abort(400, message="At most {} queries per request".format(limit))
+        queries = [_parse_bulk_query(query) for query in queries]
+        return {"results": query_sum_many(db, queries)}
+
+
 EXCLUDED_VARIABLES_ARG_NAME = 'excluded_variables'
 
 
@@ -170,6 +251,7 @@ class AggregateCategory(AggregateBaseResource):
         result_dict: {variable_id: AggregateYear result_dict}\n
     """
     decorators = [authenticate]
+    method_decorators = [columnar_format]
 
     def get(self, category, location_id, lim_variables=None, year=None):
 
@@ -219,6 +301,7 @@ class AggregateCategorySum(AggregateBaseResource):
         result_dict: {variable_id: AggregateYear result_dict}\n
     """
     decorators = [authenticate]
+    method_decorators = [columnar_format]
 
     def get(self, category, location_id, lim_variables="", year=None):
 
@@ -300,16 +383,21 @@ class AggregateLatestCategory(Resource):
             weeks = False
         variables_instance = Variables()
         variables = variables_instance.get(category)
-        aggregate_latest_year = AggregateLatestYear()
+        year = int(year)
+        start_date = datetime(year, 1, 1)
+        end_date = datetime(year + 1, 1, 1)
+        results = latest_query_many(
+            db, [str(v) for v in variables.keys()], str(identifier_id),
+            start_date, end_date, location_id, weeks=weeks
+        )
 
         return_data = {}
-        for variable in variables.keys():
-            return_data[variable] = aggregate_latest_year.get(
-                variable,
-                identifier_id,
-                location_id,
-                year,
-                weeks=weeks)
+        for variable, result in results.items():
+            if weeks:
+                return_data[variable] = {"weeks": result["weeks"],
+                                         "year": result["total"]}
+            else:
+                return_data[variable] = result
 
         return return_data
 
@@ -329,6 +417,7 @@ class AggregateLatestLevel(Resource):
        result_dict: {"weeks":{1:0....}, "year":0}\n
     """
     decorators = [authenticate]
+    method_decorators = [columnar_format]
 
     def get(self, variable_id, identifier_id, level, weekly=True, location_id=1):
         variable_id = str(variable_id)
@@ -381,12 +470,18 @@ class Records(Resource):
             # Get last full week
             conditions.append(Data.epi_week == current_week - 1)
 
-        results = db.session.query(Data).filter(
-            *conditions, or_(
-                loc == location_id for loc in (Data.country,
-                                               Data.region,
-                                               Data.district,
-                                               Data.clinic))).all()
+        # Arrow streams are built from the columns of the result rows
+        mediatype = response_mediatype()
+        arrow_stream = mediatype == ARROW_STREAM
+        if arrow_stream:
+            columns = list(Data.__table__.columns)
+            query = db.session.query(*columns)
+        else:
+            query = db.session.query(Data)
+        results = query.filter(
+            *conditions,
+            location_condition(db.session, location_id, levels=NO_ZONE_LEVELS)
+        ).all()
         if unique_clinic:
             assert unique_clinic == "last"
             clinic_records = {}
@@ -403,37 +498,10 @@ class Records(Resource):
                         sorted(records, key=lambda x: x.date)[-1]
                     )
 
-        return jsonify({"records": rows_to_dicts(results)})
-
-
-api.add_resource(Aggregate, "/aggregate/<variable_id>/<location_id>")
-api.add_resource(AggregateLatest, "/aggregate_latest/<variable_id>/<identifier_id>/<location_id>")
-
-api.add_resource(AggregateYear,
-                 "/aggregate_year/<variable_id>/<location_id>",
-                 "/aggregate_year/<variable_id>/<location_id>/<year>")
-api.add_resource(AggregateLatestYear,
-                 "/aggregate_latest_year/<variable_id>/<identifier_id>/<location_id>",
-                 "/aggregate_latest_year/<variable_id>/<identifier_id>/<location_id>/<weeks>",
-                 "/aggregate_latest_year/<variable_id>/<identifier_id>/<location_id>/<weeks>/<year>")
-api.add_resource(AggregateLatestLevel,
-                 "/aggregate_latest_level/<variable_id>/<identifier_id>/<level>",
-                 "/aggregate_latest_level/<variable_id>/<identifier_id>/<level>/<weekly>",
-                 "/aggregate_latest_level/<variable_id>/<identifier_id>/<level>/<weekly>/<location_id>")
-api.add_resource(AggregateLatestCategory,
-                 "/aggregate_latest_category/<category>/<identifier_id>/<location_id>",
-                 "/aggregate_latest_category/<category>/<identifier_id>/<location_id>/<weeks>",
-                 "/aggregate_latest_category/<category>/<identifier_id>/<location_id>/<weeks>/<year>"
-
-                 )
-
-api.add_resource(AggregateCategory,
-                 "/aggregate_category/<category>/<location_id>",
-                 "/aggregate_category/<category>/<location_id>/<year>",
-                 "/aggregate_category/<category>/<location_id>/<year>/<lim_variables>")
-api.add_resource(AggregateCategorySum,
-                 "/aggregate_category_sum/<category>/<location_id>",
-                 "/aggregate_category_sum/<category>/<location_id>/<year>",
-                 "/aggregate_category_sum/<category>/<location_id>/<year>/<lim_variables>")
-api.add_resource(Records, "/records/<variable>/<location_id>")
-api.add_resource(LatestData, "/latest/<location_id>")
+        if arrow_stream:
+            return rows_to_record_batch(results, columns)
+        data = {"records": rows_to_dicts(results)}
+        if mediatype == "application/msgpack":
+            return data
+        # Every other client gets JSON, as before
+        return jsonify(data)
@@ -13,7 +13,7 @@ from sqlalchemy import and_
 
 from meerkat_abacus import model
 from meerkat_api.authentication import authenticate
-from meerkat_api.extensions import db, api
+from meerkat_api.extensions import db
 from meerkat_api.resources.locations import Location
 from meerkat_api.util import rows_to_dicts, get_children
 from meerkat_abacus.util import get_locations
@@ -181,9 +181,3 @@ class DeviceSubmissionsForLocation(DeviceResourceBase):
             "clinicCount": len(children_location_ids),
             "clinicSubmissions": results_by_location
         })
-
-
-api.add_resource(Devices, "/devices")
-
-api.add_resource(DeviceSubmissions, "/device/<device_id>/submissions/<variable_id>")
-api.add_resource(DeviceSubmissionsForLocation, "/devices/submissions/<variable_id>")
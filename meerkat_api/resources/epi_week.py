@@ -3,11 +3,18 @@ Resource to deal with epi-weeks
 """
 import datetime
 from dateutil.parser import parse, isoparse
-from flask import jsonify
-from flask_restful import Resource
+from flask import jsonify, request
+from flask_restful import Resource, abort
 
-from meerkat_api.extensions import api
 import meerkat_abacus.util.epi_week as epi_week_util
+from api_background import epi_calendar
+
+
+def _parse_date(date):
+    try:
+        return isoparse(date)
+    except ValueError:
+        return parse(date, dayfirst=True)
 
 
 class EpiWeek(Resource):
@@ -22,14 +29,11 @@ class EpiWeek(Resource):
 
     def get(self, date=None):
         if date:
-            try:
-                date = isoparse(date)
-            except ValueError:
-                date = parse(date, dayfirst=True)
+            date = _parse_date(date).replace(tzinfo=None)
         else:
             date = datetime.datetime.today()
 
-        _epi_year, _epi_week_number = epi_week_util.epi_week_for_date(date)
+        _epi_year, _epi_week_number = epi_calendar.epi_week_for_date(date)
         _epi_year_start_day_weekday = epi_week_util.epi_year_start_date(date).weekday()
         return jsonify(epi_week=_epi_week_number,
                        year=_epi_year,
@@ -52,5 +56,33 @@ class EpiWeekStart(Resource):
         return jsonify(start_date=_epi_week_start_date)
 
 
-api.add_resource(EpiWeek, "/epi_week", "/epi_week/<date>")
-api.add_resource(EpiWeekStart, "/epi_week_start/<year>/<epi_week>")
+class EpiWeeks(Resource):
+    """
+    Get the epi weeks of a list of dates(defaults to today)
+
+    Args:\n
+        dates: comma separated dates in the query string\n
+    Returns:\n
+        epi_weeks: list of date, epi_week, year and start_date\n
+    """
+
+    def get(self):
+        dates = request.args.get("dates")
+        if dates:
+            try:
+                dates = [_parse_date(d.strip()) for d in dates.split(",")]
+            except ValueError:
+                abort(400, message="Invalid date in dates")
+        else:
+            dates = [datetime.datetime.today()]
+
+        _epi_years, _epi_weeks, _week_starts = epi_calendar.epi_weeks_for_dates(
+            [d.replace(tzinfo=None) for d in dates])
+        return jsonify(epi_weeks=[
+            {"date": date.isoformat(),
+             "epi_week": int(_epi_weeks[i]),
+             "year": int(_epi_years[i]),
+             "start_date": datetime.datetime.combine(
+                 _week_starts[i].astype(datetime.date), datetime.time()).isoformat()}
+            for i, date in enumerate(dates)
+        ])
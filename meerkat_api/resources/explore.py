@@ -9,9 +9,11 @@ import meerkat_abacus.util.epi_week
 from meerkat_abacus.model import Data
 import meerkat_abacus.util as abacus_util
 from meerkat_api.authentication import authenticate, is_allowed_location
-from meerkat_api.extensions import db, api
+from meerkat_api.columnar import columnar_format
+from meerkat_api.extensions import db
 from meerkat_api.resources.variables import Variables
 from meerkat_api.util import fix_dates
+from meerkat_api.util.data_query import location_condition
 
 
 def get_variables(category):
@@ -82,6 +84,7 @@ class QueryVariable(Resource):
         data: {variable_1: {total: X, weeks: {12:X,13:X}}....}\n
     """
     decorators = [authenticate]
+    method_decorators = [columnar_format]
 
     def get(self, variable, group_by, start_date=None,
             end_date=None, only_loc=None, use_ids=None, date_variable=None, additional_variables=None,
@@ -112,8 +115,8 @@ class QueryVariable(Resource):
 
         if "location" in variable:
             location_id = variable.split(":")[1]
-            conditions = date_conditions + [or_(loc == location_id for loc in (
-                Data.country, Data.zone, Data.region, Data.district, Data.clinic))]
+            conditions = date_conditions + [
+                location_condition(db.session, location_id)]
         else:
             conditions = [Data.variables.has_key(variable)] + date_conditions
             if additional_variables:
@@ -122,8 +125,7 @@ class QueryVariable(Resource):
                     conditions.append(Data.variables.has_key(i))
 
             if only_loc:
-                conditions += [or_(loc == only_loc for loc in (
-                    Data.country, Data.zone, Data.region, Data.district, Data.clinic))]
+                conditions += [location_condition(db.session, only_loc)]
         epi_year_start = meerkat_abacus.util.epi_week.epi_year_start_date(start_date)
         # Determine which columns we want to extract from the Data table
         columns_to_extract = [func.count(Data.id).label('value')]
@@ -243,8 +245,7 @@ class QueryCategory(Resource):
         # Assemble conditions and columns to query
         conditions = []
         if only_loc:
-            conditions += [or_(loc == only_loc for loc in (
-                Data.country, Data.zone, Data.region, Data.district, Data.clinic))]
+            conditions += [location_condition(db.session, only_loc)]
 
         columns_to_query = [Data.categories[group_by1].astext, Data.categories[group_by2].astext]
         if "locations" in group_by1:
@@ -319,15 +320,3 @@ class QueryCategory(Resource):
                     ret.setdefault(n1, {})
                     ret[n1][n2] = 0
         return ret
-
-api.add_resource(QueryVariable,
-                 "/query_variable/<variable>/<group_by>",
-                 "/query_variable/<variable>/<group_by>"
-                 "/<start_date>/<end_date>")
-api.add_resource(QueryCategory,
-                 "/query_category/<group_by1>/<group_by2>",
-                 "/query_category/<group_by1>/<group_by2>/<only_loc>",
-                 "/query_category/<group_by1>/<group_by2>"
-                 "/<start_date>/<end_date>",
-                 "/query_category/<group_by1>/<group_by2>"
-                 "/<start_date>/<end_date>/<only_loc>")
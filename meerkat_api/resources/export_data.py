@@ -2,22 +2,101 @@
 Data resource for exporting data
 """
 import json
-import uuid
 import yaml
-from flask import request, redirect, g
+from datetime import datetime, timedelta
+from flask import request, redirect, g, current_app, make_response
 from flask_restful import Resource, abort
-from meerkat_abacus.model import form_tables, DownloadDataFiles
+from sqlalchemy.dialects.postgresql import insert
+from meerkat_abacus.model import form_tables, DownloadDataFiles, Data
+from meerkat_abacus.model import Locations, AggregationVariables, Links
 from meerkat_abacus.config import config as abacus_config
 from api_background.export_data import export_category, export_data, export_data_table
 from api_background.export_data import export_form, export_week_level
-from meerkat_api.extensions import db, output_csv, output_xls, api
+from api_background.columnar_writer import COLUMNAR_FORMATS
+from api_background.export_store import export_key, has_export, remove_export
+from meerkat_api.extensions import db, output_csv, output_xls
+from meerkat_api.extensions import output_parquet, output_arrow
 from meerkat_api.authentication import authenticate
+from meerkat_api.util import table_version
 
 # Uncomment to run export data during request
 # from meerkat_abacus.tasks import app as celery_app
 # celery_app.conf.CELERY_ALWAYS_EAGER = True
 
 
+def get_file_formats():
+    """
+    Returns the additional columnar file formats requested with the formats
+    request arg, e.g. ?formats=parquet,arrow. Aborts with 400 on unknown
+    formats.
+
+    Returns:
+       file_formats(list): list of formats
+    """
+    file_formats = [f for f in request.args.get("formats", "").split(",") if f]
+    for file_format in file_formats:
+        if file_format not in COLUMNAR_FORMATS:
+            abort(400, message="Unsupported format: {}".format(file_format))
+    return file_formats
+
+
+def queue_export(task, download_type, *args, tables=(Data, Locations),
+                 **kwargs):
+    """
+    Queues an export task, unless an identical export is already being
+    generated or is in the export store.
+
+    The uuid of the export is a hash of the task, its arguments, the allowed
+    location and the versions of the tables the export reads, so identical
+    requests get the same uuid until any of these tables changes. The DownloadDataFiles record is
+    created here, before the task is queued, so that identical requests
+    arriving while the task is waiting in the queue also find it. Failed
+    exports are marked as finished without success by the worker, so the
+    next identical request queues them again.
+
+    Only the request that inserts the record, or that resets a failed or
+    timed out one, queues the task, so concurrent identical requests do not
+    queue it twice.
+
+    Args:
+       task: the celery export task
+       download_type: type of the download (used as filename)
+       tables: the tables the export reads
+       args and kwargs: the arguments of the task (without the uuid)
+    Returns:
+       uuid(str): uuid of the export
+    """
+    watermark = [table_version(db.session, table) for table in tables]
+    uid = export_key(task.name, args, kwargs, g.allowed_location, watermark)
+    status = db.session.query(DownloadDataFiles).filter(
+        DownloadDataFiles.uuid == uid).first()
+    values = {"generation_time": datetime.now(), "type": download_type,
+              "success": 0, "status": 0.0}
+    if status:
+        timeout = timedelta(seconds=current_app.config["EXPORT_TIMEOUT"])
+        in_progress = (status.status != 1.0 and
+                       status.generation_time > datetime.now() - timeout)
+        finished = (status.status == 1.0 and status.success == 1 and
+                    has_export(uid))
+        if in_progress or finished:
+            return uid
+        # Only reset the record if no other request has done so already
+        claimed = db.session.query(DownloadDataFiles).filter(
+            DownloadDataFiles.uuid == uid,
+            DownloadDataFiles.generation_time == status.generation_time
+        ).update(values, synchronize_session=False) == 1
+    else:
+        claimed = db.session.execute(
+            insert(DownloadDataFiles.__table__).values(
+                uuid=uid, **values).on_conflict_do_nothing()
+        ).rowcount == 1
+    db.session.commit()
+    if claimed:
+        remove_export(uid)
+        task.delay(uid, *args, **kwargs)
+    return uid
+
+
 class Forms(Resource):
     """
     Return a dict of forms with all their columns
@@ -48,6 +127,7 @@ class ExportData(Resource):
 
     Args:
        use_loc_ids: If we use names are location ids
+       formats: additional file formats (parquet, arrow) (request arg)
     Returns:\n
        uuid
 
@@ -55,13 +135,13 @@ class ExportData(Resource):
     decorators = [authenticate]
 
     def get(self, use_loc_ids=False):
-        uid = str(uuid.uuid4())
         yaml_config = yaml.dump(abacus_config)
-        export_data.delay(
-            uid, g.allowed_location, use_loc_ids,
-            param_config_yaml=yaml_config
+        return queue_export(
+            export_data, "data",
+            g.allowed_location, use_loc_ids,
+            param_config_yaml=yaml_config,
+            file_formats=get_file_formats()
         )
-        return uid
 
 
 class ExportWeekLevel(Resource):
@@ -84,16 +164,16 @@ class ExportWeekLevel(Resource):
             variable = json.loads(request.args["variable"])
         else:
             abort(400, message="No variable were submitted")
-        uid = str(uuid.uuid4())
         yaml_config = yaml.dump(abacus_config)
-        export_week_level.delay(uid, download_name, level,
-                                variable,
-                                start_date=request.args.get("start_date", None),
-                                end_date=request.args.get("end_date", None),
-                                language=request.args.get("language", "en"),
-                                wide_data_format=int(request.args.get("wide_data_format", False)),
-                                param_config_yaml=yaml_config)
-        return uid
+        return queue_export(export_week_level, download_name,
+                            download_name, level,
+                            variable,
+                            start_date=request.args.get("start_date", None),
+                            end_date=request.args.get("end_date", None),
+                            language=request.args.get("language", "en"),
+                            wide_data_format=int(request.args.get("wide_data_format", False)),
+                            param_config_yaml=yaml_config,
+                            file_formats=get_file_formats())
 
 
 class ExportDataTable(Resource):
@@ -124,17 +204,17 @@ class ExportDataTable(Resource):
 
         if "location_conditions" in request.args.keys():
             location_conditions = json.loads(request.args["location_conditions"])
-            
-        uid = str(uuid.uuid4())
+
         yaml_config = yaml.dump(abacus_config)
-        export_data_table.delay(uid, download_name,
-                                restrict_by, variables, group_by,
-                                location_conditions=location_conditions,
-                                start_date=request.args.get("start_date", None),
-                                end_date=request.args.get("end_date", None),
-                                wide_data_format=int(request.args.get("wide_data_format", False)),
-                                param_config_yaml=yaml_config)
-        return uid
+        return queue_export(export_data_table, download_name,
+                            download_name,
+                            restrict_by, variables, group_by,
+                            location_conditions=location_conditions,
+                            start_date=request.args.get("start_date", None),
+                            end_date=request.args.get("end_date", None),
+                            wide_data_format=int(request.args.get("wide_data_format", False)),
+                            param_config_yaml=yaml_config,
+                            file_formats=get_file_formats())
 
 
 class ExportCategory(Resource):
@@ -151,22 +231,24 @@ class ExportCategory(Resource):
     decorators = [authenticate]
 
     def get(self, form_name, category, download_name, data_type=None):
-        uid = str(uuid.uuid4())
         if "variables" in request.args.keys():
             variables = json.loads(request.args["variables"])
         else:
             abort(400, message="No variables were submitted")
         language = request.args.get("language", "en")
         yaml_config = yaml.dump(abacus_config)
-        export_category.delay(
-            uid, form_name, category, download_name,
+        return queue_export(
+            export_category, download_name,
+            form_name, category, download_name,
             variables, data_type, g.allowed_location,
+            tables=(Data, Locations, AggregationVariables, Links,
+                    form_tables(abacus_config).get(form_name, Data)),
             start_date=request.args.get("start_date", None),
             end_date=request.args.get("end_date", None),
             language=language,
-            param_config_yaml=yaml_config
+            param_config_yaml=yaml_config,
+            file_formats=get_file_formats()
         )
-        return uid
 
 
 class ExportDataResource(Resource):
@@ -187,6 +269,24 @@ class ExportDataResource(Resource):
         self.__abort_if_resource_not_exists(result, uid)
         return result
 
+    @staticmethod
+    def serve_download(download_data_file, extension):
+        """
+        Serves the file through the web server, either with an internal
+        X-Accel-Redirect or with an ordinary redirect.
+        """
+        filename = download_data_file.type + "." + extension
+        path = "/exported_data/" + download_data_file.uuid + "/" + filename
+        accel_location = current_app.config["EXPORT_ACCEL_REDIRECT"]
+        if accel_location:
+            response = make_response("")
+            response.headers["X-Accel-Redirect"] = accel_location + path
+            response.headers["Content-Disposition"] = (
+                'attachment; filename="{}"'.format(filename)
+            )
+            return response
+        return redirect(path)
+
     @staticmethod
     def abort_if_resource_generation_failed(download_data_file, uid):
         if download_data_file.status == 1.0 and download_data_file.success != 1:
@@ -218,7 +318,7 @@ class GetCSVDownload(ExportDataResource):
         result = self.get_download_data_file(uid)
         self.abort_if_resource_generation_still_in_progress(result, uid)
         self.abort_if_resource_generation_failed(result, uid)
-        return redirect("/exported_data/" + uid + "/" + result.type + ".csv")
+        return self.serve_download(result, "csv")
 
 
 class GetXLSDownload(ExportDataResource):
@@ -236,7 +336,41 @@ class GetXLSDownload(ExportDataResource):
         result = self.get_download_data_file(uid)
         self.abort_if_resource_generation_still_in_progress(result, uid)
         self.abort_if_resource_generation_failed(result, uid)
-        return redirect("/exported_data/" + uid + "/" + result.type + ".xlsx")
+        return self.serve_download(result, "xlsx")
+
+
+class GetParquetDownload(ExportDataResource):
+    """
+    Serves a pregenerated parquet file
+
+    Args:
+       uuid: uuid of download
+    """
+    decorators = [authenticate]
+    representations = {'application/vnd.apache.parquet': output_parquet}
+
+    def get(self, uid):
+        result = self.get_download_data_file(uid)
+        self.abort_if_resource_generation_still_in_progress(result, uid)
+        self.abort_if_resource_generation_failed(result, uid)
+        return self.serve_download(result, "parquet")
+
+
+class GetArrowDownload(ExportDataResource):
+    """
+    Serves a pregenerated Arrow IPC file
+
+    Args:
+       uuid: uuid of download
+    """
+    decorators = [authenticate]
+    representations = {'application/vnd.apache.arrow.file': output_arrow}
+
+    def get(self, uid):
+        result = self.get_download_data_file(uid)
+        self.abort_if_resource_generation_still_in_progress(result, uid)
+        self.abort_if_resource_generation_failed(result, uid)
+        return self.serve_download(result, "arrow")
 
 
 class GetStatus(ExportDataResource):
@@ -267,31 +401,15 @@ class ExportForm(Resource):
     decorators = [authenticate]
 
     def get(self, form):
-        uid = str(uuid.uuid4())
         if "fields" in request.args.keys():
             fields = request.args["fields"].split(",")
         else:
             fields = None
         yaml_config = yaml.dump(abacus_config)
-        export_form.delay(
-            uid, form, g.allowed_location, fields,
-            param_config_yaml=yaml_config
+        return queue_export(
+            export_form, form,
+            form, g.allowed_location, fields,
+            tables=(form_tables(abacus_config).get(form, Data), Locations),
+            param_config_yaml=yaml_config,
+            file_formats=get_file_formats()
         )
-        return uid
-
-
-# Export data
-api.add_resource(GetCSVDownload, "/export/getcsv/<uid>")
-api.add_resource(GetXLSDownload, "/export/getxls/<uid>")
-api.add_resource(GetStatus, "/export/get_status/<uid>")
-api.add_resource(ExportData, "/export/data",
-                 "/export/data/<use_loc_ids>")
-api.add_resource(ExportForm, "/export/form/<form>")
-api.add_resource(Forms, "/export/forms")
-api.add_resource(ExportCategory,
-                 "/export/category/<form_name>/<category>/<download_name>",
-                 "/export/category/<form_name>/<category>/<download_name>/<data_type>")
-api.add_resource(ExportDataTable,
-                 "/export/data_table/<download_name>/<restrict_by>")
-api.add_resource(ExportWeekLevel,
-                 "/export/week_level/<download_name>/<level>")
@@ -2,21 +2,60 @@
 Resource for frontpage, so that certain data can be accessed without authentication
 """
 from flask_restful import Resource
-from flask import g
+from flask import g, current_app
 from datetime import datetime
 from geoalchemy2.shape import to_shape
 
-from meerkat_api.extensions import db, api
+from meerkat_api.extensions import db
 from meerkat_abacus.util import get_locations
 from meerkat_api.util import get_children
-from meerkat_api.resources.data import Aggregate
-from meerkat_api.resources.map import MapVariable
+from meerkat_api.util.counters import get_counters, counter_value
+from meerkat_api.resources.map import add_all_clinics
 from meerkat_api.resources.variables import Variables
 from meerkat_api.resources.alerts import get_alerts
-from meerkat_api.resources.reports import get_latest_category
+from meerkat_api.resources.reports import get_latest_category_many
 from meerkat_api.resources.locations import TotClinics
 
 
+MAP_VARIABLES = ["tot_1", "reg_2"]
+
+
+def frontpage_counters():
+    """
+    Returns the key indicator variable ids and the counter store for the
+    key indicators and map variables.
+    """
+    key_indicators = list(Variables().get("key_indicators").keys())
+    return key_indicators, get_counters(db, key_indicators + MAP_VARIABLES)
+
+
+def cache_headers():
+    return {"Cache-Control": "public, max-age={}".format(
+        current_app.config["FRONTPAGE_CACHE_MAX_AGE"])}
+
+
+def counter_map(variable, location):
+    """
+    Maps the current epi year total of variable by clinic from the
+    frontpage counters, including all clinics even with no cases.
+    """
+    store = frontpage_counters()[1]
+    locations = get_locations(db.session)
+    clinics = {}
+    for key, value in store["year"][variable].items():
+        clinic, lat, lng, record_locations = key
+        if clinic and lat is not None and location in record_locations:
+            clinics[(clinic, lat, lng)] = clinics.get((clinic, lat, lng), 0) + value
+    ret = {}
+    for (clinic, lat, lng), value in clinics.items():
+        # Leaflet uses LatLng
+        ret[str(clinic)] = {"value": counter_value(value),
+                            "geolocation": [lat, lng],
+                            "clinic": locations[clinic].name}
+    add_all_clinics(ret, location)
+    return ret
+
+
 class KeyIndicators(Resource):
     """
     Get the aggregation for all time of the variables with
@@ -25,14 +64,15 @@ class KeyIndicators(Resource):
 
     def get(self, location=1):
         g.allowed_locations = location
-        variables_instance = Variables()
-        variables = variables_instance.get("key_indicators")
-        aggregate = Aggregate()
+        key_indicators, store = frontpage_counters()
 
         return_data = {}
-        for variable in variables.keys():
-            return_data[variable] = aggregate.get(variable, location)
-        return return_data
+        for variable in key_indicators:
+            return_data[variable] = {
+                "value": counter_value(
+                    store["totals"][variable].get(location, 0))
+            }
+        return return_data, 200, cache_headers()
 
 
 class TotMap(Resource):
@@ -41,9 +81,8 @@ class TotMap(Resource):
     """
 
     def get(self, location=1):
-        mv = MapVariable()
         g.allowed_locations = location
-        return mv.get("tot_1", location=location, include_all_clinics=True)
+        return counter_map("tot_1", location), 200, cache_headers()
 
 
 class ConsultationMap(Resource):
@@ -53,8 +92,7 @@ class ConsultationMap(Resource):
 
     def get(self, location=1):
         g.allowed_locations = location
-        mv = MapVariable()
-        return mv.get("reg_2", location=location, include_all_clinics=True)
+        return counter_map("reg_2", location), 200, cache_headers()
 
 
 class NumAlerts(Resource):
@@ -91,9 +129,11 @@ class RefugeePage(Resource):
         refugee_clinics = get_children(1, locs, clinic_type="Refugee")
         tot_pop = 0
         clinic_map = []
+        population = get_latest_category_many("population", refugee_clinics,
+                                              datetime(2015, 1, 1),
+                                              datetime.now())
         for clinic in refugee_clinics:
-            result = get_latest_category("population", clinic,
-                                         datetime(2015, 1, 1), datetime.now())
+            result = population[clinic]
             clinic_pop = 0
             if (result):
                 clinic_pop = sum(
@@ -106,16 +146,3 @@ class RefugeePage(Resource):
                                "clinic": locs[clinic].name,
                                "location_id": clinic})
         return clinic_map
-
-
-api.add_resource(KeyIndicators, "/key_indicators",
-                 "/key_indicators/<int:location>")
-api.add_resource(TotMap, "/tot_map",
-                 "/tot_map/<int:location>")
-api.add_resource(ConsultationMap, "/consultation_map",
-                 "/consultation_map/<int:location>")
-api.add_resource(NumAlerts, "/num_alerts",
-                 "/num_alerts/<int:location>")
-api.add_resource(NumClinics, "/num_clinics",
-                 "/num_clinics/<int:location>")
-api.add_resource(RefugeePage, "/refugee_page")
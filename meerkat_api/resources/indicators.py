@@ -3,9 +3,10 @@ import numpy as np
 from dateutil.relativedelta import relativedelta
 from flask_restful import Resource
 from flask import request
-from sqlalchemy import or_, Float
-from meerkat_api.extensions import db, api
+from sqlalchemy import func, Float
+from meerkat_api.extensions import db
 from meerkat_api.util import series_to_json_dict
+from meerkat_api.util.data_query import location_condition
 from meerkat_analysis.indicators import count_over_count, count, grouped_indicator
 from meerkat_abacus.model import Data
 from meerkat_api.authentication import authenticate
@@ -24,13 +25,13 @@ def prepare_indicator_output(analysis_output, mult_factor):
     if np.isnan(cummulative):
         cummulative = 0
     elif isinstance(cummulative, np.generic) or isinstance(cummulative, np.ndarray):
-        cummulative = np.asscalar(cummulative)
+        cummulative = cummulative.item()
 
     timeline = analysis_output[1] * mult_factor
     indicator_data["cummulative"] = cummulative * mult_factor
     indicator_data["timeline"] = series_to_json_dict(timeline)
-    indicator_data["current"] = float(np.asscalar(timeline.iloc[-1]))
-    indicator_data["previous"] = float(np.asscalar(timeline.iloc[-2]))
+    indicator_data["current"] = float(timeline.iloc[-1])
+    indicator_data["previous"] = float(timeline.iloc[-2])
     indicator_data["name"] = "Name is not passed to the API!"
     return indicator_data
 
@@ -85,38 +86,39 @@ class Indicators(Resource):
                 mult_factor = int(op[1])
 
         # Limit to location and numerator variable
-        conditions = [or_(
-            loc == location
-            for loc in (Data.country, Data.zone,
-                        Data.region, Data.district,
-                        Data.clinic))
-        ]
+        conditions = [location_condition(db.session, location)]
         conditions += [Data.date >= start_date]
 
         # Limit to given restrict variables
         for res_var in restricted_var:
             conditions.append(Data.variables.has_key(res_var))
+        # We sum up the numerator and denominator per day (and per
+        # group_by_level) in the database so that the analysis functions
+        # only have to resample a small frame to weeks.
+        date_column = func.date_trunc("day", Data.date).label("date")
+        group_columns = [date_column]
+        if group_by_level:
+            group_columns.insert(0, getattr(Data, group_by_level).label(group_by_level))
         # Add denominator
         try:
             if count_over:
                 if denominator is None or numerator is None:
                     return "Need both denominator and numerator"
                 conditions.append(Data.variables.has_key(denominator))
-                # Database query
-                data = pd.read_sql(
-                    db.session.query(Data.region, Data.district, Data.clinic,
-                                     Data.date,
-                                     Data.variables[numerator].astext.cast(Float).label(numerator),
-                                     Data.variables[denominator].astext.cast(Float).label(denominator)
-                                    ).filter(
-                                        *conditions).statement, db.engine)
+                value_columns = [
+                    func.sum(Data.variables[numerator].astext.cast(Float)).label(numerator),
+                    func.sum(Data.variables[denominator].astext.cast(Float)).label(denominator)
+                ]
             else:
                 conditions.append(Data.variables.has_key(numerator))
-                data = pd.read_sql(
-                    db.session.query(
-                        Data.region, Data.district, Data.clinic,
-                        Data.date, Data.variables[numerator].label(numerator)
-                    ).filter(*conditions).statement, db.session.bind)
+                value_columns = [
+                    func.sum(Data.variables[numerator].astext.cast(Float)).label(numerator)
+                ]
+            # Database query
+            data = pd.read_sql(
+                db.session.query(*(group_columns + value_columns)).filter(
+                    *conditions).group_by(*group_columns).statement,
+                db.engine)
             data = data.fillna(0)
 
             if data.empty:
@@ -166,9 +168,3 @@ class Indicators(Resource):
                 "current": 0,
                 "previous": 0
             }
-
-
-api.add_resource(
-    Indicators, "/indicators/<flags>/<variables>/<location>",
-    "/indicators/<flags>/<variables>/<location>/<start_date>/<end_date>"
-)
@@ -10,7 +10,7 @@ from sqlalchemy import func, or_
 from meerkat_abacus import model
 from meerkat_abacus.util import is_child, get_locations
 from meerkat_api.authentication import authenticate
-from meerkat_api.extensions import db, api
+from meerkat_api.extensions import db
 from meerkat_api.util import row_to_dict, rows_to_dicts, get_children
 
 
@@ -209,11 +209,3 @@ def _get_by_device_id_filter(device_id):
                           locations_deviceid.contains(",{},".format(device_id)),
                           locations_deviceid.endswith(",{}".format(device_id)))
     return location_filter
-
-
-api.add_resource(Locations, "/locations")
-api.add_resource(LocationTree, "/locationtree")
-api.add_resource(Location, "/location/<location_id>")
-# endpoint "/device/<device_id>" is deprecated use /locations?deviceId=<device_id> instead
-api.add_resource(LocationByDeviceId, "/device/<device_id>")
-api.add_resource(TotClinics, "/tot_clinics/<location_id>")
@@ -1,20 +1,25 @@
 """
 Resources for creating maps
 """
+import math
+import threading
+
 import shapely.geometry
 from flask import g, request
-from flask_restful import Resource
+from flask_restful import Resource, abort
 from geoalchemy2.shape import to_shape
 from geojson import Point, FeatureCollection, Feature
-from sqlalchemy import func, Float, or_
+from sqlalchemy import func, Float
 
 from meerkat_abacus import model
 from meerkat_abacus.model import Data, Locations
 from meerkat_abacus.util import is_child, get_locations
 from meerkat_api.authentication import authenticate, is_allowed_location
-from meerkat_api.extensions import db, api
+from meerkat_api.extensions import db
 from meerkat_api.resources.incidence import IncidenceRate
-from meerkat_api.util import fix_dates
+from meerkat_api.util import fix_dates, table_version
+from meerkat_api.util.data_query import location_condition, NO_ZONE_LEVELS
+from meerkat_api.util.data_query import LOCATION_LEVELS
 
 
 class Clinics(Resource):
@@ -56,6 +61,25 @@ class Clinics(Resource):
                                                   "other": locations[l].other}))
         return FeatureCollection(points)
 
+def add_all_clinics(map_data, location):
+    """
+    Adds all case reporting clinics under location that are not already in
+    map_data with a value of 0.
+
+    Args:
+       map_data: map data keyed by clinic id
+       location: location to restrict to
+    """
+    results = db.session.query(model.Locations)
+    for row in results.all():
+        if is_allowed_location(row.id, location):
+            if row.case_report and row.point_location is not None and str(row.id) not in map_data.keys():
+                geo = to_shape(row.point_location)
+                map_data[str(row.id)] = {"value": 0,
+                                         "geolocation": [geo.y, geo.x],
+                                         "clinic": row.name}
+
+
 class MapVariable(Resource):
     """
     Want to map a variable id by clinic (only include case reporting clinics)
@@ -91,12 +115,7 @@ class MapVariable(Resource):
             Data.variables.has_key(variable_id),
             Data.date >= start_date,
             Data.date < end_date,
-            or_(
-                loc == location for loc in (Data.country,
-                                            Data.region,
-                                            Data.district,
-                                            Data.clinic)
-            )
+            location_condition(db.session, location, levels=NO_ZONE_LEVELS)
         ).group_by("clinic", "geolocation")
 
         locations = get_locations(db.session)
@@ -116,14 +135,7 @@ class MapVariable(Resource):
                     
 
         if include_all_clinics:
-            results = db.session.query(model.Locations)
-            for row in results.all():
-                if is_allowed_location(row.id, location):
-                    if row.case_report and row.point_location is not None and str(row.id) not in ret.keys():
-                        geo = to_shape(row.point_location)
-                        ret[str(row.id)] = {"value": 0,
-                                            "geolocation": [geo.y, geo.x],
-                                            "clinic": row.name}
+            add_all_clinics(ret, location)
         return ret
     
 class MapCategory(Resource):
@@ -161,12 +173,7 @@ class MapCategory(Resource):
             Data.categories.has_key(category),
             Data.date >= start_date,
             Data.date < end_date,
-            or_(
-                loc == location for loc in (Data.country,
-                                            Data.region,
-                                            Data.district,
-                                            Data.clinic)
-            )
+            location_condition(db.session, location, levels=NO_ZONE_LEVELS)
         ).order_by(Data.clinic).order_by(Data.date.desc())
 
         locations = get_locations(db.session)
@@ -187,14 +194,7 @@ class MapCategory(Resource):
                     
 
         if include_all_clinics:
-            results = db.session.query(model.Locations)
-            for row in results.all():
-                if is_allowed_location(row.id, location):
-                    if row.case_report and row.point_location is not None and str(row.id) not in ret.keys():
-                        geo = to_shape(row.point_location)
-                        ret[str(row.id)] = {"value": 0,
-                                            "geolocation": [geo.y, geo.x],
-                                            "clinic": row.name}
+            add_all_clinics(ret, location)
         return ret
 
 
@@ -235,15 +235,92 @@ class IncidenceMap(Resource):
         return ret
 
 
+# Cache of the serialised shapes keyed by (level, zoom, precision), for
+# one version of the locations
+shape_cache = {"version": None, "shapes": {}}
+shape_cache_lock = threading.Lock()
+
+# Shapes are simplified for at most MAX_ZOOM + 1 zoom levels and rounded to
+# at most MAX_PRECISION decimals, so the cache can not grow without bound
+MAX_ZOOM = 20
+MAX_PRECISION = 8
+
+
+def zoom_to_tolerance(zoom):
+    """
+    Translates a web map zoom level into a simplification tolerance in
+    degrees. We use the width of one pixel at the given zoom level, so the
+    simplified shapes are visually identical to the full resolution ones.
+
+    Args:
+       zoom: web map zoom level
+    Returns:
+       tolerance(float): tolerance in degrees
+    """
+    return 360 / (256 * 2 ** int(zoom))
+
+
+def tolerance_to_zoom(tolerance):
+    """
+    Returns the zoom level whose tolerance is closest to tolerance, or None
+    for no simplification
+
+    Args:
+       tolerance: tolerance in degrees
+    Returns:
+       zoom(int): web map zoom level
+    """
+    if tolerance == 0:
+        return None
+    zoom = round(math.log2(360 / (256 * tolerance)))
+    return min(max(zoom, 0), MAX_ZOOM)
+
+
+def round_coordinates(coordinates, precision):
+    """
+    Recursively rounds the coordinates of a geojson geometry
+
+    Args:
+       coordinates: geojson coordinates (nested lists or tuples)
+       precision: number of decimals to keep
+    Returns:
+       coordinates(list): rounded coordinates
+    """
+    if isinstance(coordinates[0], (list, tuple)):
+        return [round_coordinates(c, precision) for c in coordinates]
+    return [round(c, precision) for c in coordinates]
+
+
 class Shapes(Resource):
     """
-    Returns the shapes for the given level
-    
+    Returns the shapes for the given level. The shapes can be simplified
+    for display at a given map zoom level.
+
     Args:\n
-       level: region, district or clinic
+       level: region, district or clinic\n
+       zoom: map zoom level to simplify the shapes for (request arg)\n
+       tolerance: explicit simplification tolerance in degrees, overrides
+                  zoom and is snapped to the closest zoom level (request arg)\n
+       precision: number of decimals to keep in the coordinates, at most
+                  8 (request arg)\n
     """
 
     def get(self, level):
+        try:
+            zoom, precision = self._parse_args()
+        except (ValueError, OverflowError):
+            abort(400, message="Invalid zoom, tolerance or precision")
+        tolerance = zoom_to_tolerance(zoom) if zoom is not None else None
+
+        version = table_version(db.session, Locations)
+        key = (level, zoom, precision)
+        with shape_cache_lock:
+            if shape_cache["version"] != version:
+                shape_cache["version"] = version
+                shape_cache["shapes"] = {}
+            if key in shape_cache["shapes"]:
+                return shape_cache["shapes"][key]
+
         results = db.session.query(
             Locations.point_location,
             Locations.area,
@@ -260,26 +337,46 @@ class Shapes(Resource):
                     shape = to_shape(r[0])
                 else:
                     shape = to_shape(r[1])
-                    
+                    if tolerance:
+                        shape = shape.simplify(tolerance,
+                                               preserve_topology=True)
+                geometry = shapely.geometry.mapping(shape)
+                if precision is not None:
+                    geometry = {
+                        "type": geometry["type"],
+                        "coordinates": round_coordinates(
+                            geometry["coordinates"], precision
+                        )
+                    }
                 feature = {"type": "Feature",
                        "properties": {
                            "Name": r[2]
                        },
-                           "geometry": shapely.geometry.mapping(shape)
+                           "geometry": geometry
                 }
                 features.append(feature)
-        return {"type": "FeatureCollection", "features": features}
-            
-api.add_resource(Clinics, "/clinics/<location_id>",
-                 "/clinics/<location_id>/<clinic_type>",
-                 "/clinics/<location_id>/<clinic_type>/<require_case_report>")
-api.add_resource(Shapes, "/geo_shapes/<level>")
-
-api.add_resource(MapVariable, "/map/<variable_id>",
-                 "/map/<variable_id>/<location>",
-                 "/map/<variable_id>/<location>/<end_date>",
-                 "/map/<variable_id>/<location>/<end_date>/<start_date>" )
-api.add_resource(MapCategory, "/map_category/<category>",
-                 "/map_category/<category>/<location>")
-
-api.add_resource(IncidenceMap, "/incidence_map/<variable_id>")
+        shapes = {"type": "FeatureCollection", "features": features}
+        if level in LOCATION_LEVELS:
+            with shape_cache_lock:
+                if shape_cache["version"] == version:
+                    shape_cache["shapes"][key] = shapes
+        return shapes
+
+    def _parse_args(self):
+        """
+        Returns the zoom level and precision requested, raising ValueError
+        for invalid arguments
+        """
+        tolerance = request.args.get("tolerance")
+        zoom = request.args.get("zoom")
+        precision = request.args.get("precision")
+        if tolerance is not None:
+            tolerance = float(tolerance)
+            if not math.isfinite(tolerance) or tolerance < 0:
+                raise ValueError(tolerance)
+            zoom = tolerance_to_zoom(tolerance)
+        elif zoom is not None:
+            zoom = min(max(int(zoom), 0), MAX_ZOOM)
+        if precision is not None:
+            precision = min(max(int(precision), 0), MAX_PRECISION)
+        return zoom, precision
@@ -3,7 +3,7 @@ Data resource for completeness data
 """
 from flask_restful import Resource
 
-from meerkat_api.extensions import db, api
+from meerkat_api.extensions import db
 from meerkat_abacus.model import Data, CalculationParameters
 from meerkat_api.util import get_children, fix_dates
 from meerkat_abacus.util import get_locations
@@ -186,8 +186,3 @@ def find_highest_depletion(clinic_medicines):
 
     sorted_depletion_list = sorted(depletion_list, key=lambda k: k['depletion'], reverse=True)
     return sorted_depletion_list[0]
-
-
-api.add_resource(Prescriptions, "/prescriptions/<location>",
-                 "/prescriptions/<location>/<end_date>",
-                 "/prescriptions/<location>/<end_date>/<start_date>")
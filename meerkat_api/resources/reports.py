@@ -29,21 +29,26 @@ from gettext import gettext
 import logging, json, operator
 
 from meerkat_api.util import get_children, fix_dates, find_level
-from meerkat_api.extensions import db, api
-from meerkat_abacus.model import Data, Locations, AggregationVariables, CalculationParameters
+from meerkat_api.extensions import db
+from meerkat_abacus.model import Data, Locations, CalculationParameters
 from meerkat_api.resources.completeness import Completeness, NonReporting
 from meerkat_api.resources.variables import Variables, Variable
+from meerkat_api.resources.variables import get_variable_catalog, catalog_variables
 from meerkat_api.resources.locations import TotClinics
 from meerkat_api.resources.data import AggregateYear
 from meerkat_api.resources.map import Clinics, MapVariable
 from meerkat_api.resources import alerts
 from meerkat_api.resources.explore import QueryVariable, QueryCategory, get_variables
-from meerkat_api.util.data_query import query_sum, latest_query
+from meerkat_api.util.data_query import query_sum, latest_query_many
+from api_background import epi_calendar
+from meerkat_api.util.data_query import location_condition, NO_ZONE_LEVELS
 from meerkat_api.resources.incidence import IncidenceRate
 import meerkat_abacus.util as abacus_util
 import meerkat_abacus.util.epi_week as epi_week_util
 from meerkat_abacus import model
 from meerkat_api.authentication import authenticate, is_allowed_location
+from meerkat_api.admission import admission_control
+from meerkat_api.coalescing import coalesce_requests
 from geoalchemy2.shape import to_shape
 
 
@@ -201,6 +206,84 @@ def disease_breakdown(diseases):
     return ret
 
 
+# Variable name -> (gender, age) for variables named "Category, Gender AgeGroup"
+demographic_names = {}
+
+
+def parse_demographic_name(name):
+    """
+    Parses the gender and age group from a variable name of the format
+    "Category, Gender AgeGroup".
+
+    Args:
+       name: the variable name
+    Returns:
+       (gender, age): the lower case gender and the age group
+    """
+    if name not in demographic_names:
+        gender, age = name.split(",")[1].strip().split(" ")
+        demographic_names[name] = (gender.lower().strip(), age.strip())
+    return demographic_names[name]
+
+
+def get_latest_clinic_variables(keys, clinics, start_date, end_date):
+    """
+    Finds the latest record with any of the variables in keys for each of
+    the clinics with one DISTINCT ON query.
+
+    Args:
+       keys: variable ids the records should have
+       clinics: the clinics we are looking at
+       start_date: the start date for the aggregation
+       end_date: the end_date for the aggregation
+    Returns:
+       latest(dict): the variables of the latest record for each clinic that
+                     has one
+    """
+    if not clinics or not keys:
+        return {}
+    results = db.session.query(Data.clinic, Data.variables).distinct(
+        Data.clinic
+    ).filter(
+        or_(Data.variables.has_key(key) for key in keys),
+        Data.clinic.in_(clinics),
+        Data.date >= start_date,
+        Data.date < end_date
+    ).order_by(Data.clinic, Data.date.desc())
+    return {r.clinic: r.variables for r in results}
+
+
+def get_latest_category_many(category, clinics, start_date, end_date):
+    """
+    get_latest_category for many clinics at once. The latest records for all
+    the clinics are found with one query and the variable names are only
+    parsed once.
+
+    Args:
+       category: the category to get the demographics for
+       clinics: the clinics we are looking at
+       start_date: the start date for the aggregation
+       end_date: the end_date for the aggregation
+    Returns:
+       latest_demo(dict): the demographics from the latest record for each clinic
+    """
+    variables = variables_instance.get(category)
+    keys = sorted(variables.keys())
+    demographics = [(key,) + parse_demographic_name(variables[key]["name"])
+                    for key in keys]
+    latest = get_latest_clinic_variables(keys, clinics, start_date, end_date)
+    ret = {}
+    for clinic in clinics:
+        result = latest.get(clinic, {})
+        clinic_ret = {}
+        for key, gender, age in demographics:
+            clinic_ret.setdefault(age, {"female": 0, "male": 0})
+            if key in result:
+                clinic_ret[age][gender] += result[key]
+        ret[clinic] = clinic_ret
+    return ret
+
+
 def get_latest_category(category, clinic, start_date, end_date):
     """
     To deal with data submitted in an aggregated way. We have e.g Population data that is
@@ -218,27 +301,7 @@ def get_latest_category(category, clinic, start_date, end_date):
        latest_demo(dict): the demographics from the latest record
 
     """
-    variables = variables_instance.get(category)
-    keys = sorted(variables.keys())
-
-    result = db.session.query(Data.variables).filter(
-        or_(Data.variables.has_key(key) for key in keys),
-        Data.clinic == clinic,
-        Data.date >= start_date,
-        Data.date < end_date
-            ).order_by(Data.date.desc()).first()
-    ret = {}
-    for key in keys:
-        name = variables[key]["name"]
-        gender, age = name.split(",")[1].strip().split(" ")
-        gender = gender.lower()
-        age = age.strip()
-        gender = gender.strip()
-        ret.setdefault(age, {"female": 0, "male": 0})
-        if(result and key in result[0]):
-            ret[age][gender] += result[0][key]
-
-    return ret
+    return get_latest_category_many(category, [clinic], start_date, end_date)[clinic]
 
 def refugee_disease(disease_demo):
     """
@@ -496,6 +559,8 @@ Returns:\n
 class NcdReportNewVisits(Resource):
 
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
         retval = create_ncd_report(location=location, start_date=start_date,
@@ -505,6 +570,8 @@ class NcdReportNewVisits(Resource):
 class NcdReportReturnVisits(Resource):
 
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
         retval = create_ncd_report(location=location, start_date=start_date,
@@ -514,6 +581,8 @@ class NcdReportReturnVisits(Resource):
 class NcdReport(Resource):
 
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
         retval = create_ncd_report(location=location, start_date=start_date,
@@ -731,6 +800,8 @@ class MhReport(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
     def get(self, location, start_date=None, end_date=None):
         start_date, end_date = fix_dates(start_date, end_date)
         end_date_limit = end_date + timedelta(days=1)
@@ -898,6 +969,8 @@ class CdReport(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date = None,end_date=None):
         start_date, end_date = fix_dates(start_date, end_date)
@@ -942,13 +1015,11 @@ class CdReport(Resource):
         data = {}
         weeks = list(range(1, 53))
         data_list = [0 for week in weeks]
-        variable_query = db.session.query(AggregationVariables).filter(
-            AggregationVariables.alert == 1)
         variable_names = {}
         variable_type = {}
-        for v in variable_query.all():
-            variable_names[v.id] = v.name
-            variable_type[v.name] = v.alert_type
+        for v in catalog_variables(get_variable_catalog()["alert"]).values():
+            variable_names[v["id"]] = v["name"]
+            variable_type[v["name"]] = v["alert_type"]
         #  The loop through all alerts
         current_year = start_date.year
         previous_years = {}
@@ -971,7 +1042,7 @@ class CdReport(Resource):
                 else:
                     report_status = "suspected"
 
-            epi_week = epi_week_util.epi_week_for_date(a['date'])[1]
+            epi_week = epi_calendar.epi_week_for_date(a['date'])[1]
             if epi_week == 53:
                 if a["date"].month == 1:
                     epi_week = 1
@@ -1014,6 +1085,8 @@ class Pip(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -1269,6 +1342,8 @@ class ForeignerScreening(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -1355,6 +1430,8 @@ class PublicHealth(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
         start_date, end_date = fix_dates(start_date, end_date)
@@ -1612,6 +1689,8 @@ class CdPublicHealth(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -1905,6 +1984,8 @@ class CdPublicHealthMad(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -1955,6 +2036,8 @@ class CdPublicHealthSom(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -2167,6 +2250,8 @@ class NcdPublicHealth(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -2485,6 +2570,8 @@ class RefugeePublicHealth(Resource):
     """
 
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
         if not current_app.config["TESTING"] and "jor_refugee" not in model.form_tables:
@@ -2523,8 +2610,12 @@ class RefugeePublicHealth(Resource):
         female = 0
         no_clinicians = 0
         age_gender = {}
+        population = get_latest_category_many("population", refugee_clinics,
+                                              start_date, end_date_limit)
+        clinicians = get_latest_clinic_variables(["ref_14"], refugee_clinics,
+                                                 start_date, end_date_limit)
         for clinic in refugee_clinics:
-            clinic_data = get_latest_category("population", clinic, start_date, end_date_limit)
+            clinic_data = population[clinic]
             for age in clinic_data:
                 age_gender.setdefault(age, {})
                 for gender in clinic_data[age]:
@@ -2534,14 +2625,8 @@ class RefugeePublicHealth(Resource):
                         female += clinic_data[age][gender]
                     if gender == "male":
                         male += clinic_data[age][gender]
-            result = db.session.query(Data.variables).filter(
-                Data.variables.has_key("ref_14"),
-                Data.clinic == clinic,
-                Data.date >= start_date,
-                Data.date < end_date_limit
-            ).order_by(Data.date.desc()).first()
-            if result:
-                no_clinicians += result[0]["ref_14"]
+            if clinic in clinicians:
+                no_clinicians += clinicians[clinic]["ref_14"]
         tot_pop = male + female
         ret["data"]["total_population"] = tot_pop
 
@@ -2699,6 +2784,8 @@ class RefugeeDetail(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
         if not current_app.config["TESTING"] and "jor_refugee" not in model.form_tables:
@@ -2736,9 +2823,12 @@ class RefugeeDetail(Resource):
         female = 0
         age_gender = {}
         no_clinicians = 0
-        for clinic in refugee_clinics:
-            clinic_data = get_latest_category("population", clinic,
+        population = get_latest_category_many("population", refugee_clinics,
                                               start_date, end_date_limit)
+        clinicians = get_latest_clinic_variables(["ref_14"], refugee_clinics,
+                                                 start_date, end_date_limit)
+        for clinic in refugee_clinics:
+            clinic_data = population[clinic]
             for age in clinic_data:
                 age_gender.setdefault(age, {})
                 for gender in clinic_data[age]:
@@ -2748,14 +2838,8 @@ class RefugeeDetail(Resource):
                         female += clinic_data[age][gender]
                     if gender == "male":
                         male += clinic_data[age][gender]
-            result = db.session.query(Data.variables).filter(
-                Data.variables.has_key("ref_14"),
-                Data.clinic == clinic,
-                Data.date >= start_date,
-                Data.date < end_date_limit
-            ).order_by(Data.date.desc()).first()
-            if result:
-                no_clinicians += result[0]["ref_14"]
+            if clinic in clinicians:
+                no_clinicians += clinicians[clinic]["ref_14"]
         tot_pop = male + female
         ret["data"]["total_population"] = tot_pop
         ret["data"]["n_clinicians"] = no_clinicians
@@ -2862,6 +2946,8 @@ class RefugeeCd(Resource):
     """
 
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
         if not current_app.config["TESTING"] and "jor_refugee" not in model.form_tables:
@@ -2982,6 +3068,8 @@ class WeeklyEpiMonitoring(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
         start_date, end_date = fix_dates(start_date, end_date)
@@ -3114,6 +3202,8 @@ class Malaria(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -3285,6 +3375,8 @@ class VaccinationReport(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
         start_date, end_date = fix_dates(start_date, end_date)
@@ -3434,6 +3526,8 @@ class OMSBulletin(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
         # Set default date values to last epi week.
@@ -4043,6 +4137,8 @@ class PlagueReport(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -4113,7 +4209,7 @@ class PlagueReport(Resource):
             else:
                 report_status = "suspected"
 
-            epi_week = epi_week_util.epi_week_for_date(case["date"])[1]
+            epi_week = epi_calendar.epi_week_for_date(case["date"])[1]
             if epi_week == 53:
                 if case["date"].month == 1:
                     epi_week = 1
@@ -4201,6 +4297,8 @@ class EBSReport(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -4288,11 +4386,8 @@ class EBSReport(Resource):
             Data.variables.has_key(str("ebs_case")),
             Data.date >= start_date,
             Data.date < end_date_limit,
-            or_(
-                loc == location for loc in (Data.country,
-                                               Data.region,
-                                               Data.district,
-                                               Data.clinic))).all()
+            location_condition(db.session, location, levels=NO_ZONE_LEVELS)
+        ).all()
 
         ret["data"]["records"] = []
 
@@ -4341,6 +4436,8 @@ class CTCReport(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -4396,10 +4493,21 @@ class CTCReport(Resource):
 
         # Aggregate numbers of cholera cases and deaths as an epi curve and a map.
 
-        cholera_cases = latest_query(db, cholera_cases_variable, cholera_var, start_date, end_date_limit, location, weeks=True, week_offset=1)
-        cholera_cases_u5 = latest_query(db, cholera_cases_u5_variable, cholera_var, start_date, end_date_limit, location, weeks=True, week_offset=1)
-
-        cholera_deaths = latest_query(db, cholera_deaths_variable, cholera_var, start_date, end_date_limit, location, weeks=True, week_offset=1)
+        protocols = ["ctc_case_management", "ctc_ipc", "ctc_wash", "ctc_lab_protocol"]
+        latest = latest_query_many(
+            db,
+            [cholera_cases_variable, cholera_cases_u5_variable,
+             cholera_deaths_variable],
+            cholera_var, start_date, end_date_limit, location,
+            weeks=True, week_offset=1
+        )
+        cholera_cases = latest[cholera_cases_variable]
+        cholera_cases_u5 = latest[cholera_cases_u5_variable]
+        cholera_deaths = latest[cholera_deaths_variable]
+        latest.update(latest_query_many(
+            db, [cholera_var, "ctc_cases_per_bed"] + protocols,
+            cholera_var, start_date, end_date_limit, location, weeks=True
+        ))
         cholera_cases_o5 = {"total": cholera_cases["total"] - cholera_cases_u5["total"]}
         cholera_cases_o5["weeks"] = {week: cholera_cases["weeks"][week] - cholera_cases_u5["weeks"].get(week, 0) for week in cholera_cases["weeks"].keys()}
         ret['summary'].update({
@@ -4417,16 +4525,13 @@ class CTCReport(Resource):
             })
 
 
-        protocols = ["ctc_case_management", "ctc_ipc", "ctc_wash", "ctc_lab_protocol"]
-        total = latest_query(db, cholera_var, cholera_var,
-                             start_date, end_date_limit, location,
-                             weeks=True)["weeks"].get(epi_week -1, 0)
+        total = latest[cholera_var]["weeks"].get(epi_week -1, 0)
         ret["summary"]["surveyed"] = total
 
         if total == 0:
             total = 1
         for p in protocols:
-            r = latest_query(db, p, cholera_var, start_date, end_date_limit, location, weeks=True)
+            r = latest[p]
             value = r["weeks"].get(epi_week - 1, 0) / total
             ret["summary"][p] = value * 100
 
@@ -4434,15 +4539,7 @@ class CTCReport(Resource):
 
         # FIGURE 2: MAP of cholera cases
         cholera_cases_map = {}
-        cholera_cases_ret = latest_query(
-            db,
-            "ctc_cases_per_bed",
-            cholera_var,
-            start_date,
-            end_date_limit,
-            location,
-            weeks=True
-        )["district"]
+        cholera_cases_ret = latest["ctc_cases_per_bed"]["district"]
         for district in cholera_cases_ret.keys():
             cholera_cases_map[locs[district].name] = {
                 "value": cholera_cases_ret[district]["total"]
@@ -4505,10 +4602,8 @@ class CTCReport(Resource):
 
         clinic_data_list = []
 
-        location_condition = [
-                or_(loc == location for loc in (
-                    Data.country, Data.zone, Data.region, Data.district, Data.clinic))]
-        conditions = location_condition  + [Data.variables.has_key(cholera_var)]
+        conditions = [location_condition(db.session, location)]
+        conditions = conditions  + [Data.variables.has_key(cholera_var)]
         query = db.session.query(Data.clinic, Data.date, Data.region,
                                  Data.district,
                                  Data.variables,
@@ -4645,6 +4740,8 @@ class SCReport(Resource):
        report_data\n
     """
     decorators = [authenticate, report_allowed_location]
+    method_decorators = [admission_control, coalesce_requests]
+    cost_class = "heavy"
 
     def get(self, location, start_date=None, end_date=None):
 
@@ -4700,17 +4797,20 @@ class SCReport(Resource):
 
         # Aggregate numbers of nutrition cases and deaths as an epi curve and a map.
 
-        nutrition_cases = latest_query(db, nutrition_cases_variable,
-                                       nutrition_var, start_date,
-                                       end_date_limit, location,
-                                       weeks=True, week_offset=1)
-        nutrition_cases_u5 = latest_query(db, nutrition_cases_u5_variable,
-                                          nutrition_var, start_date, end_date_limit,
-                                          location, weeks=True, week_offset=1)
-
-        nutrition_deaths = latest_query(db, nutrition_deaths_variable,
-                                        nutrition_var, start_date, end_date_limit,
-                                        location, weeks=True, week_offset=1)
+        latest = latest_query_many(
+            db,
+            [nutrition_cases_variable, nutrition_cases_u5_variable,
+             nutrition_deaths_variable],
+            nutrition_var, start_date, end_date_limit, location,
+            weeks=True, week_offset=1
+        )
+        nutrition_cases = latest[nutrition_cases_variable]
+        nutrition_cases_u5 = latest[nutrition_cases_u5_variable]
+        nutrition_deaths = latest[nutrition_deaths_variable]
+        latest.update(latest_query_many(
+            db, [nutrition_var, "sc_cases_per_bed"],
+            nutrition_var, start_date, end_date_limit, location, weeks=True
+        ))
 
         nutrition_cases_o5 = {
             "total": nutrition_cases["total"] - nutrition_cases_u5["total"]
@@ -4731,22 +4831,12 @@ class SCReport(Resource):
             'nutrition_deaths': nutrition_deaths
             })
 
-        total = latest_query(db, nutrition_var, nutrition_var,
-                             start_date, end_date_limit, location,
-                             weeks=True)["weeks"].get(epi_week - 1, 0)
+        total = latest[nutrition_var]["weeks"].get(epi_week - 1, 0)
         ret["summary"]["surveyed"] = total
 
         # FIGURE 2: MAP of nutrition cases
         nutrition_cases_map = {}
-        nutrition_cases_ret = latest_query(
-            db,
-            "sc_cases_per_bed",
-            nutrition_var,
-            start_date,
-            end_date_limit,
-            location,
-            weeks=True
-        )["district"]
+        nutrition_cases_ret = latest["sc_cases_per_bed"]["district"]
         for district in nutrition_cases_ret.keys():
             nutrition_cases_map[locs[district].name] = {
                 "value": nutrition_cases_ret[district]["total"]
@@ -4791,10 +4881,8 @@ class SCReport(Resource):
 
         clinic_data_list = []
 
-        location_condition = [
-                or_(loc == location for loc in (
-                    Data.country, Data.zone, Data.region, Data.district, Data.clinic))]
-        conditions = location_condition + [Data.variables.has_key(nutrition_var)]
+        conditions = [location_condition(db.session, location)]
+        conditions = conditions + [Data.variables.has_key(nutrition_var)]
         query = db.session.query(Data.clinic, Data.date, Data.region,
                                  Data.district,
                                  Data.variables,
@@ -4940,74 +5028,3 @@ class SCReport(Resource):
         ret["contents_offset"] = ret["contents_offset"] + math.ceil( noOfContentPages )
 
         return ret
-
-
-api.add_resource(PublicHealth, "/reports/public_health/<location>",
-                 "/reports/public_health/<location>/<end_date>",
-                 "/reports/public_health/<location>/<end_date>/<start_date>")
-api.add_resource(NcdReport, "/reports/ncd_report/<location>",
-                 "/reports/ncd_report/<location>/<end_date>",
-                 "/reports/ncd_report/<location>/<end_date>/<start_date>")
-api.add_resource(NcdReportNewVisits, "/reports/ncd_report_new_visits/<location>",
-                 "/reports/ncd_report_new_visits/<location>/<end_date>",
-                 "/reports/ncd_report_new_visits/<location>/<end_date>/<start_date>")
-api.add_resource(NcdReportReturnVisits, "/reports/ncd_report_return_visits/<location>",
-                 "/reports/ncd_report_return_visits/<location>/<end_date>",
-                 "/reports/ncd_report_return_visits/<location>/<end_date>/<start_date>")
-api.add_resource(CdPublicHealth, "/reports/cd_public_health/<location>",
-                 "/reports/cd_public_health/<location>/<end_date>",
-                 "/reports/cd_public_health/<location>/<end_date>/<start_date>")
-api.add_resource(CdPublicHealthMad, "/reports/cd_public_health_mad/<location>",
-                 "/reports/cd_public_health_mad/<location>/<end_date>",
-                 "/reports/cd_public_health_mad/<location>/<end_date>/<start_date>")
-api.add_resource(CdPublicHealthSom, "/reports/cd_public_health_som/<location>",
-                 "/reports/cd_public_health_som/<location>/<end_date>",
-                 "/reports/cd_public_health_som/<location>/<end_date>/<start_date>")
-api.add_resource(NcdPublicHealth, "/reports/ncd_public_health/<location>",
-                 "/reports/ncd_public_health/<location>/<end_date>",
-                 "/reports/ncd_public_health/<location>/<end_date>/<start_date>")
-api.add_resource(RefugeePublicHealth, "/reports/refugee_public_health/<location>",
-                 "/reports/refugee_public_health/<location>/<end_date>",
-                 "/reports/refugee_public_health/<location>/<end_date>/<start_date>")
-api.add_resource(RefugeeCd, "/reports/refugee_cd/<location>",
-                 "/reports/refugee_cd/<location>/<end_date>",
-                 "/reports/refugee_cd/<location>/<end_date>/<start_date>")
-api.add_resource(RefugeeDetail, "/reports/refugee_detail/<location>",
-                 "/reports/refugee_detail/<location>/<end_date>",
-                 "/reports/refugee_detail/<location>/<end_date>/<start_date>")
-api.add_resource(CdReport, "/reports/cd_report/<location>",
-                 "/reports/cd_report/<location>/<end_date>",
-                 "/reports/cd_report/<location>/<end_date>/<start_date>")
-api.add_resource(ForeignerScreening, "/reports/foreigner_screening/<location>",
-                 "/reports/foreigner_screening/<location>/<end_date>",
-                 "/reports/foreigner_screening/<location>/<end_date>/<start_date>")
-api.add_resource(Pip, "/reports/pip/<location>",
-                 "/reports/pip/<location>/<end_date>",
-                 "/reports/pip/<location>/<end_date>/<start_date>")
-api.add_resource(WeeklyEpiMonitoring, "/reports/epi_monitoring/<location>",
-                 "/reports/epi_monitoring/<location>/<end_date>",
-                 "/reports/epi_monitoring/<location>/<end_date>/<start_date>")
-api.add_resource(Malaria, "/reports/malaria/<location>",
-                 "/reports/malaria/<location>/<end_date>",
-                 "/reports/malaria/<location>/<end_date>/<start_date>")
-api.add_resource(VaccinationReport, "/reports/vaccination/<location>",
-                 "/reports/vaccination/<location>/<end_date>",
-                 "/reports/vaccination/<location>/<end_date>/<start_date>")
-api.add_resource(OMSBulletin, "/reports/oms/<location>",
-                 "/reports/oms/<location>/<end_date>",
-                 "/reports/oms/<location>/<end_date>/<start_date>")
-api.add_resource(MhReport, "/reports/mh_report/<location>",
-                 "/reports/mh_report/<location>/<end_date>",
-                 "/reports/mh_report/<location>/<end_date>/<start_date>")
-api.add_resource(PlagueReport, "/reports/plague/<location>",
-                 "/reports/plague/<location>/<end_date>",
-                 "/reports/plague/<location>/<end_date>/<start_date>")
-api.add_resource(EBSReport, "/reports/ebs/<location>",
-                 "/reports/ebs/<location>/<end_date>",
-                 "/reports/ebs/<location>/<end_date>/<start_date>")
-api.add_resource(CTCReport, "/reports/ctc/<location>",
-                 "/reports/ctc/<location>/<end_date>",
-                 "/reports/ctc/<location>/<end_date>/<start_date>")
-api.add_resource(SCReport, "/reports/sc/<location>",
-                 "/reports/sc/<location>/<end_date>",
-                 "/reports/sc/<location>/<end_date>/<start_date>")
@@ -2,13 +2,60 @@
 Variables resource for querying variable data
 """
 from flask_restful import Resource
-from sqlalchemy import or_
 from flask import request
-from meerkat_api.util import row_to_dict, rows_to_dicts
-from meerkat_api.extensions import db, api
+from meerkat_api.util import row_to_dict, table_version
+from meerkat_api.extensions import db
 from meerkat_abacus import model
 from meerkat_api.resources import locations
 
+# All variables indexed by id, category and alert flag
+variable_catalog = {"version": None}
+
+
+def get_variable_catalog():
+    """
+    Returns the variable catalog, reloading it if the variables have changed.
+
+    The version of the variables is the number of rows and the newest
+    transaction id (xmin) in the variables table, so any insert, update or
+    delete gives a new version. The version is checked at most once per
+    request.
+
+    Returns:
+       catalog(dict): {"by_id": {id: variable}, "by_category": {category: [ids]},
+                       "alert": [ids], "version": version}
+    """
+    version = table_version(db.session, model.AggregationVariables)
+    if version != variable_catalog["version"]:
+        by_id = {}
+        by_category = {}
+        alert = []
+        for row in db.session.query(model.AggregationVariables).all():
+            variable = row_to_dict(row)
+            by_id[row.id] = variable
+            for category in row.category or []:
+                by_category.setdefault(category, []).append(row.id)
+            if row.alert == 1:
+                alert.append(row.id)
+        variable_catalog.update({"version": version,
+                                 "by_id": by_id,
+                                 "by_category": by_category,
+                                 "alert": alert})
+    return variable_catalog
+
+
+def catalog_variables(variable_ids):
+    """
+    Returns copies of the variables in variable_ids from the catalog
+
+    Args:
+       variable_ids: list of variable ids
+    Returns:
+       variables(dict): {id: variable}
+    """
+    by_id = get_variable_catalog()["by_id"]
+    return {v: dict(by_id[v]) for v in variable_ids}
+
 
 class Variables(Resource):
     """
@@ -23,20 +70,20 @@ class Variables(Resource):
         if category == "locations" or "locations:" in category:
             l = locations.Locations()
             return l.get()
-        elif category == "alert":
+        catalog = get_variable_catalog()
+        if category == "alert":
             if "include_group_b" in request.args:
-                results = db.session.query(model.AggregationVariables).filter(
-                    or_(model.AggregationVariables.alert == 1,
-                         model.AggregationVariables.alert_desc == "Group B"))
+                variable_ids = [
+                    v for v, variable in catalog["by_id"].items()
+                    if variable["alert"] == 1 or variable["alert_desc"] == "Group B"
+                ]
             else:
-                results = db.session.query(model.AggregationVariables).filter(
-                    model.AggregationVariables.alert == 1)
+                variable_ids = catalog["alert"]
         elif category != "all":
-            results = db.session.query(model.AggregationVariables).filter(
-                model.AggregationVariables.category.has_key(category))
+            variable_ids = catalog["by_category"].get(category, [])
         else:
-            results = db.session.query(model.AggregationVariables)
-        return rows_to_dicts(results.all(), dict_id="id")
+            variable_ids = catalog["by_id"].keys()
+        return catalog_variables(variable_ids)
 
     
 class Variable(Resource):
@@ -48,7 +95,7 @@ class Variable(Resource):
     """
 
     def get(self, variable_id):
-        return row_to_dict(db.session.query(model.AggregationVariables).filter(
-            model.AggregationVariables.id == variable_id).first())
-api.add_resource(Variables, "/variables/<category>")
-api.add_resource(Variable, "/variable/<variable_id>")
+        variable = get_variable_catalog()["by_id"].get(variable_id)
+        if variable is None:
+            return {}
+        return dict(variable)
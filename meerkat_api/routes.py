@@ -0,0 +1,349 @@
+"""
+URL routes of the API
+
+All the routes are declared here with placeholder resources. The module of
+a resource is only imported the first time one of its urls is requested,
+so a worker starts without importing the resource modules and their heavy
+dependencies (pandas, the report code etc). Set PRELOAD_RESOURCES to import
+them all when the app is created instead, e.g. before forking workers.
+"""
+from importlib import import_module
+
+from flask_restful import Resource
+
+from meerkat_api.extensions import api
+
+lazy_resources = []
+resource_views = {}
+
+
+def resource_view(module_name, class_name):
+    """
+    Returns the view of the resource class, importing its module on first use
+
+    Args:
+        module_name: name of the module in meerkat_api.resources
+        class_name: name of the resource class
+    Returns:
+        view(function): the resource's view function
+    """
+    key = (module_name, class_name)
+    if key not in resource_views:
+        module = import_module("meerkat_api.resources." + module_name)
+        resource_views[key] = getattr(module, class_name).as_view(
+            class_name.lower()
+        )
+    return resource_views[key]
+
+
+def lazy_resource(module_name, class_name, methods=("GET",)):
+    """
+    Returns a placeholder for a resource class that dispatches the requests
+    to the real resource. The placeholder has the same name as the resource
+    so the endpoint names are unchanged.
+
+    Args:
+        module_name: name of the module in meerkat_api.resources
+        class_name: name of the resource class
+        methods: the HTTP methods of the resource
+    """
+    def dispatch_request(self, *args, **kwargs):
+        return resource_view(module_name, class_name)(*args, **kwargs)
+
+    lazy_resources.append((module_name, class_name))
+    return type(class_name, (Resource,), {
+        "methods": set(methods),
+        "dispatch_request": dispatch_request
+    })
+
+
+def preload_resources():
+    """
+    Imports all the resource modules
+    """
+    for module_name, class_name in lazy_resources:
+        resource_view(module_name, class_name)
+
+
+# alerts
+api.add_resource(lazy_resource("alerts", "AggregateAlerts"),
+                 "/aggregate_alerts",
+                 "/aggregate_alerts/<central_review>",
+                 "/aggregate_alerts/<central_review>/<hard_date_limit>")
+api.add_resource(lazy_resource("alerts", "Alert"),
+                 "/alert/<alert_id>")
+api.add_resource(lazy_resource("alerts", "Alerts"),
+                 "/alerts")
+
+# locations
+api.add_resource(lazy_resource("locations", "Locations"),
+                 "/locations")
+api.add_resource(lazy_resource("locations", "LocationTree"),
+                 "/locationtree")
+api.add_resource(lazy_resource("locations", "Location"),
+                 "/location/<location_id>")
+# endpoint "/device/<device_id>" is deprecated use /locations?deviceId=<device_id> instead
+api.add_resource(lazy_resource("locations", "LocationByDeviceId"),
+                 "/device/<device_id>")
+api.add_resource(lazy_resource("locations", "TotClinics"),
+                 "/tot_clinics/<location_id>")
+
+# frontpage
+api.add_resource(lazy_resource("frontpage", "KeyIndicators"),
+                 "/key_indicators",
+                 "/key_indicators/<int:location>")
+api.add_resource(lazy_resource("frontpage", "TotMap"),
+                 "/tot_map",
+                 "/tot_map/<int:location>")
+api.add_resource(lazy_resource("frontpage", "ConsultationMap"),
+                 "/consultation_map",
+                 "/consultation_map/<int:location>")
+api.add_resource(lazy_resource("frontpage", "NumAlerts"),
+                 "/num_alerts",
+                 "/num_alerts/<int:location>")
+api.add_resource(lazy_resource("frontpage", "NumClinics"),
+                 "/num_clinics",
+                 "/num_clinics/<int:location>")
+api.add_resource(lazy_resource("frontpage", "RefugeePage"),
+                 "/refugee_page")
+
+# data
+api.add_resource(lazy_resource("data", "Aggregate"),
+                 "/aggregate/<variable_id>/<location_id>")
+api.add_resource(lazy_resource("data", "AggregateBulk", methods=("POST",)),
+                 "/aggregate_bulk")
+api.add_resource(lazy_resource("data", "AggregateLatest"),
+                 "/aggregate_latest/<variable_id>/<identifier_id>/<location_id>")
+api.add_resource(lazy_resource("data", "AggregateYear"),
+                 "/aggregate_year/<variable_id>/<location_id>",
+                 "/aggregate_year/<variable_id>/<location_id>/<year>")
+api.add_resource(lazy_resource("data", "AggregateLatestYear"),
+                 "/aggregate_latest_year/<variable_id>/<identifier_id>/<location_id>",
+                 "/aggregate_latest_year/<variable_id>/<identifier_id>/<location_id>/<weeks>",
+                 "/aggregate_latest_year/<variable_id>/<identifier_id>/<location_id>/<weeks>/<year>")
+api.add_resource(lazy_resource("data", "AggregateLatestLevel"),
+                 "/aggregate_latest_level/<variable_id>/<identifier_id>/<level>",
+                 "/aggregate_latest_level/<variable_id>/<identifier_id>/<level>/<weekly>",
+                 "/aggregate_latest_level/<variable_id>/<identifier_id>/<level>/<weekly>/<location_id>")
+api.add_resource(lazy_resource("data", "AggregateLatestCategory"),
+                 "/aggregate_latest_category/<category>/<identifier_id>/<location_id>",
+                 "/aggregate_latest_category/<category>/<identifier_id>/<location_id>/<weeks>",
+                 "/aggregate_latest_category/<category>/<identifier_id>/<location_id>/<weeks>/<year>")
+api.add_resource(lazy_resource("data", "AggregateCategory"),
+                 "/aggregate_category/<category>/<location_id>",
+                 "/aggregate_category/<category>/<location_id>/<year>",
+                 "/aggregate_category/<category>/<location_id>/<year>/<lim_variables>")
+api.add_resource(lazy_resource("data", "AggregateCategorySum"),
+                 "/aggregate_category_sum/<category>/<location_id>",
+                 "/aggregate_category_sum/<category>/<location_id>/<year>",
+                 "/aggregate_category_sum/<category>/<location_id>/<year>/<lim_variables>")
+api.add_resource(lazy_resource("data", "Records"),
+                 "/records/<variable>/<location_id>")
+api.add_resource(lazy_resource("data", "LatestData"),
+                 "/latest/<location_id>")
+
+# export_data
+api.add_resource(lazy_resource("export_data", "GetCSVDownload"),
+                 "/export/getcsv/<uid>")
+api.add_resource(lazy_resource("export_data", "GetXLSDownload"),
+                 "/export/getxls/<uid>")
+api.add_resource(lazy_resource("export_data", "GetParquetDownload"),
+                 "/export/getparquet/<uid>")
+api.add_resource(lazy_resource("export_data", "GetArrowDownload"),
+                 "/export/getarrow/<uid>")
+api.add_resource(lazy_resource("export_data", "GetStatus"),
+                 "/export/get_status/<uid>")
+api.add_resource(lazy_resource("export_data", "ExportData"),
+                 "/export/data",
+                 "/export/data/<use_loc_ids>")
+api.add_resource(lazy_resource("export_data", "ExportForm"),
+                 "/export/form/<form>")
+api.add_resource(lazy_resource("export_data", "Forms"),
+                 "/export/forms")
+api.add_resource(lazy_resource("export_data", "ExportCategory"),
+                 "/export/category/<form_name>/<category>/<download_name>",
+                 "/export/category/<form_name>/<category>/<download_name>/<data_type>")
+api.add_resource(lazy_resource("export_data", "ExportDataTable"),
+                 "/export/data_table/<download_name>/<restrict_by>")
+api.add_resource(lazy_resource("export_data", "ExportWeekLevel"),
+                 "/export/week_level/<download_name>/<level>")
+
+# prescriptions
+api.add_resource(lazy_resource("prescriptions", "Prescriptions"),
+                 "/prescriptions/<location>",
+                 "/prescriptions/<location>/<end_date>",
+                 "/prescriptions/<location>/<end_date>/<start_date>")
+
+# explore
+api.add_resource(lazy_resource("explore", "QueryVariable"),
+                 "/query_variable/<variable>/<group_by>",
+                 "/query_variable/<variable>/<group_by>/<start_date>/<end_date>")
+api.add_resource(lazy_resource("explore", "QueryCategory"),
+                 "/query_category/<group_by1>/<group_by2>",
+                 "/query_category/<group_by1>/<group_by2>/<only_loc>",
+                 "/query_category/<group_by1>/<group_by2>/<start_date>/<end_date>",
+                 "/query_category/<group_by1>/<group_by2>/<start_date>/<end_date>/<only_loc>")
+
+# variables
+api.add_resource(lazy_resource("variables", "Variables"),
+                 "/variables/<category>")
+api.add_resource(lazy_resource("variables", "Variable"),
+                 "/variable/<variable_id>")
+
+# reports
+api.add_resource(lazy_resource("reports", "PublicHealth"),
+                 "/reports/public_health/<location>",
+                 "/reports/public_health/<location>/<end_date>",
+                 "/reports/public_health/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "NcdReport"),
+                 "/reports/ncd_report/<location>",
+                 "/reports/ncd_report/<location>/<end_date>",
+                 "/reports/ncd_report/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "NcdReportNewVisits"),
+                 "/reports/ncd_report_new_visits/<location>",
+                 "/reports/ncd_report_new_visits/<location>/<end_date>",
+                 "/reports/ncd_report_new_visits/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "NcdReportReturnVisits"),
+                 "/reports/ncd_report_return_visits/<location>",
+                 "/reports/ncd_report_return_visits/<location>/<end_date>",
+                 "/reports/ncd_report_return_visits/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "CdPublicHealth"),
+                 "/reports/cd_public_health/<location>",
+                 "/reports/cd_public_health/<location>/<end_date>",
+                 "/reports/cd_public_health/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "CdPublicHealthMad"),
+                 "/reports/cd_public_health_mad/<location>",
+                 "/reports/cd_public_health_mad/<location>/<end_date>",
+                 "/reports/cd_public_health_mad/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "CdPublicHealthSom"),
+                 "/reports/cd_public_health_som/<location>",
+                 "/reports/cd_public_health_som/<location>/<end_date>",
+                 "/reports/cd_public_health_som/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "NcdPublicHealth"),
+                 "/reports/ncd_public_health/<location>",
+                 "/reports/ncd_public_health/<location>/<end_date>",
+                 "/reports/ncd_public_health/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "RefugeePublicHealth"),
+                 "/reports/refugee_public_health/<location>",
+                 "/reports/refugee_public_health/<location>/<end_date>",
+                 "/reports/refugee_public_health/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "RefugeeCd"),
+                 "/reports/refugee_cd/<location>",
+                 "/reports/refugee_cd/<location>/<end_date>",
+                 "/reports/refugee_cd/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "RefugeeDetail"),
+                 "/reports/refugee_detail/<location>",
+                 "/reports/refugee_detail/<location>/<end_date>",
+                 "/reports/refugee_detail/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "CdReport"),
+                 "/reports/cd_report/<location>",
+                 "/reports/cd_report/<location>/<end_date>",
+                 "/reports/cd_report/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "ForeignerScreening"),
+                 "/reports/foreigner_screening/<location>",
+                 "/reports/foreigner_screening/<location>/<end_date>",
+                 "/reports/foreigner_screening/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "Pip"),
+                 "/reports/pip/<location>",
+                 "/reports/pip/<location>/<end_date>",
+                 "/reports/pip/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "WeeklyEpiMonitoring"),
+                 "/reports/epi_monitoring/<location>",
+                 "/reports/epi_monitoring/<location>/<end_date>",
+                 "/reports/epi_monitoring/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "Malaria"),
+                 "/reports/malaria/<location>",
+                 "/reports/malaria/<location>/<end_date>",
+                 "/reports/malaria/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "VaccinationReport"),
+                 "/reports/vaccination/<location>",
+                 "/reports/vaccination/<location>/<end_date>",
+                 "/reports/vaccination/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "OMSBulletin"),
+                 "/reports/oms/<location>",
+                 "/reports/oms/<location>/<end_date>",
+                 "/reports/oms/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "MhReport"),
+                 "/reports/mh_report/<location>",
+                 "/reports/mh_report/<location>/<end_date>",
+                 "/reports/mh_report/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "PlagueReport"),
+                 "/reports/plague/<location>",
+                 "/reports/plague/<location>/<end_date>",
+                 "/reports/plague/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "EBSReport"),
+                 "/reports/ebs/<location>",
+                 "/reports/ebs/<location>/<end_date>",
+                 "/reports/ebs/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "CTCReport"),
+                 "/reports/ctc/<location>",
+                 "/reports/ctc/<location>/<end_date>",
+                 "/reports/ctc/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("reports", "SCReport"),
+                 "/reports/sc/<location>",
+                 "/reports/sc/<location>/<end_date>",
+                 "/reports/sc/<location>/<end_date>/<start_date>")
+
+# map
+api.add_resource(lazy_resource("map", "Clinics"),
+                 "/clinics/<location_id>",
+                 "/clinics/<location_id>/<clinic_type>",
+                 "/clinics/<location_id>/<clinic_type>/<require_case_report>")
+api.add_resource(lazy_resource("map", "Shapes"),
+                 "/geo_shapes/<level>")
+api.add_resource(lazy_resource("map", "MapVariable"),
+                 "/map/<variable_id>",
+                 "/map/<variable_id>/<location>",
+                 "/map/<variable_id>/<location>/<end_date>",
+                 "/map/<variable_id>/<location>/<end_date>/<start_date>")
+api.add_resource(lazy_resource("map", "MapCategory"),
+                 "/map_category/<category>",
+                 "/map_category/<category>/<location>")
+api.add_resource(lazy_resource("map", "IncidenceMap"),
+                 "/incidence_map/<variable_id>")
+
+# incidence
+api.add_resource(lazy_resource("incidence", "IncidenceRate"),
+                 "/incidence_rate/<variable_id>/<level>",
+                 "/incidence_rate/<variable_id>/<level>/<mult_factor>",
+                 "/incidence_rate/<variable_id>/<level>/<mult_factor>/<year>",
+                 "/incidence_rate/<variable_id>/<level>/<mult_factor>/<year>/<monthly>")
+api.add_resource(lazy_resource("incidence", "WeeklyIncidenceRate"),
+                 "/weekly_incidence/<variable_id>/<loc_id>",
+                 "/weekly_incidence/<variable_id>/<loc_id>/<year>",
+                 "/weekly_incidence/<variable_id>/<loc_id>/<year>/<mult_factor>")
+
+# indicators
+api.add_resource(lazy_resource("indicators", "Indicators"),
+                 "/indicators/<flags>/<variables>/<location>",
+                 "/indicators/<flags>/<variables>/<location>/<start_date>/<end_date>")
+
+# devices
+api.add_resource(lazy_resource("devices", "Devices"),
+                 "/devices")
+api.add_resource(lazy_resource("devices", "DeviceSubmissions"),
+                 "/device/<device_id>/submissions/<variable_id>")
+api.add_resource(lazy_resource("devices", "DeviceSubmissionsForLocation"),
+                 "/devices/submissions/<variable_id>")
+
+# completeness
+api.add_resource(lazy_resource("completeness", "NonReporting"),
+                 "/non_reporting/<variable>/<location>",
+                 "/non_reporting/<variable>/<location>/<num_weeks>/<exclude_case_type>",
+                 "/non_reporting/<variable>/<location>/<num_weeks>/<exclude_case_type>/<include_case_type>",
+                 "/non_reporting/<variable>/<location>/<num_weeks>/<exclude_case_type>/<include_case_type>/<include_clinic_type>/<require_case_report>")
+api.add_resource(lazy_resource("completeness", "Completeness"),
+                 "/completeness/<variable>/<location>/<number_per_week>",
+                 "/completeness/<variable>/<location>/<number_per_week>/<start_week>",
+                 "/completeness/<variable>/<location>/<number_per_week>/<start_week>/<weekend>",
+                 "/completeness/<variable>/<location>/<number_per_week>/<start_week>/<weekend>/<non_reporting_variable>",
+                 "/completeness/<variable>/<location>/<number_per_week>/<start_week>/<weekend>/<non_reporting_variable>/<end_date>")
+
+# epi_week
+api.add_resource(lazy_resource("epi_week", "EpiWeek"),
+                 "/epi_week",
+                 "/epi_week/<date>")
+api.add_resource(lazy_resource("epi_week", "EpiWeekStart"),
+                 "/epi_week_start/<year>/<epi_week>")
+api.add_resource(lazy_resource("epi_week", "EpiWeeks"),
+                 "/epi_weeks")
@@ -16,6 +16,7 @@ from datetime import datetime
 import meerkat_api
 from meerkat_api.extensions import celery_app
 from meerkat_api.test import db_util
+from api_background import epi_calendar
 
 # Check if auth requirements have been installed
 try:
@@ -113,7 +114,8 @@ def valid_urls(app):
         "only_latest": "1"
     }
     excluded_urls = [
-        '/devices/submissions/<variable_id>'
+        '/devices/submissions/<variable_id>',
+        '/aggregate_bulk'
     ]
     urls = []
     for url in meerkat_api.app.url_map.iter_rules():
@@ -182,6 +184,9 @@ class TestCase(unittest.TestCase):
         self.addCleanup(epi_year_by_year_patch.stop)
         self.epi_year_by_year_mock = epi_year_by_year_patch.start()
         self.epi_year_by_year_mock.side_effect = _epi_year_by_date_side_effect
+        # The epi calendar is built with the mocked epi weeks
+        epi_calendar.clear_epi_calendar()
+        self.addCleanup(epi_calendar.clear_epi_calendar)
 
 
 class MeerkatAPITestCase(TestCase):
@@ -0,0 +1,98 @@
+"""
+Unittests for meerkat_api.coalescing
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import meerkat_api
+from meerkat_api import coalescing
+from meerkat_api.coalescing import SingleFlight, FileLockFlight, share, unshare
+
+
+class CoalescingTests(unittest.TestCase):
+
+    def _run_concurrently(self, flight, key="key", n=5):
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"value": len(calls)}
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do(key, compute)))
+                   for i in range(n)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return calls, results
+
+    def test_single_flight(self):
+        """Test that concurrent identical calls are computed once"""
+        calls, results = self._run_concurrently(SingleFlight())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"value": 1}] * 5)
+
+        calls, results = self._run_concurrently(SingleFlight(), n=1)
+        self.assertEqual(len(calls), 1)
+
+    def test_single_flight_error(self):
+        """Test that errors are raised for all waiting calls"""
+        flight = SingleFlight()
+        errors = []
+
+        def compute():
+            time.sleep(0.2)
+            raise ValueError("failed")
+
+        def call():
+            try:
+                flight.do("key", compute)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(flight.calls, {})
+
+    def test_file_lock_flight(self):
+        """Test that waiting calls share the result through the lock dir"""
+        with tempfile.TemporaryDirectory() as directory:
+            calls, results = self._run_concurrently(FileLockFlight(directory))
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(results, [{"value": 1}] * 5)
+
+    def test_file_lock_sweep(self):
+        """Test that old result files and idle lock files are removed"""
+        with tempfile.TemporaryDirectory() as directory:
+            old = time.time() - coalescing.LOCK_MAX_AGE - 1
+            for name in ["old.lock", "old.result", "new.lock", "new.result"]:
+                open(os.path.join(directory, name), "w").close()
+            for name in ["old.lock", "old.result"]:
+                os.utime(os.path.join(directory, name), (old, old))
+            FileLockFlight.swept.pop(directory, None)
+            FileLockFlight(directory).sweep()
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ["new.lock", "new.result"])
+
+    def test_shared_response(self):
+        """Test that every request gets its own copy of a shared response"""
+        with meerkat_api.app.app_context():
+            response = meerkat_api.app.response_class(
+                b'{"value": 1}', mimetype="application/json")
+            shared = share(response)
+            first = unshare(shared, None)
+            second = unshare(shared, None)
+            self.assertIsNot(first, second)
+            first.headers["Content-Encoding"] = "gzip"
+            self.assertNotIn("Content-Encoding", second.headers)
+            self.assertEqual(second.get_data(), b'{"value": 1}')
+            self.assertEqual(second.mimetype, "application/json")
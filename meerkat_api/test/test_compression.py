@@ -0,0 +1,68 @@
+"""
+Unittests for meerkat_api.compression
+"""
+import gzip
+import json
+from unittest.mock import patch
+
+import meerkat_api
+from meerkat_api.test import db_util
+from . import settings
+
+
+class CompressionTestCase(meerkat_api.test.TestCase):
+
+    def setUp(self):
+        db_util.insert_codes(self.db_session)
+        db_util.insert_locations(self.db_session)
+        config = patch.dict(meerkat_api.app.config, {"COMPRESSION_MIN_SIZE": 100})
+        config.start()
+        self.addCleanup(config.stop)
+
+    def test_gzip(self):
+        """Responses are compressed for clients accepting gzip"""
+        rv = self.app.get('/locationtree', headers=settings.header)
+        self.assertNotIn("Content-Encoding", rv.headers)
+        self.assertIn("Accept-Encoding", rv.headers["Vary"])
+        expected = json.loads(rv.data.decode("utf-8"))
+
+        rv = self.app.get('/locationtree', headers={
+            **settings.header, "Accept-Encoding": "gzip, br;q=0"})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.headers["Content-Encoding"], "gzip")
+        self.assertEqual(int(rv.headers["Content-Length"]), len(rv.data))
+        self.assertEqual(json.loads(gzip.decompress(rv.data).decode("utf-8")),
+                         expected)
+
+    def test_cached_compression(self):
+        """Cacheable responses are only compressed once"""
+        cache = meerkat_api.app.extensions["compression_cache"]
+        headers = {**settings.header, "Accept-Encoding": "gzip, br;q=0"}
+        first = self.app.get('/locationtree', headers=headers)
+        with patch("meerkat_api.compression._compress") as compress:
+            second = self.app.get('/locationtree', headers=headers)
+            compress.assert_not_called()
+        self.assertEqual(first.data, second.data)
+        self.assertGreater(cache.size, 0)
+
+    def test_compression_level(self):
+        """Only the static resources are compressed at the highest level"""
+        headers = {**settings.header, "Accept-Encoding": "gzip, br;q=0"}
+        config = {"COMPRESSION_CACHE_PATHS": [],
+                  "COMPRESSION_STATIC_PATHS": ["/locationtree"]}
+        with patch.dict(meerkat_api.app.config, config), \
+                patch("meerkat_api.compression._compress",
+                      side_effect=lambda body, *args: gzip.compress(body)
+                      ) as compress:
+            self.app.get('/locationtree', headers=headers)
+            self.assertTrue(compress.call_args[0][2])
+            self.app.get('/locations', headers=headers)
+            self.assertFalse(compress.call_args[0][2])
+
+    def test_small_response(self):
+        """Responses below the size threshold are not compressed"""
+        rv = self.app.get('/epi_week/2015-01-05', headers={
+            **settings.header, "Accept-Encoding": "gzip"})
+        self.assertEqual(rv.status_code, 200)
+        self.assertNotIn("Content-Encoding", rv.headers)
+        self.assertEqual(json.loads(rv.data.decode("utf-8"))["year"], 2015)
@@ -198,3 +198,37 @@ class DataQueryTests(meerkat_api.test.TestCase):
         self.assertEqual(result["clinic"][8]["weeks"][2], 0)
         self.assertEqual(result["district"][4]["total"], 12)
         self.assertEqual(result["region"][2]["total"], 12)
+
+    def test_latest_query_many(self):
+        """ Test that latest_query_many matches latest_query"""
+        db_util.insert_cases(self.db_session, "latest_test")
+        start_date = datetime(2017, 1, 1)
+        end_date = datetime(2017, 1, 12)
+        for weeks in [False, True]:
+            result = data_query.latest_query_many(
+                self.db, ["test_2", "data_entry"], "test_1", start_date,
+                end_date, 1, weeks=weeks)
+            for var_id in ["test_2", "data_entry"]:
+                self.assertEqual(
+                    result[var_id],
+                    data_query.latest_query(self.db, var_id, "test_1",
+                                            start_date, end_date, 1,
+                                            weeks=weeks)
+                )
+        self.assertEqual(result["data_entry"]["total"], 3)
+
+    def test_location_condition(self):
+        """ Test that only the level column of the location is compared"""
+        condition = data_query.location_condition(self.db_session, 4)
+        self.assertEqual(
+            str(condition.compile(compile_kwargs={"literal_binds": True})),
+            "data.district = 4"
+        )
+        condition = data_query.location_condition(self.db_session, 1,
+                                                  levels=("clinic",))
+        self.assertEqual(
+            str(condition.compile(compile_kwargs={"literal_binds": True})),
+            "data.clinic = 1"
+        )
+        condition = data_query.location_condition(self.db_session, 1000)
+        self.assertIn(" OR ", str(condition))
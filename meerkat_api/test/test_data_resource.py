@@ -4,7 +4,14 @@ Meerkat API Tests
 
 Unit tests for the data resource in Meerkat API
 """
+import base64
 import json
+from unittest.mock import patch
+
+import msgpack
+import numpy as np
+import pyarrow.ipc
+
 from . import settings
 import meerkat_api
 from meerkat_api.test import db_util
@@ -77,6 +84,78 @@ class MeerkatAPIDataTestCase(meerkat_api.test.TestCase):
         self.assertEqual(data["weeks"]["18"], 3)
         self.assertEqual(data["weeks"]["22"], 1)
 
+    def test_aggregate_yearly_columnar(self):
+        """Test the columnar format of aggregate Yearly"""
+        rv = self.app.get('/aggregate_year/gen_2/1/2015?level=region',
+                          headers=settings.header)
+        expected = json.loads(rv.data.decode("utf-8"))
+        rv = self.app.get('/aggregate_year/gen_2/1/2015?level=region&format=columnar',
+                          headers=settings.header)
+        self.assertEqual(rv.status_code, 200)
+        data = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(data["format"], "columnar")
+        weeks = [str(w) for w in data["weeks"]]
+        self.assertEqual(weeks, sorted(expected["weeks"].keys(), key=int))
+        self.assertEqual(data["data"]["year"], expected["year"])
+        self.assertEqual(data["data"]["weeks"],
+                         [expected["weeks"][w] for w in weeks])
+        for region, result in expected["region"].items():
+            self.assertEqual(
+                data["data"]["region"][region]["weeks"],
+                [result["weeks"].get(w, 0) for w in weeks])
+
+        rv = self.app.get('/aggregate_year/gen_2/1/2015?format=columnar&packed=1',
+                          headers=settings.header)
+        data = json.loads(rv.data.decode("utf-8"))
+        packed = data["data"]["weeks"]
+        values = np.frombuffer(base64.b64decode(packed["data"]),
+                               dtype=packed["dtype"])
+        self.assertEqual(list(values), [expected["weeks"][w] for w in weeks])
+
+    def test_aggregate_bulk(self):
+        """Test that bulk aggregation gives the single aggregate results"""
+        queries = [{"variables": "tot_1", "location": 1},
+                   {"variables": "gen_2", "location": 1},
+                   {"variables": "gen_2", "location": 3},
+                   {"variables": "gen_2", "location": 5},
+                   {"variables": "gen_2", "location": 8},
+                   {"variables": "reg_2", "location": 1},
+                   {"variables": "tot_1", "location": 1, "year": 2015,
+                    "weeks": True},
+                   {"variables": "gen_2", "location": 1, "year": 2015,
+                    "weeks": True, "level": "region"}]
+        rv = self.app.post('/aggregate_bulk', json={"queries": queries},
+                           headers=settings.header)
+        self.assertEqual(rv.status_code, 200)
+        results = json.loads(rv.data.decode("utf-8"))["results"]
+        self.assertEqual(len(results), len(queries))
+        self.assertEqual([r["total"] for r in results[:6]],
+                         [11, 8, 5, 1, 2, 15])
+        self.assertEqual(results[6]["total"], 10)
+        self.assertEqual(results[6]["weeks"]["18"], 8)
+        self.assertEqual(results[6]["weeks"]["22"], 1)
+
+        rv = self.app.get('/aggregate_year/gen_2/1/2015?level=region',
+                          headers=settings.header)
+        expected = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(results[7]["total"], expected["year"])
+        self.assertEqual(results[7]["weeks"], expected["weeks"])
+        for region, result in expected["region"].items():
+            self.assertEqual(results[7]["region"][region]["total"],
+                             result["year"])
+            self.assertEqual(results[7]["region"][region]["weeks"],
+                             result["weeks"])
+
+        rv = self.app.post('/aggregate_bulk', json=[{"variables": "tot_1",
+                                                     "level": "not_a_level"}],
+                           headers=settings.header)
+        self.assertEqual(rv.status_code, 400)
+
+        with patch.dict(meerkat_api.app.config, {"BULK_QUERY_LIMIT": 5}):
+            rv = self.app.post('/aggregate_bulk', json=queries,
+                               headers=settings.header)
+        self.assertEqual(rv.status_code, 400)
+
     def test_aggregate_category(self):
         """Test for aggregate Category """
         rv = self.app.get('/aggregate_category/gender/1/2015', headers=settings.header)
@@ -132,3 +211,38 @@ class MeerkatAPIDataTestCase(meerkat_api.test.TestCase):
         )
         self.assertEqual(data["records"][0]["clinic_type"], "Hospital")
         self.assertEqual(data["records"][0]["uuid"], "uuid:2d14ec68-c5b3-47d5-90db-eee510ee9377")
+
+    def test_records_binary(self):
+        """Test the msgpack and arrow stream representations of records"""
+        rv = self.app.get('/records/prc_1/3', headers=settings.header)
+        expected = json.loads(rv.data.decode("utf-8"))["records"][0]
+
+        rv = self.app.get('/records/prc_1/3', headers={
+            **settings.header, "Accept": "application/msgpack"})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.mimetype, "application/msgpack")
+        data = msgpack.unpackb(rv.data, raw=False)
+        self.assertEqual(data["records"][0]["variables"], expected["variables"])
+        self.assertEqual(data["records"][0]["date"], expected["date"])
+
+        rv = self.app.get('/records/prc_1/1', headers={
+            **settings.header,
+            "Accept": "application/vnd.apache.arrow.stream"})
+        self.assertEqual(rv.status_code, 200)
+        table = pyarrow.ipc.open_stream(rv.data).read_all()
+        self.assertEqual(table.num_rows, 7)
+        records = table.to_pydict()
+        i = records["uuid"].index(expected["uuid"])
+        self.assertEqual(records["clinic_type"][i], "Hospital")
+        self.assertEqual(json.loads(records["variables"][i]), expected["variables"])
+
+        # The arrow stream is only built if it is the chosen representation,
+        # the other clients get JSON
+        rv = self.app.get('/records/prc_1/1', headers={
+            **settings.header,
+            "Accept": "text/csv;q=1, application/vnd.apache.arrow.stream;q=0.5"})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.mimetype, "application/json")
+        data = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(len(data["records"]), 7)
+        self.assertIn(expected["uuid"], [r["uuid"] for r in data["records"]])
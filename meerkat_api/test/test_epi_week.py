@@ -6,9 +6,11 @@ Unit tests for the epi week resource of Meerkat Api
 """
 
 import json
+from datetime import datetime
 
 import meerkat_api
 import meerkat_abacus.util.epi_week
+from api_background import epi_calendar
 from . import settings
 
 
@@ -35,6 +37,12 @@ class MeerkatAPIEpiWeekTestCase(meerkat_api.test.TestCase):
         data = json.loads(rv.data.decode("utf-8"))
         self.assertEqual(rv.status_code, 200)
         self.assertEqual(data["epi_week"], 48)
+        # The local date is used, not the date in UTC
+        rv = self.app.get('/epi_week/2015-12-03T01:00:00+05:00',
+                          headers=settings.header)
+        data = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(data["epi_week"], 49)
 
     def test_epi_week_for_dd_mm_yyyy_format(self):
         """ Test date to epi week"""
@@ -53,3 +61,28 @@ class MeerkatAPIEpiWeekTestCase(meerkat_api.test.TestCase):
         data = json.loads(rv.data.decode("utf-8"))
         self.assertEqual(rv.status_code, 200)
         self.assertEqual(data["start_date"], "2015-01-08T00:00:00")
+
+    def test_epi_weeks(self):
+        """ Test the epi weeks of a list of dates"""
+        rv = self.app.get('/epi_weeks?dates=2015-01-05,2015-12-02,04-01-2015',
+                          headers=settings.header)
+        data = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual([d["epi_week"] for d in data["epi_weeks"]], [1, 48, 1])
+        self.assertEqual(data["epi_weeks"][1]["year"], 2015)
+        self.assertEqual(data["epi_weeks"][1]["start_date"], "2015-11-26T00:00:00")
+        rv = self.app.get('/epi_weeks?dates=2015-01-05,not a date',
+                          headers=settings.header)
+        self.assertEqual(rv.status_code, 400)
+
+    def test_epi_calendar(self):
+        """ Test that the epi calendar gives the same weeks as abacus"""
+        dates = [datetime(2009, 12, 30), datetime(2015, 1, 1), datetime(2015, 12, 31),
+                 datetime(2016, 2, 29), datetime(2016, 12, 31), datetime(2017, 1, 7)]
+        epi_years, epi_weeks, week_starts = epi_calendar.epi_weeks_for_dates(dates)
+        for i, date in enumerate(dates):
+            expected = meerkat_abacus.util.epi_week.epi_week_for_date(date)
+            self.assertEqual((epi_years[i], epi_weeks[i]), expected)
+            self.assertEqual(epi_calendar.epi_week_for_date(date), expected)
+            self.assertLessEqual(week_starts[i].astype(datetime), date.date())
+        self.assertEqual(week_starts[1].astype(datetime), datetime(2015, 1, 1).date())
@@ -6,9 +6,14 @@ Unit tests for the export_data resource of Meerkat API
 """
 import json
 import unittest
-from unittest.mock import patch, PropertyMock, MagicMock
+from unittest.mock import patch, PropertyMock
 import csv
 import os
+import subprocess
+import sys
+import pyarrow.ipc
+import pyarrow.parquet
+from sqlalchemy import func
 
 from . import settings
 import meerkat_api
@@ -18,6 +23,7 @@ from api_background.celery_app import app as celery_app
 from meerkat_abacus import util, model
 from meerkat_abacus.config import config
 from api_background.export_data import base_folder
+from api_background import worker
 from meerkat_abacus.util.epi_week import epi_week_for_date
 
 
@@ -67,6 +73,14 @@ class MeerkatAPITestCase(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def test_worker_import(self):
+        """The export tasks are imported without creating the API app"""
+        code = ("import sys, api_background.export_data; "
+                "assert 'meerkat_api' not in sys.modules, 'meerkat_api imported'")
+        result = subprocess.run([sys.executable, "-c", code],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertEqual(result.returncode, 0, result.stderr.decode("utf-8"))
+
     def test_forms(self):
         """ Test the getting the fields of a form"""
 
@@ -123,6 +137,76 @@ class MeerkatAPITestCase(unittest.TestCase):
                     self.assertEqual(line["clinic"], "Clinic 1")
             self.assertTrue(has_found)
 
+    def test_export_data_reused(self):
+        """ Test that identical exports share the same files """
+        rv = self.app.get('/export/data', headers={**settings.header})
+        self.assertEqual(rv.status_code, 200)
+        uuid = rv.data.decode("utf-8")[1:-2]
+
+        rv = self.app.get('/export/data', headers={**settings.header})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.data.decode("utf-8")[1:-2], uuid)
+        test = self.session.query(model.DownloadDataFiles).filter(
+            model.DownloadDataFiles.uuid == uuid).all()
+        self.assertEqual(len(test), 1)
+
+        rv = self.app.get('/export/data/1', headers={**settings.header})
+        self.assertNotEqual(rv.data.decode("utf-8")[1:-2], uuid)
+
+        # Updated data or locations give a new export
+        self.session.query(model.Data).filter(
+            model.Data.id ==
+            self.session.query(func.min(model.Data.id)).as_scalar()
+        ).update({"clinic_type": "Updated"}, synchronize_session=False)
+        self.session.commit()
+        rv = self.app.get('/export/data', headers={**settings.header})
+        updated_uuid = rv.data.decode("utf-8")[1:-2]
+        self.assertNotEqual(updated_uuid, uuid)
+        self.session.query(model.Locations).filter(
+            model.Locations.id == 7).update({"name": "Clinic One"})
+        self.session.commit()
+        rv = self.app.get('/export/data', headers={**settings.header})
+        self.assertNotEqual(rv.data.decode("utf-8")[1:-2], updated_uuid)
+
+    def test_worker_state_reused(self):
+        """ Test that the workers reuse their engine and locations """
+        db1, session1 = worker.get_worker_db()
+        db2, session2 = worker.get_worker_db()
+        self.assertIs(db1, db2)
+        self.assertIsNot(session1, session2)
+
+        locs = worker.worker_locations(session1)
+        self.assertIs(worker.worker_locations(session2), locs)
+        self.assertEqual(locs[7].name, "Clinic 1")
+
+        self.session.query(model.Locations).filter(
+            model.Locations.id == 7).update({"name": "Clinic One"})
+        self.session.commit()
+        updated = worker.worker_locations(session1)
+        self.assertIsNot(updated, locs)
+        self.assertEqual(updated[7].name, "Clinic One")
+
+        worker.release_task_resources()
+        self.assertEqual(len(worker._sessions), 0)
+
+    def test_export_data_failed(self):
+        """ Test that a failed export is queued again """
+        with patch("api_background.export_data.__copy_data_table",
+                   side_effect=RuntimeError("Export failed")):
+            rv = self.app.get('/export/data', headers={**settings.header})
+        self.assertEqual(rv.status_code, 200)
+        uuid = rv.data.decode("utf-8")[1:-2]
+        status = self.session.query(model.DownloadDataFiles).filter(
+            model.DownloadDataFiles.uuid == uuid).one()
+        self.assertEqual((status.status, status.success), (1.0, 0))
+
+        rv = self.app.get('/export/data', headers={**settings.header})
+        self.assertEqual(rv.data.decode("utf-8")[1:-2], uuid)
+        self.session.expire_all()
+        status = self.session.query(model.DownloadDataFiles).filter(
+            model.DownloadDataFiles.uuid == uuid).one()
+        self.assertEqual((status.status, status.success), (1.0, 1))
+
     def test_export_data_table(self):
         """ Test the export of the data table """
         rv = self.app.get(
@@ -166,6 +250,70 @@ class MeerkatAPITestCase(unittest.TestCase):
             self.assertTrue(has_found_clinic_2)
             self.assertTrue(has_found_clinic_3)
 
+    def test_export_data_table_wide(self):
+        """ Test the export of the data table in the wide format """
+        rv = self.app.get(
+            '/export/data_table/test/gen_2?variables=[["tot_1", "N"]]&group_by=[["region:location", "Region"], ["clinic:location", "Clinic"]]&wide_data_format=1',
+            headers={**settings.header})
+        self.assertEqual(rv.status_code, 200)
+        uuid = rv.data.decode("utf-8")[1:-2]
+
+        filename = base_folder + "/exported_data/" + uuid + "/test.csv"
+        with open(filename) as csv_file:
+            c = csv.DictReader(csv_file)
+            self.assertEqual(c.fieldnames[0], "Region")
+            self.assertEqual(sorted(c.fieldnames[1:]),
+                             ["N Clinic 1", "N Clinic 2", "N Clinic 5"])
+            totals = {"N Clinic 1": 0, "N Clinic 2": 0, "N Clinic 5": 0}
+            regions = []
+            for line in c:
+                regions.append(line["Region"])
+                for key in totals:
+                    totals[key] += float(line[key])
+        self.assertEqual(totals, {"N Clinic 1": 1.0, "N Clinic 2": 2.0,
+                                  "N Clinic 5": 5.0})
+        # One row per region
+        self.assertEqual(len(regions), len(set(regions)))
+
+        # Excluded locations get no columns
+        rv = self.app.get(
+            '/export/data_table/test/gen_2?variables=[["tot_1", "N"]]&group_by=[["region:location", "Region"], ["clinic:location", "Clinic"]]&wide_data_format=1&location_conditions=[["case_type", "pip"]]',
+            headers={**settings.header})
+        uuid = rv.data.decode("utf-8")[1:-2]
+        filename = base_folder + "/exported_data/" + uuid + "/test.csv"
+        with open(filename) as csv_file:
+            c = csv.DictReader(csv_file)
+            self.assertEqual(c.fieldnames, ["Region", "N Clinic 1"])
+            self.assertEqual(sum(float(line["N Clinic 1"]) for line in c), 1.0)
+
+    def test_export_data_table_parquet(self):
+        """ Test the export of the data table as parquet """
+        rv = self.app.get(
+            '/export/data_table/test/gen_2?variables=[["tot_1", "N"]]&group_by=[["clinic:location", "Clinic"]]&formats=parquet,arrow',
+            headers={**settings.header})
+        self.assertEqual(rv.status_code, 200)
+        uuid = rv.data.decode("utf-8")[1:-2]
+
+        rv = self.app.get('/export/getparquet/' + uuid,
+                          headers=settings.header)
+        self.assertEqual(rv.status_code, 302)
+        self.assertIn("exported_data/" + uuid + "/test.parquet",
+                      rv.data.decode("utf-8"))
+
+        filename = base_folder + "/exported_data/" + uuid + "/test"
+        table = pyarrow.parquet.read_table(filename + ".parquet").to_pydict()
+        self.assertEqual(sorted(table["Clinic"]),
+                         ["Clinic 1", "Clinic 2", "Clinic 5"])
+        values = dict(zip(table["Clinic"], table["N"]))
+        self.assertEqual(values["Clinic 2"], 2.0)
+        table = pyarrow.ipc.open_file(filename + ".arrow").read_all()
+        self.assertEqual(table.num_rows, 3)
+
+        rv = self.app.get(
+            '/export/data_table/test/gen_2?variables=[["tot_1", "N"]]&group_by=[["clinic:location", "Clinic"]]&formats=orc',
+            headers={**settings.header})
+        self.assertEqual(rv.status_code, 400)
+
     def test_week_level_long(self):
         """ Test the export of normal data for week_level with long format"""
 
@@ -190,32 +338,21 @@ class MeerkatAPITestCase(unittest.TestCase):
         with open(filename) as csv_file:
             self.assertEqual(len(csv_file.readlines()), 6)
             
-    def _prepare_week_level(self, mock_authenticate, mock_request):
+    def _prepare_week_level(self):
         self.session.query(model.Data).delete()
         self.session.commit()
         db_util.insert_cases(self.session, "completeness")
-        mock_authenticate.return_value = 'meerkatjwt'
 
         date = datetime.datetime.today()
         start_date = datetime.datetime(date.year, 1, 1)
         end_date = datetime.datetime(date.year, 12, 31)
 
-        rv = self.app.get(
-            '/completeness/reg_1/1/4/1/5,6/reg_1/{}?sublevel=clinic'.format(end_date.isoformat()),
-            headers={**settings.header})
-        result_mock = MagicMock()
-        result_mock.json = MagicMock(return_value=json.loads(rv.data.decode("utf-8")))
-        mock_request.return_value = result_mock
-
         return date, start_date, end_date
 
-    
-    @patch('api_background.export_data.requests.get')
-    @patch('api_background.export_data.meerkat_libs.authenticate')
-    def test_week_level_long_completeness(self, mock_authenticate, mock_request):
+    def test_week_level_long_completeness(self):
         """ Test the export of completeness data for week_level with long format"""
 
-        date, start_date, end_date = self._prepare_week_level(mock_authenticate, mock_request)
+        date, start_date, end_date = self._prepare_week_level()
         rv = self.app.get(
             '/export/week_level/test/clinic?variable=["completeness:/completeness/reg_1/1/4/<start_week>/5,6/reg_1/<end_date>", "completeness"]&start_date={}&end_date={}'.format(
                 start_date.isoformat(), end_date.isoformat()),
@@ -235,9 +372,13 @@ class MeerkatAPITestCase(unittest.TestCase):
         self.assertIn("exported_data/" + uuid + "/test.csv",
                       rv.data.decode("utf-8"))
 
-        mock_request.assert_called()
-        mock_authenticate.assert_called()
-        
+        # The export gives the same completeness as the api
+        rv = self.app.get(
+            '/completeness/reg_1/1/4/1/5,6/reg_1/{}?sublevel=clinic'.format(end_date.isoformat()),
+            headers={**settings.header})
+        timeline = json.loads(rv.data.decode("utf-8"))["timeline"]
+        demo_values = [v / 4 * 100 for v in timeline["1"]["values"]]
+
         filename = base_folder + "/exported_data/" + uuid + "/test.csv"
         current_epi_week = epi_week_for_date(date)[1]
         with open(filename) as csv_file:
@@ -251,13 +392,32 @@ class MeerkatAPITestCase(unittest.TestCase):
                     self.assertEqual(line["completeness"], '50.0')
                     found = True
             self.assertTrue(found)
+            csv_file.seek(0)
+            exported = [float(line["completeness"])
+                        for line in csv.DictReader(csv_file)
+                        if line["Clinic"] == "Demo"]
+            self.assertEqual(exported, demo_values)
 
             
-    @patch('api_background.export_data.requests.get')
-    @patch('api_background.export_data.meerkat_libs.authenticate')
-    def test_week_level_wide(self, mock_authenticate, mock_request):
+    def test_week_level_completeness_no_years(self):
+        """Test the completeness export of a period without any year"""
+        date, start_date, end_date = self._prepare_week_level()
+        rv = self.app.get(
+            '/export/week_level/test/clinic?variable=["completeness:/completeness/reg_1/1/4/<start_week>/5,6/reg_1/<end_date>", "completeness"]&start_date={}&end_date={}'.format(
+                end_date.isoformat(), start_date.replace(year=date.year - 1).isoformat()),
+            headers={**settings.header})
+        self.assertEqual(rv.status_code, 200)
+        uuid = rv.data.decode("utf-8")[1:-2]
+        status = self.session.query(model.DownloadDataFiles).filter(
+            model.DownloadDataFiles.uuid == uuid).one()
+        self.assertEqual(status.success, 1)
+        filename = base_folder + "/exported_data/" + uuid + "/test.csv"
+        with open(filename) as csv_file:
+            self.assertEqual(len(csv_file.readlines()), 1)
+
+    def test_week_level_wide(self):
         """Test week_level with wide format"""
-        date, start_date, end_date = self._prepare_week_level(mock_authenticate, mock_request)
+        date, start_date, end_date = self._prepare_week_level()
         rv = self.app.get(
             '/export/week_level/test/clinic?variable=["completeness:/completeness/reg_1/1/4/<start_week>/5,6/reg_1/<end_date>", "completeness"]&start_date={}&end_date={}&wide_data_format=1'.format(
                 start_date.isoformat(), end_date.isoformat()),
@@ -11,7 +11,9 @@ import csv
 from freezegun import freeze_time
 
 import meerkat_api
+from meerkat_abacus import model
 from meerkat_api.test import db_util
+from meerkat_api.util import counters
 
 
 class MeerkatAPITestCase(unittest.TestCase):
@@ -25,6 +27,8 @@ class MeerkatAPITestCase(unittest.TestCase):
         db_util.insert_codes(session)
         db_util.insert_locations(session)
         db_util.insert_cases(session, "frontpage", "2016-07-02")
+        # The counters only notice removed records when they are rebuilt
+        counters.counter_store["store"] = None
         self.session = session
 
     def tearDown(self):
@@ -40,6 +44,31 @@ class MeerkatAPITestCase(unittest.TestCase):
         self.assertEqual(data["reg_1"]["value"], 1)
         self.assertEqual(data["reg_2"]["value"], 15)
         self.assertEqual(data["tot_1"]["value"], 2)
+        self.assertIsInstance(data["tot_1"]["value"], int)
+        self.assertIn("max-age", rv.headers["Cache-Control"])
+
+    @freeze_time("2016-07-02")
+    def test_key_indicators_new_data(self):
+        """ Test that new data is added to the key indicators """
+        rv = self.app.get('/key_indicators')
+        data = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(data["tot_1"]["value"], 2)
+        store = counters.counter_store["store"]
+
+        self.session.add(model.Data(
+            uuid="uuid:new-record", country=1, region=2, district=6,
+            clinic=7, geolocation="POINT(0.1 0.4)",
+            date=datetime(2016, 7, 1), variables={"tot_1": 1}
+        ))
+        self.session.commit()
+        rv = self.app.get('/key_indicators')
+        data = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(data["tot_1"]["value"], 3)
+        # The store read by the first request is not modified
+        self.assertEqual(store["totals"]["tot_1"][1], 2)
+        rv = self.app.get('/tot_map')
+        data = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(data["7"]["value"], 3)
 
     @freeze_time("2016-07-02")
     def test_tot_map(self):
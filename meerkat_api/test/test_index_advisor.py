@@ -0,0 +1,38 @@
+"""
+Unittests for meerkat_api.util.index_advisor
+"""
+import unittest
+
+from meerkat_api.util import index_advisor
+
+
+class IndexAdvisorTests(unittest.TestCase):
+
+    def test_propose_indexes(self):
+        """Test proposing indexes"""
+        variables = ["tot_1", "ctc_1"]
+        selectivity = {"tot_1": 0.9, "ctc_1": 0.01}
+        proposals = dict(index_advisor.propose_indexes(variables, selectivity, {}))
+        self.assertIn("data_var_ctc_1_date_idx", proposals)
+        self.assertNotIn("data_var_tot_1_date_idx", proposals)
+        self.assertIn("WHERE variables ? 'ctc_1'",
+                      proposals["data_var_ctc_1_date_idx"])
+        self.assertIn("data_clinic_date_idx", proposals)
+
+        existing = {
+            "data_var_ctc_1_date_idx": "",
+            "other_name": "CREATE INDEX other_name ON public.data "
+                          "USING btree (clinic, date)"
+        }
+        proposals = dict(index_advisor.propose_indexes(variables, selectivity,
+                                                       existing))
+        self.assertNotIn("data_var_ctc_1_date_idx", proposals)
+        self.assertNotIn("data_clinic_date_idx", proposals)
+        self.assertIn("data_variables_gin_idx", proposals)
+
+    def test_module_strings(self):
+        """Test finding the variables used by the frontpage"""
+        strings = index_advisor.module_strings("meerkat_api.resources.frontpage")
+        self.assertIn("tot_1", strings)
+        self.assertIn("reg_2", strings)
+        self.assertIn("key_indicators", strings)
@@ -0,0 +1,65 @@
+"""
+Unittests for meerkat_api.json_backend
+"""
+import json
+import unittest
+from datetime import datetime
+
+import numpy as np
+from geoalchemy2.shape import from_shape
+from shapely.geometry import Point
+
+from meerkat_api import json_backend
+
+
+class JSONBackendTests(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(json_backend.json_backend.update,
+                        dict(json_backend.json_backend))
+        self.data = {
+            "date": datetime(2015, 5, 1, 12, 30),
+            "value": np.float64(1.5),
+            "count": np.int64(3),
+            "timeline": np.array([1, 2, 3]),
+            "weeks": {1: 2, 18: 3},
+            "point": from_shape(Point(1.0, 2.0)),
+            "locations": {2, 3}
+        }
+        self.expected = {
+            "date": "2015-05-01T12:30:00",
+            "value": 1.5,
+            "count": 3,
+            "timeline": [1, 2, 3],
+            "weeks": {"1": 2, "18": 3},
+            "point": [[1.0, 2.0]],
+            "locations": [2, 3]
+        }
+
+    def test_json_backend(self):
+        """The standard library backend encodes all the types"""
+        json_backend.json_backend["name"] = "json"
+        data = json.loads(json_backend.dumps(self.data, sort_keys=True))
+        data["locations"] = sorted(data["locations"])
+        self.assertEqual(data, self.expected)
+
+    @unittest.skipIf(json_backend.orjson is None, "orjson is not installed")
+    def test_orjson_backend(self):
+        """orjson gives the same JSON as the standard library backend"""
+        json_backend.json_backend["name"] = "orjson"
+        data = json.loads(json_backend.dumps(self.data, sort_keys=True))
+        data["locations"] = sorted(data["locations"])
+        self.assertEqual(data, self.expected)
+
+    def test_nan(self):
+        """Both backends encode NaN and infinite floats as null"""
+        data = {"missing": float("nan"), "ratio": np.float64("inf"),
+                "values": np.array([1.5, np.nan]), "weeks": {1: -np.inf}}
+        expected = {"missing": None, "ratio": None, "values": [1.5, None],
+                    "weeks": {"1": None}}
+        backends = ["json"] if json_backend.orjson is None else ["json", "orjson"]
+        for name in backends:
+            json_backend.json_backend["name"] = name
+            output = json_backend.dumps(data)
+            self.assertNotIn(b"NaN", output)
+            self.assertEqual(json.loads(output), expected)
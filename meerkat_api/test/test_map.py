@@ -12,6 +12,9 @@ import meerkat_api
 from meerkat_api.test import db_util
 from meerkat_api.test import settings
 from meerkat_api.resources.map import MapVariable
+from meerkat_api.resources import map as map_resource
+from meerkat_api.resources.map import zoom_to_tolerance, round_coordinates
+from meerkat_api.resources.map import tolerance_to_zoom
 
 
 
@@ -90,3 +93,43 @@ class MeerkatAPIMapTestCase(unittest.TestCase):
 
         data = mv.get("gen_2", location=3)
         self.assertEqual(len(data), 1)
+
+    def test_shapes(self):
+        """ Test the simplification helpers for geo shapes """
+        self.assertAlmostEqual(zoom_to_tolerance(0), 360 / 256)
+        self.assertAlmostEqual(zoom_to_tolerance(8), 360 / 256 / 256)
+
+        polygon = [[(0.123456, 1.987654), (2.5, 3.25), (0.123456, 1.987654)]]
+        self.assertEqual(round_coordinates(polygon, 2),
+                         [[[0.12, 1.99], [2.5, 3.25], [0.12, 1.99]]])
+        self.assertEqual(round_coordinates((0.123456, 1.987654), 3),
+                         [0.123, 1.988])
+
+        rv = self.app.get('/geo_shapes/region?zoom=5&precision=4',
+                          headers=settings.header)
+        self.assertEqual(rv.status_code, 200)
+        data = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(data["type"], "FeatureCollection")
+
+        self.assertEqual(tolerance_to_zoom(zoom_to_tolerance(5)), 5)
+        self.assertEqual(tolerance_to_zoom(zoom_to_tolerance(5) * 1.2), 5)
+        self.assertEqual(tolerance_to_zoom(1e-12), map_resource.MAX_ZOOM)
+        self.assertIsNone(tolerance_to_zoom(0))
+
+        # Nearby tolerances and large precisions share one cache entry
+        map_resource.shape_cache["shapes"].clear()
+        for args in ["zoom=5&precision=4", "tolerance={}&precision=4".format(
+                zoom_to_tolerance(5) * 1.1), "zoom=5&precision=4"]:
+            rv = self.app.get('/geo_shapes/region?' + args,
+                              headers=settings.header)
+            self.assertEqual(rv.status_code, 200)
+        rv = self.app.get('/geo_shapes/region?zoom=5&precision=100',
+                          headers=settings.header)
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(set(map_resource.shape_cache["shapes"].keys()),
+                         {("region", 5, 4), ("region", 5, 8)})
+
+        for args in ["zoom=a", "tolerance=-1", "tolerance=nan", "precision=x"]:
+            rv = self.app.get('/geo_shapes/region?' + args,
+                              headers=settings.header)
+            self.assertEqual(rv.status_code, 400)
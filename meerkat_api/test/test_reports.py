@@ -303,6 +303,34 @@ class MeerkatAPIReportsUtilityTestCase(meerkat_api.test.TestCase):
             {"pop_1": 3}
         ]
 
+    def test_get_latest_category_many(self):
+        """Test get_latest_category_many"""
+
+        db_util.create_category(
+            self.db_session,
+            ["pop_1", "pop_2", "pop_3", "pop_4"],
+            "population",
+            ["Population, Male <20", "Population, Female <20",
+             "Population, Male >20", "Population, Female >20"]
+        )
+        variables = [
+            {"pop_1": 5, "pop_2": 6, "pop_3": 7, "pop_4": 8},
+            {"pop_1": 15, "pop_2": 16, "pop_3": 17, "pop_4": 0}
+        ]
+        dates = [datetime(2016, 1, 1), datetime(2016, 2, 2)]
+        db_util.create_data(self.db_session, variables, dates=dates)
+        start_date = datetime(2016, 1, 1)
+        end_date = datetime.now()
+        results = reports.get_latest_category_many("population", [4, 7],
+                                                   start_date, end_date)
+        self.assertEqual(
+            results[4],
+            reports.get_latest_category("population", 4, start_date, end_date)
+        )
+        self.assertEqual(results[4]["<20"]["male"], 15)
+        self.assertEqual(results[7], {"<20": {"female": 0, "male": 0},
+                                      ">20": {"female": 0, "male": 0}})
+
     def test_refugee_disease(self):
         """Test refugee_disease"""
         diseases = {
@@ -397,6 +425,29 @@ class MeerkatAPIReportsTestCase(meerkat_api.test.TestCase):
             data = json.loads(rv.data.decode("utf-8"))
             self.assertEqual(data, None)
 
+    def test_admission_control(self):
+        """ Testing that reports are refused when all slots are taken """
+        db_util.insert_codes(self.db_session)
+        db_util.insert_locations(self.db_session)
+        heavy = meerkat_api.app.extensions["admission_control"]["heavy"]
+        queue = heavy.queue
+        taken = 0
+        while heavy.slots.acquire(blocking=False):
+            taken += 1
+        heavy.queue = 0
+        try:
+            rv = self.app.get('/reports/public_health/99', headers=settings.header)
+            self.assertEqual(rv.status_code, 503)
+            self.assertEqual(rv.headers["Retry-After"], str(heavy.retry_after))
+            rv = self.app.get('/variable/tot_1', headers=settings.header)
+            self.assertEqual(rv.status_code, 200)
+        finally:
+            heavy.queue = queue
+            for i in range(taken):
+                heavy.slots.release()
+        rv = self.app.get('/reports/public_health/99', headers=settings.header)
+        self.assertEqual(rv.status_code, 200)
+
     def test_dates(self):
         """ Testing that the dates are handled correctly """
         db_util.insert_codes(self.db_session)
@@ -0,0 +1,28 @@
+"""
+Unittests for meerkat_api.routes
+"""
+import unittest
+
+from flask_restful import Resource
+
+import meerkat_api
+from meerkat_api.routes import lazy_resources, resource_view
+
+
+class RoutesTests(unittest.TestCase):
+
+    def test_lazy_resources_resolve(self):
+        """Every declared route points to an existing resource class"""
+        for module_name, class_name in lazy_resources:
+            view = resource_view(module_name, class_name)
+            self.assertTrue(issubclass(view.view_class, Resource))
+            self.assertEqual(view.view_class.__name__, class_name)
+            self.assertEqual(view.view_class.__module__,
+                             "meerkat_api.resources." + module_name)
+
+    def test_endpoints_unchanged(self):
+        """The placeholders are registered under the resource's endpoint"""
+        endpoints = set(meerkat_api.app.view_functions)
+        for module_name, class_name in lazy_resources:
+            self.assertIn(class_name.lower(), endpoints)
+        self.assertEqual(len(set(lazy_resources)), len(lazy_resources))
@@ -3,7 +3,9 @@ Unittests for meerkat_api.util
 """
 import unittest
 from datetime import datetime
+from unittest.mock import patch
 
+import meerkat_api
 from meerkat_api import util
 from meerkat_abacus import model
 import meerkat_abacus.util as abacus_util
@@ -132,3 +134,17 @@ class UtilTests(unittest.TestCase):
                              "Location " + str(i))
         with self.assertRaises(TypeError):
             result_dicts = util.rows_to_dicts(combined_rows, dict_id="id")
+
+    def test_table_version(self):
+        """The version of a table is only queried once per request"""
+        with patch("api_background.table_version.table_version",
+                   return_value=(3, 42)) as version:
+            with meerkat_api.app.test_request_context("/"):
+                self.assertEqual(util.table_version(None, model.Locations),
+                                 (3, 42))
+                self.assertEqual(util.table_version(None, model.Locations),
+                                 (3, 42))
+                version.assert_called_once_with(None, model.Locations)
+            with meerkat_api.app.test_request_context("/"):
+                util.table_version(None, model.Locations)
+            self.assertEqual(version.call_count, 2)
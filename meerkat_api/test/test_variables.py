@@ -7,6 +7,7 @@ Unit tests for the varibles resource in Meerkat API
 import json
 import unittest
 import meerkat_api
+from meerkat_abacus import model
 from meerkat_api.test import db_util
 from meerkat_api.test.test_data.locations import LOCATION_NUMBER
 from . import settings
@@ -70,3 +71,17 @@ class MeerkatAPIVariablesTestCase(unittest.TestCase):
         self.assertEqual(rv.status_code, 200)
 #        self.assertEqual(len(data), len(codes))
         self.assertEqual(data["cmd_1"]["name"], "Cholera")
+
+    def test_variables_updated(self):
+        """Check that changed variables are picked up"""
+        rv = self.app.get('/variable/tot_1', headers=settings.header)
+        data = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(data["name"], "Total")
+
+        db_util.session.query(model.AggregationVariables).filter(
+            model.AggregationVariables.id == "tot_1"
+        ).update({"name": "Total Cases"})
+        db_util.session.commit()
+        rv = self.app.get('/variable/tot_1', headers=settings.header)
+        data = json.loads(rv.data.decode("utf-8"))
+        self.assertEqual(data["name"], "Total Cases")
@@ -0,0 +1,68 @@
+"""
+Unittests for api_background.xls_csv_writer
+"""
+import csv
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import openpyxl
+
+from api_background.xls_csv_writer import XlsCsvFileWriter
+
+
+class XlsCsvFileWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        os.mkdir(self.directory.name + "/exported_data")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_rows_written_in_order(self):
+        """Both files get all the rows in order across the batches"""
+        writer = XlsCsvFileWriter(self.directory.name, "test", "uid",
+                                  batch_size=3, queue_size=1)
+        writer.write_row(["a", "b"])
+        writer.write_rows([[i, "row {}".format(i)] for i in range(10)])
+        writer.write_row([None, "last"])
+        writer.close()
+
+        with open(writer.file_path_template.format("csv")) as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0], ["a", "b"])
+        self.assertEqual(rows[5], ["4", "row 4"])
+        self.assertEqual(rows[11], ["", "last"])
+
+        sheet = openpyxl.load_workbook(
+            writer.file_path_template.format("xlsx")).active
+        rows = list(sheet.values)
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0], ("a", "b"))
+        self.assertEqual(rows[5], (4, "row 4"))
+        self.assertEqual(rows[11], (None, "last"))
+
+    def test_writer_error_raised(self):
+        """Errors in the writer threads are raised in the task"""
+        writer = XlsCsvFileWriter(self.directory.name, "test", "uid",
+                                  batch_size=1)
+        with patch.object(writer.xls_sheet, "write_row",
+                          side_effect=ValueError("broken")):
+            writer.write_row(["a"])
+            with self.assertRaises(ValueError):
+                writer.close()
+
+    def test_context_manager_failure(self):
+        """The threads are stopped and the files closed when the export fails"""
+        with self.assertRaises(RuntimeError):
+            with XlsCsvFileWriter(self.directory.name, "test", "uid",
+                                  batch_size=2) as writer:
+                writer.write_rows([[i] for i in range(5)])
+                raise RuntimeError("export failed")
+        self.assertTrue(writer.csv_content.closed)
+        self.assertTrue(writer.xls_content.closed)
+        for thread in writer.threads:
+            self.assertFalse(thread.is_alive())
@@ -4,9 +4,10 @@ meerkat_api util functions
 """
 from datetime import datetime
 from dateutil import parser
+from flask import request, has_request_context
 import meerkat_abacus.util as abacus_util
-import numpy as np
 import meerkat_abacus.util.epi_week
+from api_background import table_version as _table_version
 
 
 def series_to_json_dict(series):
@@ -18,15 +19,10 @@ def series_to_json_dict(series):
     Returns:
        dict: dict
     """
-    # np.asscalar is necessary to cast numpy types to python native
+    # tolist casts the whole series to python native floats at once
     if series is not None:
-        ret = {}
-        for key, value in series.to_dict().items():
-            if isinstance(value, float) or isinstance(value, int):
-                ret[str(key)] = value
-            else:
-                ret[str(key)] = float(np.asscalar(value))
-        return ret
+        return dict(zip((str(key) for key in series.index),
+                        series.astype(float).tolist()))
     else:
         return {}
 
@@ -151,3 +147,24 @@ def get_children(parent, locations, clinic_type=None, require_case_report=True,
                 if abacus_util.is_child(parent, location_id, locations):
                     ret.append(location_id)
     return ret
+
+
+def table_version(session, table):
+    """
+    Returns the version of table, the number of rows and the newest
+    transaction id (xmin). The version is only queried once per request.
+
+    Args:
+        session: db session
+        table: model or table
+    Returns:
+        version(tuple): (count, max xmin)
+    """
+    name = getattr(table, "__tablename__", None) or table.name
+    key = "meerkat_api.table_version." + name
+    if has_request_context() and key in request.environ:
+        return request.environ[key]
+    version = _table_version.table_version(session, table)
+    if has_request_context():
+        request.environ[key] = version
+    return version
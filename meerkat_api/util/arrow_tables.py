@@ -0,0 +1,111 @@
+"""
+Arrow tables from query results and resource output
+
+Used by the application/vnd.apache.arrow.stream representation. Query
+results are converted column by column, without building a dict per row.
+JSON columns and nested values are sent as JSON strings and geometries as
+WKB. pyarrow is only imported when a stream is written.
+"""
+from flask import request
+from geoalchemy2 import Geometry
+from geoalchemy2.elements import WKBElement
+from sqlalchemy.dialects.postgresql import JSON, JSONB
+
+from meerkat_api import json_backend
+from meerkat_api.extensions import api
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+
+def response_mediatype():
+    """
+    Returns the mediatype of the api representation the response will be
+    written with, e.g. ARROW_STREAM if the client prefers an Arrow stream to
+    every other representation
+    """
+    return request.accept_mimetypes.best_match(
+        api.representations, default=api.default_mediatype)
+
+
+def _json_string(value):
+    if value is None:
+        return None
+    return json_backend.dumps(value).decode("utf-8")
+
+
+def _array(values):
+    """
+    Returns an Arrow array of values, nested values become JSON strings and
+    columns of mixed types strings
+    """
+    import pyarrow as pa
+    if any(isinstance(v, (dict, list, tuple, set)) for v in values):
+        return pa.array([_json_string(v) for v in values], type=pa.string())
+    if any(isinstance(v, WKBElement) for v in values):
+        return pa.array([None if v is None else bytes(v.data) for v in values],
+                        type=pa.binary())
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        return pa.array([None if v is None else str(v) for v in values],
+                        type=pa.string())
+
+
+def rows_to_record_batch(rows, columns):
+    """
+    Returns a record batch of the query result rows of columns
+
+    Args:
+        rows: list of result tuples
+        columns: the queried sqlalchemy columns
+    """
+    import pyarrow as pa
+    arrays = []
+    for i, column in enumerate(columns):
+        values = [row[i] for row in rows]
+        if isinstance(column.type, (JSON, JSONB)):
+            arrays.append(pa.array([_json_string(v) for v in values],
+                                   type=pa.string()))
+        elif isinstance(column.type, Geometry):
+            arrays.append(pa.array(
+                [None if v is None else bytes(v.data) for v in values],
+                type=pa.binary()))
+        else:
+            arrays.append(_array(values))
+    return pa.RecordBatch.from_arrays(arrays, [c.name for c in columns])
+
+
+def records_to_table(records):
+    """
+    Returns a table of a list of dicts, the columns are the union of their
+    keys
+    """
+    import pyarrow as pa
+    keys = list(dict.fromkeys(k for record in records for k in record.keys()))
+    return pa.Table.from_arrays(
+        [_array([record.get(k) for record in records]) for k in keys],
+        [str(k) for k in keys])
+
+
+def to_table(data):
+    """
+    Returns resource output as an Arrow table or None if it is not tabular
+
+    Tabular output is a table or record batch, a list of dicts, a dict with
+    one list of dicts, e.g. {"records": [...]}, or a dict of dicts which
+    becomes one row per key.
+    """
+    import pyarrow as pa
+    if isinstance(data, pa.Table):
+        return data
+    if isinstance(data, pa.RecordBatch):
+        return pa.Table.from_batches([data])
+    if isinstance(data, list) and all(isinstance(r, dict) for r in data):
+        return records_to_table(data)
+    if isinstance(data, dict):
+        values = list(data.values())
+        if len(values) == 1 and isinstance(values[0], list):
+            return to_table(values[0])
+        if all(isinstance(v, dict) for v in values):
+            return records_to_table([{"key": k, **v} for k, v in data.items()])
+    return None
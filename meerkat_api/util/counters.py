@@ -0,0 +1,129 @@
+"""
+In-process store of running totals for the variables shown on the public
+frontpage.
+
+The store keeps a watermark of the highest data id it has counted and only
+aggregates the newer rows on each read. Checking for new rows only costs a
+max(id), so removed rows are not detected on read. They are dropped when
+the store is rebuilt from scratch, which happens when the epi year changes
+and when the store is older than max_age.
+
+A published store is never modified. New rows are added to a copy which
+then replaces the published store, so readers can use a store without
+holding the lock.
+"""
+import threading
+import time
+
+from sqlalchemy import func, Float, or_
+
+from meerkat_abacus.model import Data
+from meerkat_api.util import fix_dates
+
+counter_store = {"store": None}
+counter_lock = threading.Lock()
+
+LOCATION_LEVELS = ["country", "zone", "region", "district", "clinic"]
+
+
+def get_counters(db, variables, max_age=3600):
+    """
+    Returns the counter store for variables, updated with the data
+    imported since the last call. The returned store must not be modified.
+
+    The store has the keys:
+       totals: {variable: {location: all time total}} for every location level
+       year: {variable: {(clinic, lat, lng, locations): total}} for the
+             current epi year, where locations is the tuple of
+             country, region, district and clinic of the records
+
+    Args:
+        db: the database
+        variables: list of variable ids to count
+        max_age: rebuild the store after this many seconds
+    Returns:
+        store(dict): the counter store
+    """
+    variables = sorted(set(variables))
+    year_start = fix_dates(None, None)[0]
+    with counter_lock:
+        max_id = db.session.query(func.max(Data.id)).scalar() or 0
+        store = counter_store["store"]
+        if (store is None or store["variables"] != variables or
+                store["year_start"] != year_start or
+                not 0 <= time.time() - store["built"] < max_age or
+                max_id < store["watermark"]):
+            store = _new_counters(variables, year_start)
+        elif max_id == store["watermark"]:
+            return store
+        else:
+            store = _copy_counters(store)
+        _add_rows(db, store, store["watermark"], max_id)
+        store["watermark"] = max_id
+        counter_store["store"] = store
+        return store
+
+
+def counter_value(value):
+    """
+    Returns the counted value as an int if it is a whole number. The sums
+    are computed as floats, but most frontpage variables are counts.
+    """
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _new_counters(variables, year_start):
+    return {
+        "variables": variables,
+        "year_start": year_start,
+        "built": time.time(),
+        "watermark": 0,
+        "totals": {variable: {} for variable in variables},
+        "year": {variable: {} for variable in variables}
+    }
+
+
+def _copy_counters(store):
+    return dict(
+        store,
+        totals={variable: dict(totals)
+                for variable, totals in store["totals"].items()},
+        year={variable: dict(year) for variable, year in store["year"].items()}
+    )
+
+
+def _add_rows(db, store, from_id, to_id):
+    variables = store["variables"]
+    if not variables:
+        return
+    locations = [getattr(Data, level) for level in LOCATION_LEVELS]
+    columns = locations + [
+        func.ST_Y(Data.geolocation).label("lat"),
+        func.ST_X(Data.geolocation).label("lng"),
+        (Data.date >= store["year_start"]).label("this_year")
+    ]
+    sums = [func.sum(Data.variables[variable].astext.cast(Float))
+            for variable in variables]
+    results = db.session.query(*(columns + sums)).filter(
+        Data.id > from_id,
+        Data.id <= to_id,
+        or_(Data.variables.has_key(variable) for variable in variables)
+    ).group_by(*columns)
+
+    for row in results:
+        country, zone, region, district, clinic = row[:5]
+        map_key = (clinic, row.lat, row.lng,
+                   (country, region, district, clinic))
+        for i, variable in enumerate(variables):
+            value = row[len(columns) + i]
+            if value is None:
+                continue
+            totals = store["totals"][variable]
+            for location in set(row[:5]):
+                if location is not None:
+                    totals[location] = totals.get(location, 0) + value
+            if row.this_year:
+                year = store["year"][variable]
+                year[map_key] = year.get(map_key, 0) + value
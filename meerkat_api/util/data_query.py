@@ -1,14 +1,82 @@
 from datetime import datetime
-from flask import g
+from flask import g, request, has_request_context
 from sqlalchemy import or_, func, extract
-from sqlalchemy.sql import text
+from sqlalchemy.sql import text, bindparam
 
 import meerkat_abacus.util as abacus_util
 import meerkat_abacus.util.epi_week
-from meerkat_abacus.model import Data
+from meerkat_abacus.model import Data, Locations
 from meerkat_api.authentication import is_allowed_location
 
-qu = "SELECT sum(CAST(data.variables ->> :variables_1 AS FLOAT)) AS sum_1 extra_columns FROM data WHERE where_clause AND data.date >= :date_1 AND data.date < :date_2 AND (data.country = :country_1 OR data.zone = :zone_1 OR data.region = :region_1 OR data.district = :district_1 OR data.clinic = :clinic_1) group_by_clause"
+qu = "SELECT sum(CAST(data.variables ->> :variables_1 AS FLOAT)) AS sum_1 extra_columns FROM data WHERE where_clause AND data.date >= :date_1 AND data.date < :date_2 AND location_clause group_by_clause"
+
+LOCATION_LEVELS = ("country", "zone", "region", "district", "clinic")
+# Some resources have never restricted on the zone column
+NO_ZONE_LEVELS = ("country", "region", "district", "clinic")
+# Queries per statement in query_sum_many, Postgres allows at most 1664
+# columns in a select list
+MAX_BULK_QUERIES = 500
+
+
+def get_location_levels(session):
+    """
+    Returns the level of every location. The levels are only loaded once
+    per request.
+
+    Args:
+        session: db session
+    Returns:
+        levels(dict): {location_id: level}
+    """
+    key = "meerkat_api.location_levels"
+    if has_request_context() and key in request.environ:
+        return request.environ[key]
+    levels = dict(session.query(Locations.id, Locations.level).all())
+    if has_request_context():
+        request.environ[key] = levels
+    return levels
+
+
+def location_level(session, location, levels=LOCATION_LEVELS):
+    """
+    Returns the level column that identifies records in location, or None if
+    the location is unknown or its level is not one of levels.
+
+    Every data record stores the id of all its parent locations, so a
+    record is in location exactly when the column for the level of location
+    equals location.
+    """
+    try:
+        location = int(location)
+    except (TypeError, ValueError):
+        return None
+    level = get_location_levels(session).get(location)
+    if level in levels:
+        return level
+    return None
+
+
+def location_condition(session, location, table=Data, levels=LOCATION_LEVELS):
+    """
+    Returns the condition restricting table to records in location.
+
+    Instead of comparing location with every level column (which Postgres
+    can not use an index for) we only compare the column of the level of
+    location. For unknown locations we fall back to comparing all the
+    level columns.
+
+    Args:
+        session: db session
+        location: location id
+        table: the table to restrict, default Data
+        levels: the level columns to consider
+    Returns:
+        condition: SQLAlchemy condition
+    """
+    level = location_level(session, location, levels)
+    if level:
+        return getattr(table, level) == location
+    return or_(getattr(table, l) == location for l in levels)
 
 
 def query_sum(db, var_ids, start_date, end_date, location,
@@ -50,13 +118,16 @@ def query_sum(db, var_ids, start_date, end_date, location,
     variables = {
         "date_1": start_date,
         "date_2": end_date,
-        "country_1": location,
-        "zone_1": location,
-        "region_1": location,
-        "district_1": location,
-        "clinic_1": location,
+        "location_1": location,
         "variables_1": var_ids[0]
     }
+    location_column = location_level(db.session, location)
+    if location_column:
+        location_clause = "data.{} = :location_1".format(location_column)
+    else:
+        location_clause = "(" + " OR ".join(
+            "data.{} = :location_1".format(l) for l in LOCATION_LEVELS
+        ) + ")"
     extra_columns = ""
     group_by_clause = ""
     group_by = []
@@ -98,6 +169,7 @@ def query_sum(db, var_ids, start_date, end_date, location,
         
     query = qu.replace("where_clause", " AND ".join(where_clauses))
     query = query.replace("group_by_clause", group_by_clause)
+    query = query.replace("location_clause", location_clause)
     query = text(query.replace("extra_columns", extra_columns))
     if date_variable:
         date_string = 'to_date(data->> :date_variable, "YYYY-MM-DDTHH-MI-SS")'
@@ -157,6 +229,150 @@ def query_sum(db, var_ids, start_date, end_date, location,
     return ret
 
 
+def _location_sql(location_column, operator):
+    """
+    Returns the SQL restricting data to locations of location_column, or to
+    any level column for unknown locations
+    """
+    if location_column:
+        return "data.{} {}".format(location_column, operator)
+    return "(" + " OR ".join(
+        "data.{} {}".format(l, operator) for l in LOCATION_LEVELS
+    ) + ")"
+
+
+def _bulk_statement(queries, location_column, weeks, level):
+    """
+    Returns the statement and parameters computing all of queries, which
+    share the location level and breakdown. Each query is one FILTER
+    aggregate, the WHERE clause selects the union of their records.
+    """
+    start_date = min(q["start_date"] for q in queries)
+    end_date = max(q["end_date"] for q in queries)
+    locations = sorted({int(q["location"]) for q in queries})
+    variables = {
+        "date_1": start_date,
+        "date_2": end_date,
+        "locations": locations,
+        "any_variables": sorted({q["var_ids"][0] for q in queries})
+    }
+    columns = []
+    for n, q in enumerate(queries):
+        conditions = []
+        if (q["start_date"], q["end_date"]) != (start_date, end_date):
+            conditions += ["data.date >= :start_{}".format(n),
+                           "data.date < :end_{}".format(n)]
+            variables["start_{}".format(n)] = q["start_date"]
+            variables["end_{}".format(n)] = q["end_date"]
+        if len(locations) > 1:
+            conditions.append(
+                _location_sql(location_column, "= :location_{}".format(n)))
+            variables["location_{}".format(n)] = int(q["location"])
+        for i, var_id in enumerate(q["var_ids"]):
+            conditions.append("data.variables ? :variables_{}_{}".format(n, i))
+            variables["variables_{}_{}".format(n, i)] = var_id
+        for i, var_id in enumerate(q.get("exclude_variables") or []):
+            conditions.append(
+                "(data.variables->>:excluded_variables_{}_{}) is null".format(n, i))
+            variables["excluded_variables_{}_{}".format(n, i)] = var_id
+        columns.append(
+            "sum(CAST(data.variables ->> :variables_{}_0 AS FLOAT)) "
+            "FILTER (WHERE {}) AS sum_{}".format(n, " AND ".join(conditions), n)
+        )
+
+    group_by = []
+    if weeks:
+        columns.append("epi_week AS week")
+        group_by.append("week")
+    if level:
+        columns.append("data.{}".format(level))
+        group_by.append("data.{}".format(level))
+    query = ("SELECT " + ", ".join(columns) + " FROM data"
+             " WHERE data.date >= :date_1 AND data.date < :date_2"
+             " AND data.variables ?| :any_variables"
+             " AND " + _location_sql(location_column, "IN :locations"))
+    if group_by:
+        query += " GROUP BY " + ", ".join(group_by)
+    query = text(query).bindparams(bindparam("locations", expanding=True))
+    return query, variables
+
+
+def _bulk_result(rows, column, offset, weeks, level):
+    """
+    Returns the query_sum result of the column of the bulk statement rows.
+    The breakdown columns start at offset. Rows are skipped the same way as
+    in query_sum.
+    """
+    ret = {"total": 0}
+    if weeks:
+        ret["weeks"] = {}
+    if level:
+        ret[level] = {}
+    for r in rows:
+        value = r[column]
+        if value is None:
+            continue
+        if level and weeks:
+            if r[offset] is None:
+                continue
+            week = int(r[offset])
+            ret[level].setdefault(r[-1], {"total": 0, "weeks": {}})
+            ret[level][r[-1]]["weeks"][week] = value
+            ret[level][r[-1]]["total"] += value
+            ret["weeks"].setdefault(week, 0)
+            ret["weeks"][week] += value
+        elif level:
+            if not r[-1]:
+                continue
+            ret[level][r[-1]] = value
+        elif weeks:
+            if not r[offset]:
+                continue
+            ret["weeks"][int(r[offset])] = value
+        ret["total"] += value
+    return ret
+
+
+def query_sum_many(db, queries, allowed_location=1):
+    """
+    Same as query_sum, but for many queries at once. Queries on locations of
+    the same level with the same breakdown are computed by one statement,
+    with a FILTER aggregate for each query, so the data table is only
+    scanned once for all of them.
+
+    Args:
+        queries: list of dicts with the query_sum arguments var_ids,
+                 start_date, end_date and location, and optionally level,
+                 weeks and exclude_variables
+    Returns:
+       results(list): the query_sum result of each query, in order
+    """
+    if allowed_location == 1:
+        if g:
+            allowed_location = g.allowed_location
+    results = [None] * len(queries)
+    groups = {}
+    for n, q in enumerate(queries):
+        if not is_allowed_location(q["location"], allowed_location):
+            results[n] = {"weeks": [], "total": 0}
+            continue
+        key = (location_level(db.session, q["location"]),
+               bool(q.get("weeks")), q.get("level"))
+        groups.setdefault(key, []).append(n)
+
+    with db.engine.connect() as conn:
+        for (location_column, weeks, level), numbers in groups.items():
+            for i in range(0, len(numbers), MAX_BULK_QUERIES):
+                chunk = numbers[i:i + MAX_BULK_QUERIES]
+                query, variables = _bulk_statement(
+                    [queries[n] for n in chunk], location_column, weeks, level)
+                rows = conn.execute(query, **variables).fetchall()
+                for column, n in enumerate(chunk):
+                    results[n] = _bulk_result(rows, column, len(chunk),
+                                              weeks, level)
+    return results
+
+
 def latest_query(db, var_id, identifier_id, start_date, end_date,
                  location, allowed_location=1, level=None,
                  weeks=False, date_variable=None, week_offset=0
@@ -180,14 +396,39 @@ def latest_query(db, var_id, identifier_id, start_date, end_date,
                      level was given there is a level key with the data
                      breakdown
     """
+    return latest_query_many(
+        db, [var_id], identifier_id, start_date, end_date, location,
+        allowed_location=allowed_location, level=level, weeks=weeks,
+        date_variable=date_variable, week_offset=week_offset
+    )[var_id]
+
+
+def latest_query_many(db, var_ids, identifier_id, start_date, end_date,
+                      location, allowed_location=1, level=None,
+                      weeks=False, date_variable=None, week_offset=0):
+    """
+    Same as latest_query, but for several variables at once. The latest
+    records are only selected once and all the variables are accumulated
+    from them in one pass.
+
+    Args:
+        var_ids: list of variable ids to get last of
+        identifier_id: Id to identify which records we should use
+        start_date: Start date
+        end_date: End date
+        location: Location to restrict to
+        date_variable: if None we use date from data otherwise we use the variable indicated
+        weeks: True if we want a breakdwon by weeks.
+    Returns:
+       result(dict): Dictionary with the latest_query result for each
+                     variable id
+    """
     if allowed_location == 1:
         if g:
             allowed_location = g.allowed_location
     if not is_allowed_location(location, allowed_location):
-        return {}
-    location_condtion = [
-                or_(loc == location for loc in (
-                    Data.country, Data.zone, Data.region, Data.district, Data.clinic))]
+        return {var_id: {} for var_id in var_ids}
+    location_condtion = [location_condition(db.session, location)]
     if date_variable:
         date_conditions = [func.to_date(
             Data.variables[date_variable].astext, "YYYY-MM-DDTHH-MI-SS") >= start_date,
@@ -215,35 +456,37 @@ def latest_query(db, var_id, identifier_id, start_date, end_date,
                                  Data.district, Data.variables).distinct(
                                      Data.clinic, c).filter(*conditions).order_by(
                                              Data.clinic).order_by(c).order_by(Data.date.desc())
-        ret = {"total": 0,
-               "weeks": {},
-               "district": {},
-               "clinic": {},
-               "region": {}}
+        rets = {var_id: {"total": 0,
+                         "weeks": {},
+                         "district": {},
+                         "clinic": {},
+                         "region": {}}
+                for var_id in var_ids}
 
         for r in query:
-            val = r.variables.get(var_id, 0)
-            ret["total"] += val
             week = int(r.week) - week_offset
-            ret["weeks"].setdefault(week, 0)
-            ret["weeks"][week] += val
-
-            ret["clinic"].setdefault(r.clinic,
-                                     {"total": 0,
-                                      "weeks": {}})
-            ret["clinic"][r.clinic]["total"] += val
-            ret["clinic"][r.clinic]["weeks"][week] = val
-            ret["district"].setdefault(r.district,
-                                       {"total": 0,
-                                        "weeks": {}})
-            ret["district"][r.district]["total"] += val
-            ret["district"][r.district]["weeks"][week] = +val
-            ret["region"].setdefault(r.region,
-                                     {"total": 0,
-                                      "weeks": {}})
-            ret["region"][r.region]["total"] += val
-            ret["region"][r.region]["weeks"][week] = +val
-        return ret
+            for var_id, ret in rets.items():
+                val = r.variables.get(var_id, 0)
+                ret["total"] += val
+                ret["weeks"].setdefault(week, 0)
+                ret["weeks"][week] += val
+
+                ret["clinic"].setdefault(r.clinic,
+                                         {"total": 0,
+                                          "weeks": {}})
+                ret["clinic"][r.clinic]["total"] += val
+                ret["clinic"][r.clinic]["weeks"][week] = val
+                ret["district"].setdefault(r.district,
+                                           {"total": 0,
+                                            "weeks": {}})
+                ret["district"][r.district]["total"] += val
+                ret["district"][r.district]["weeks"][week] = +val
+                ret["region"].setdefault(r.region,
+                                         {"total": 0,
+                                          "weeks": {}})
+                ret["region"][r.region]["total"] += val
+                ret["region"][r.region]["weeks"][week] = +val
+        return rets
     else:
         # This query selects that latest record for each clinic
         # that has the variable identifier_id
@@ -253,19 +496,21 @@ def latest_query(db, var_id, identifier_id, start_date, end_date,
                                     Data.clinic).filter(*conditions).order_by(
                                         Data.clinic).order_by(Data.date.desc())
 
-        ret = {"total": 0,
-               "clinic": {},
-               "district": {},
-               "region": {}}
+        rets = {var_id: {"total": 0,
+                         "clinic": {},
+                         "district": {},
+                         "region": {}}
+                for var_id in var_ids}
         for r in query:
-            val = r.variables.get(var_id, 0)
-            ret["total"] += val
-            ret["clinic"][r.clinic] = val
-            ret["district"].setdefault(r.district, 0)
-            ret["district"][r.district] += val
-            ret["region"].setdefault(r.region, 0)
-            ret["region"][r.region] += val
-        return ret
+            for var_id, ret in rets.items():
+                val = r.variables.get(var_id, 0)
+                ret["total"] += val
+                ret["clinic"][r.clinic] = val
+                ret["district"].setdefault(r.district, 0)
+                ret["district"][r.district] += val
+                ret["region"].setdefault(r.region, 0)
+                ret["region"][r.region] += val
+        return rets
 
 
 if __name__ == '__main__':
@@ -0,0 +1,221 @@
+"""
+Index advisor for the data table
+
+Almost all the resources filter the data table on variables ? 'var',
+categories ? 'cat', date ranges and location columns. The advisor proposes
+the indexes supporting these access paths, can create the missing ones
+concurrently and runs EXPLAIN (ANALYZE, BUFFERS) on representative queries
+to check that they are used.
+
+Run with:
+    flask index-advisor [--create] [--no-explain] [--variable tot_1 ...]
+"""
+import ast
+import importlib.util
+import json
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, tablesample
+from sqlalchemy.sql import text
+
+from meerkat_abacus.model import Data, AggregationVariables
+
+# Modules of the frontpage and the reports. The variable ids they use are
+# found in their source.
+HOT_MODULES = ["meerkat_api.resources.frontpage",
+               "meerkat_api.resources.reports"]
+# Categories whose variables are all shown on the frontpage
+HOT_CATEGORIES = ["key_indicators"]
+# Keys of the data records that are queried but are not variables
+EXTRA_HOT_VARIABLES = ["alert"]
+
+# Only variables in less than this fraction of the records get a partial index
+MAX_SELECTIVITY = 0.2
+
+BASE_INDEXES = [
+    ("data_variables_gin_idx", "gin", "variables", None),
+    ("data_categories_gin_idx", "gin", "categories", None),
+    ("data_clinic_date_idx", "btree", "clinic, date", None),
+    ("data_district_date_idx", "btree", "district, date", None),
+    ("data_region_date_idx", "btree", "region, date", None),
+    ("data_epi_year_week_idx", "btree", "epi_year, epi_week", None),
+]
+
+REPRESENTATIVE_QUERIES = {
+    "query_sum": (
+        "SELECT sum(CAST(data.variables ->> :var AS FLOAT)) FROM data "
+        "WHERE data.variables ? :var AND data.date >= :start_date "
+        "AND data.date < :end_date AND data.country = :location"
+    ),
+    "latest_per_clinic": (
+        "SELECT DISTINCT ON (data.clinic) data.clinic, data.date, data.variables "
+        "FROM data WHERE data.variables ? :var AND data.date >= :start_date "
+        "ORDER BY data.clinic, data.date DESC"
+    ),
+    "clinic_records": (
+        "SELECT data.id FROM data WHERE data.clinic = :clinic "
+        "AND data.date >= :start_date AND data.date < :end_date"
+    ),
+    "epi_weeks": (
+        "SELECT data.epi_week, count(*) FROM data WHERE data.epi_year = :year "
+        "AND data.variables ? :var GROUP BY data.epi_week"
+    ),
+}
+
+
+def module_strings(module_name):
+    """
+    Returns the string literals in the source of a module
+    """
+    spec = importlib.util.find_spec(module_name)
+    with open(spec.origin) as source:
+        tree = ast.parse(source.read())
+    strings = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            strings.add(node.value)
+        elif type(node).__name__ == "Str":
+            # Python < 3.8
+            strings.add(node.s)
+    return strings
+
+
+def hot_variables(session, extra_variables=None):
+    """
+    Returns the variables used by the frontpage and the reports: the
+    variable ids in the source of HOT_MODULES and the variables of
+    HOT_CATEGORIES, as configured for this country.
+
+    Args:
+        session: db session
+        extra_variables: additional variables to include
+    Returns:
+        variables(list): variable ids
+    """
+    configured = {r.id for r in session.query(AggregationVariables.id)}
+    variables = list(EXTRA_HOT_VARIABLES) + list(extra_variables or [])
+    for module_name in HOT_MODULES:
+        variables += module_strings(module_name) & configured
+    for category in HOT_CATEGORIES:
+        results = session.query(AggregationVariables.id).filter(
+            AggregationVariables.category.has_key(category))
+        variables += [r.id for r in results]
+    return sorted(set(v for v in variables if re.match(r"^\w+$", v)))
+
+
+def variable_selectivity(session, variables, sample_percent=1):
+    """
+    Estimates the fraction of the data records that have each variable from
+    a sample of the table.
+
+    Args:
+        session: db session
+        variables: variable ids
+        sample_percent: percentage of the table pages to sample
+    Returns:
+        selectivity(dict): {variable: fraction of records}
+    """
+    sample = tablesample(Data.__table__, func.system(sample_percent))
+    columns = [func.count()] + [
+        func.count().filter(sample.c.variables.has_key(v)) for v in variables
+    ]
+    result = session.query(*columns).select_from(sample).first()
+    total = result[0]
+    if not total:
+        # Too small to sample
+        result = session.query(*[
+            func.count()] + [func.count().filter(Data.variables.has_key(v))
+                             for v in variables]).first()
+        total = result[0] or 1
+    return {v: result[i + 1] / total for i, v in enumerate(variables)}
+
+
+def existing_indexes(session):
+    """
+    Returns the indexes on the data table as {name: definition}
+    """
+    results = session.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = 'data'"
+    ))
+    return {r[0]: r[1] for r in results}
+
+
+def index_sql(name, method, columns, where):
+    sql = "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON data USING {} ({})".format(
+        name, method, columns)
+    if where:
+        sql += " WHERE " + where
+    return sql
+
+
+def propose_indexes(variables, selectivity, existing):
+    """
+    Returns the missing indexes for the hot access paths.
+
+    Partial indexes on date are proposed for the selective variables, as
+    they make both the variable test and the date range an index scan.
+
+    Args:
+        variables: hot variable ids
+        selectivity: {variable: fraction of records}
+        existing: {index name: definition} of the existing indexes
+    Returns:
+        proposals(list): list of (name, sql)
+    """
+    indexes = list(BASE_INDEXES)
+    for variable in variables:
+        if selectivity.get(variable, 1) < MAX_SELECTIVITY:
+            indexes.append(("data_var_{}_date_idx".format(variable.lower()),
+                            "btree", "date",
+                            "variables ? '{}'".format(variable)))
+    definitions = [d.lower() for d in existing.values()]
+    proposals = []
+    for name, method, columns, where in indexes:
+        if name in existing:
+            continue
+        using = "using {} ({})".format(method, columns)
+        if not where and any(d.endswith(using) for d in definitions):
+            continue
+        proposals.append((name, index_sql(name, method, columns, where)))
+    return proposals
+
+
+def explain_queries(engine, variable="tot_1", location=1, clinic=None):
+    """
+    Runs EXPLAIN (ANALYZE, BUFFERS) on the representative queries.
+
+    Returns:
+        plans(dict): {query name: {"time": ms, "indexes": [index names],
+                                   "shared_hit": blocks, "shared_read": blocks}}
+    """
+    end_date = datetime.now()
+    params = {"var": variable, "location": location, "clinic": clinic or location,
+              "start_date": end_date - timedelta(days=365), "end_date": end_date,
+              "year": end_date.year}
+    plans = {}
+    with engine.connect() as conn:
+        for name, query in REPRESENTATIVE_QUERIES.items():
+            result = conn.execute(
+                text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query), **params
+            ).scalar()
+            if isinstance(result, str):
+                result = json.loads(result)
+            plan = result[0]
+            plans[name] = {
+                "time": plan["Execution Time"],
+                "indexes": sorted(_plan_indexes(plan["Plan"])),
+                "shared_hit": plan["Plan"].get("Shared Hit Blocks", 0),
+                "shared_read": plan["Plan"].get("Shared Read Blocks", 0)
+            }
+    return plans
+
+
+def _plan_indexes(node):
+    indexes = set()
+    if "Index Name" in node:
+        indexes.add(node["Index Name"])
+    for child in node.get("Plans", []):
+        indexes |= _plan_indexes(child)
+    return indexes
+